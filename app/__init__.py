@@ -1,6 +1,6 @@
 from flask import Flask, render_template
 from flask_login import LoginManager
-from flask_migrate import Migrate
+from flask_wtf.csrf import CSRFProtect
 from app.config import Config
 from app.models import db, User
 from datetime import datetime
@@ -10,14 +10,35 @@ from app.routes.auth import auth_bp
 from app.routes.objectives import objectives_bp
 from app.routes.keyresults import keyresults_bp
 from app.routes.main import main_bp
+from app.routes.search import search_bp
+from app.routes.reports import reports_bp
+from app.routes.admin import admin_bp
+from app.routes.comments import comments_bp
+from app.routes.archive import archive_bp
+from app.routes.health import health_bp
+from app.routes.sync import sync_bp
+from app.routes.webhooks import webhooks_bp
+from app.routes.cycles import cycles_bp
+from app.commands import register_commands
+from app import assets, checkins, compression, ratelimit, requestlog, sharding, templating
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    # First, so its timing covers the other request hooks.
+    requestlog.init_app(app)
+    templating.init_app(app)
     
     # Initialize extensions
     db.init_app(app)
-    migrate = Migrate(app, db)
+    assets.init_app(app)
+    compression.init_app(app)
+    checkins.init_app(app)
+    ratelimit.init_app(app)
+    sharding.init_app(app)
+    # Every POST needs a token: FlaskForm's hidden field, a csrf_token()
+    # input in the plain action forms, or the X-CSRFToken header for fetch.
+    CSRFProtect(app)
     
     # Setup login manager
     login_manager = LoginManager()
@@ -26,19 +47,39 @@ def create_app(config_class=Config):
     
     @login_manager.user_loader
     def load_user(id):
-        return User.query.get(int(id))
+        if not sharding.activate_for_user(int(id)):
+            return None
+        return db.session.get(User, int(id))
     
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(objectives_bp)
     app.register_blueprint(keyresults_bp)
     app.register_blueprint(main_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(reports_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(comments_bp)
+    app.register_blueprint(archive_bp)
+    app.register_blueprint(health_bp)
+    app.register_blueprint(sync_bp)
+    app.register_blueprint(webhooks_bp)
+    app.register_blueprint(cycles_bp)
+    
+    register_commands(app)
     
     # Error handlers
     @app.errorhandler(404)
     def not_found_error(error):
         return render_template('errors/404.html'), 404
     
+    @app.errorhandler(429)
+    def too_many_requests_error(error):
+        headers = {}
+        if getattr(error, 'retry_after', None) is not None:
+            headers['Retry-After'] = str(error.retry_after)
+        return render_template('errors/429.html'), 429, headers
+    
     @app.errorhandler(500)
     def internal_error(error):
         db.session.rollback()
@@ -0,0 +1,273 @@
+"""
+Async read-only JSON API.
+
+Dashboards built on the API fetch several independent things per call.
+``AsyncAPI`` is a plain ASGI application that runs those reads
+concurrently on an async SQLAlchemy engine, each on its own connection,
+with ``asyncio.gather``:
+
+``GET /api/progress``
+    The user's objectives with their progress, the overall progress and the
+    number completed (the numbers on the dashboard).
+``GET /api/upcoming``
+    The next five unfinished objectives by end date.
+``GET /api/updates?limit=10``
+    The most recent check-ins across the user's key results.
+``GET /api/dashboard``
+    All three at once.
+
+Requests are authenticated with the Flask session cookie, so a browser
+that is logged in to the site can call the API directly. With sharding on,
+the user's shard is looked up in the directory first.
+
+The engines are created from the Flask app's database URLs with the async
+driver of the same database (aiosqlite for SQLite, asyncpg for PostgreSQL).
+They, greenlet and an ASGI server are optional dependencies: the WSGI app
+neither imports nor needs them. ``asgi.py`` mounts the API next to the
+Flask app.
+"""
+import asyncio
+import json
+from datetime import datetime
+from urllib.parse import parse_qs
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from app.models import DEFAULT_SHARD, KeyResult, KeyResultUpdate, Objective, ShardMap, User
+
+PREFIX = '/api'
+
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg', 'mysql': 'aiomysql'}
+
+UPCOMING_LIMIT = 5
+UPDATES_LIMIT = 10
+MAX_UPDATES_LIMIT = 50
+
+
+def async_url(url):
+    """``url`` with the async driver of its database."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'no async driver known for {backend}')
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+def _progress():
+    return func.coalesce(func.avg(KeyResult.progress), 0).label('progress')
+
+
+def objectives_query(user_id):
+    return (
+        select(Objective.id, Objective.title, Objective.end_date, Objective.is_complete, _progress())
+        .outerjoin(KeyResult, KeyResult.objective_id == Objective.id)
+        .where(Objective.user_id == user_id, Objective.deleted_at.is_(None))
+        .group_by(Objective.id)
+        .order_by(Objective.id)
+    )
+
+
+def upcoming_query(user_id, now, limit=UPCOMING_LIMIT):
+    return (
+        objectives_query(user_id)
+        .where(Objective.end_date >= now, Objective.is_complete.isnot(True))
+        .order_by(None)
+        .order_by(Objective.end_date, Objective.id)
+        .limit(limit)
+    )
+
+
+def updates_query(user_id, limit=UPDATES_LIMIT):
+    return (
+        select(KeyResultUpdate.id, KeyResultUpdate.value, KeyResultUpdate.comment,
+               KeyResultUpdate.timestamp, KeyResult.id.label('key_result_id'),
+               KeyResult.title.label('key_result_title'), KeyResult.unit,
+               Objective.id.label('objective_id'))
+        .join(KeyResult, KeyResult.id == KeyResultUpdate.key_result_id)
+        .join(Objective, Objective.id == KeyResult.objective_id)
+        .where(Objective.user_id == user_id, Objective.deleted_at.is_(None))
+        .order_by(KeyResultUpdate.timestamp.desc(), KeyResultUpdate.id.desc())
+        .limit(limit)
+    )
+
+
+def _objective(row):
+    return {'id': row.id, 'title': row.title, 'end_date': row.end_date,
+            'is_complete': bool(row.is_complete), 'progress': round(row.progress, 1)}
+
+
+def progress_summary(rows):
+    objectives = [_objective(row) for row in rows]
+    return {
+        'objectives': objectives,
+        'overall_progress': round(sum(row.progress for row in rows) / len(rows), 1) if rows else 0,
+        'completed': sum(1 for row in rows if row.is_complete),
+    }
+
+
+def _update(row):
+    return {'id': row.id, 'value': row.value, 'comment': row.comment, 'timestamp': row.timestamp,
+            'key_result': {'id': row.key_result_id, 'title': row.key_result_title, 'unit': row.unit},
+            'objective_id': row.objective_id}
+
+
+async def _fetch(engine, statement):
+    # One connection per statement: a connection runs one query at a time,
+    # so gathered reads need their own.
+    async with engine.connect() as connection:
+        return (await connection.execute(statement)).all()
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AsyncAPI:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        config = flask_app.config
+        self.urls = {DEFAULT_SHARD: config['SQLALCHEMY_DATABASE_URI']}
+        self.urls.update((name, url) for name, url in (config.get('SQLALCHEMY_BINDS') or {}).items()
+                         if name.startswith('shard'))
+        self.sharded = len(self.urls) > 1
+        self.engines = {}
+        self.routes = {
+            '/progress': self.progress,
+            '/upcoming': self.upcoming,
+            '/updates': self.updates,
+            '/dashboard': self.dashboard,
+        }
+
+    def engine(self, shard):
+        if shard not in self.engines:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            self.engines[shard] = create_async_engine(async_url(self.urls[shard]))
+        return self.engines[shard]
+
+    async def dispose(self):
+        engines, self.engines = list(self.engines.values()), {}
+        await asyncio.gather(*(engine.dispose() for engine in engines))
+
+    def session_user_id(self, headers):
+        """The user id in the Flask session cookie, or None."""
+        app = self.flask_app
+        name = app.config['SESSION_COOKIE_NAME'].encode()
+        for cookie_header in headers.get(b'cookie', []):
+            for part in cookie_header.split(b';'):
+                key, _, value = part.strip().partition(b'=')
+                if key != name:
+                    continue
+                serializer = app.session_interface.get_signing_serializer(app)
+                try:
+                    session = serializer.loads(
+                        value.decode('latin-1'),
+                        max_age=int(app.permanent_session_lifetime.total_seconds()))
+                except Exception:
+                    return None
+                user_id = session.get('_user_id')
+                return int(user_id) if user_id and str(user_id).isdigit() else None
+        return None
+
+    async def user_shard(self, user_id):
+        """The shard holding ``user_id``; 401 if the user no longer exists."""
+        if self.sharded:
+            statement = select(ShardMap.shard).where(ShardMap.id == user_id)
+        else:
+            statement = select(User.id.label('shard')).where(User.id == user_id)
+        rows = await _fetch(self.engine(DEFAULT_SHARD), statement)
+        if not rows:
+            raise HTTPError(401, 'login required')
+        return rows[0].shard if self.sharded else DEFAULT_SHARD
+
+    async def progress(self, engine, user_id, params):
+        return progress_summary(await _fetch(engine, objectives_query(user_id)))
+
+    async def upcoming(self, engine, user_id, params):
+        rows = await _fetch(engine, upcoming_query(user_id, datetime.utcnow()))
+        return {'upcoming': [_objective(row) for row in rows]}
+
+    async def updates(self, engine, user_id, params):
+        rows = await _fetch(engine, updates_query(user_id, self._limit(params)))
+        return {'updates': [_update(row) for row in rows]}
+
+    async def dashboard(self, engine, user_id, params):
+        objectives, upcoming, updates = await asyncio.gather(
+            _fetch(engine, objectives_query(user_id)),
+            _fetch(engine, upcoming_query(user_id, datetime.utcnow())),
+            _fetch(engine, updates_query(user_id, self._limit(params))),
+        )
+        return dict(progress_summary(objectives),
+                    upcoming=[_objective(row) for row in upcoming],
+                    updates=[_update(row) for row in updates])
+
+    @staticmethod
+    def _limit(params):
+        try:
+            limit = int(params.get('limit', [UPDATES_LIMIT])[0])
+        except ValueError:
+            raise HTTPError(400, 'limit must be a number')
+        return min(max(limit, 1), MAX_UPDATES_LIMIT)
+
+    async def handle(self, scope):
+        path = scope['path'][len(PREFIX):] if scope['path'].startswith(PREFIX + '/') else None
+        handler = self.routes.get(path)
+        if handler is None:
+            raise HTTPError(404, 'not found')
+        if scope['method'] not in ('GET', 'HEAD'):
+            raise HTTPError(405, 'method not allowed')
+        headers = {}
+        for key, value in scope['headers']:
+            headers.setdefault(key.lower(), []).append(value)
+        user_id = self.session_user_id(headers)
+        if user_id is None:
+            raise HTTPError(401, 'login required')
+        engine = self.engine(await self.user_shard(user_id))
+        params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        return await handler(engine, user_id, params)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        try:
+            status, payload = 200, await self.handle(scope)
+        except HTTPError as exc:
+            status, payload = exc.status, {'error': str(exc)}
+        body = json.dumps(payload, default=_json_default).encode()
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'cache-control', b'no-store'),
+        ]})
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{value!r} is not JSON serializable')
+
+
+def mount(api, app):
+    """An ASGI app sending ``/api/`` to ``api`` and everything else to the
+    ASGI ``app`` (e.g. the Flask app wrapped by ``asgiref.wsgi.WsgiToAsgi``).
+    Lifespan events go to ``api``."""
+    async def dispatch(scope, receive, send):
+        if scope['type'] == 'lifespan' or scope.get('path', '').startswith(PREFIX + '/'):
+            await api(scope, receive, send)
+        else:
+            await app(scope, receive, send)
+    return dispatch
@@ -0,0 +1,198 @@
+"""
+Cold storage for finished objectives.
+
+``archive_objectives`` moves completed objectives whose end date is before
+a cutoff out of the hot tables, together with their key results, check-in
+history, tags, comments and report snapshots. Each row goes into an
+``archived_*`` table with the same columns (see ``app.models``). The move
+is done in batches of objectives. Each batch is a single transaction of
+``INSERT ... SELECT`` and ``DELETE`` statements, so no rows are loaded into
+Python and a failed batch leaves nothing half moved. ``restore_objective``
+moves one objective back the same way and recomputes its status, which is
+not archived.
+
+Report snapshots move with their objective, so progress reports stop
+counting archived objectives, also for the days before they were archived,
+and count them again once they are restored.
+
+Rows keep their ids in both directions. SQLite can hand out the id of a
+deleted row again if it was the highest one. If that ever makes a move
+collide with an existing row, the batch is rolled back and an
+``ArchiveError`` is raised.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, literal, or_, select
+from sqlalchemy.exc import IntegrityError
+from app.models import (db, Objective, KeyResult, KeyResultUpdate, ObjectiveSnapshot, Comment,
+                        objective_tags, key_result_tags, archived_objective,
+                        archived_objective_tags, archived_objective_snapshot,
+                        archived_key_result, archived_key_result_tags,
+                        archived_key_result_update, archived_comment)
+from app import changes, forecasts, search, tracking
+
+# Parents before children: rows are inserted in this order and deleted in
+# reverse.
+HOT = {
+    'objective': Objective.__table__,
+    'objective_tags': objective_tags,
+    'objective_snapshot': ObjectiveSnapshot.__table__,
+    'key_result': KeyResult.__table__,
+    'key_result_tags': key_result_tags,
+    'key_result_update': KeyResultUpdate.__table__,
+    'comment': Comment.__table__,
+}
+ARCHIVE = {
+    'objective': archived_objective,
+    'objective_tags': archived_objective_tags,
+    'objective_snapshot': archived_objective_snapshot,
+    'key_result': archived_key_result,
+    'key_result_tags': archived_key_result_tags,
+    'key_result_update': archived_key_result_update,
+    'comment': archived_comment,
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def objective_rows(tables, objective_ids):
+    """Per table, the rows that belong to ``objective_ids``."""
+    key_result_ids = select(tables['key_result'].c.id)\
+        .where(tables['key_result'].c.objective_id.in_(objective_ids))
+    comment = tables['comment'].c
+    return {
+        'objective': tables['objective'].c.id.in_(objective_ids),
+        'objective_tags': tables['objective_tags'].c.objective_id.in_(objective_ids),
+        'objective_snapshot': tables['objective_snapshot'].c.objective_id.in_(objective_ids),
+        'key_result': tables['key_result'].c.objective_id.in_(objective_ids),
+        'key_result_tags': tables['key_result_tags'].c.key_result_id.in_(key_result_ids),
+        'key_result_update': tables['key_result_update'].c.key_result_id.in_(key_result_ids),
+        'comment': or_(comment.objective_id.in_(objective_ids),
+                       comment.key_result_id.in_(key_result_ids)),
+    }
+
+
+def _move(source, target, objective_ids, extra=None):
+    """Copy everything belonging to ``objective_ids`` from the ``source``
+    tables to the ``target`` tables, then delete it from ``source``. Columns
+    only the target has are filled from ``extra``; columns only the source
+    has (``archived_at``) are dropped."""
+    extra = extra or {}
+    criteria = objective_rows(source, objective_ids)
+    for name, table in source.items():
+        columns = [column.name for column in target[name].columns if column.name in table.c]
+        values = [table.c[column] for column in columns]
+        for column, value in extra.get(name, {}).items():
+            columns.append(column)
+            values.append(literal(value, target[name].c[column].type))
+        db.session.execute(target[name].insert().from_select(
+            columns, select(*values).where(criteria[name])))
+    for name in reversed(list(source)):
+        db.session.execute(source[name].delete().where(criteria[name]))
+
+
+def archive_objectives(before=None, batch_size=100):
+    """Archive completed objectives that ended before ``before`` (default:
+    one year ago). Returns the number of objectives archived."""
+    before = before or datetime.utcnow() - timedelta(days=365)
+    archived = 0
+    while True:
+        objective_ids = db.session.execute(
+            select(Objective.id)
+            .where(Objective.is_complete.is_(True), Objective.end_date < before,
+                   Objective.deleted_at.is_(None))
+            .order_by(Objective.id).limit(batch_size)
+        ).scalars().all()
+        if not objective_ids:
+            return archived
+        try:
+            changes.record_objectives(db.session.connection(), objective_ids, 'delete')
+            _move(HOT, ARCHIVE, objective_ids,
+                  extra={'objective': {'archived_at': datetime.utcnow()}})
+            search.remove_objectives(objective_ids)
+            db.session.commit()
+        except IntegrityError as exc:
+            db.session.rollback()
+            raise ArchiveError(f'objectives {objective_ids[0]}-{objective_ids[-1]} '
+                               f'collide with archived rows: {exc.orig}') from exc
+        archived += len(objective_ids)
+
+
+def restore_objective(objective_id):
+    """Move an archived objective and everything archived with it back
+    into the hot tables, and recompute its status and forecasts."""
+    exists = db.session.execute(
+        select(archived_objective.c.id).where(archived_objective.c.id == objective_id)
+    ).first()
+    if exists is None:
+        raise ArchiveError(f'objective {objective_id} is not archived')
+    try:
+        _move(ARCHIVE, HOT, [objective_id])
+        changes.record_objectives(db.session.connection(), [objective_id])
+        tracking.refresh(db.session.connection(), [objective_id])
+        forecasts.refresh_objectives(db.session.connection(), [objective_id])
+        db.session.flush()
+        objective = db.session.get(Objective, objective_id)
+        search.index_objective(objective)
+        for key_result in objective.key_results:
+            search.index_key_result(key_result, objective)
+        db.session.commit()
+    except IntegrityError as exc:
+        db.session.rollback()
+        raise ArchiveError(f'objective {objective_id} collides with a live row: '
+                           f'{exc.orig}') from exc
+    return objective
+
+
+def _key_result_progress(key_result):
+    ratio = func.coalesce(key_result.c.current_value, 0) * 100.0 / key_result.c.target_value
+    return case(
+        (func.coalesce(key_result.c.target_value, 0) == 0, 0.0),
+        (ratio > 100, 100.0),
+        (ratio < 0, 0.0),
+        else_=ratio,
+    )
+
+
+def archived_objectives(user_id, page=1, per_page=20):
+    """A page of a user's archived objectives, most recently ended first.
+    Returns ``(rows, progress, has_next)`` where ``progress`` maps each
+    objective id on the page to its average key result progress."""
+    rows = db.session.execute(
+        select(archived_objective)
+        .where(archived_objective.c.user_id == user_id)
+        .order_by(archived_objective.c.end_date.desc(), archived_objective.c.id.desc())
+        .limit(per_page + 1).offset((page - 1) * per_page)
+    ).all()
+    rows, has_next = rows[:per_page], len(rows) > per_page
+    progress = dict(db.session.execute(
+        select(archived_key_result.c.objective_id,
+               func.avg(_key_result_progress(archived_key_result)))
+        .where(archived_key_result.c.objective_id.in_([row.id for row in rows]))
+        .group_by(archived_key_result.c.objective_id)
+    ).all())
+    return rows, progress, has_next
+
+
+def archived_objective_detail(objective_id):
+    """The archived objective row and its key results, each with its
+    check-in history newest first, as ``(objective, [(key_result, updates)])``."""
+    objective = db.session.execute(
+        select(archived_objective).where(archived_objective.c.id == objective_id)
+    ).first()
+    if objective is None:
+        return None, []
+    key_results = db.session.execute(
+        select(archived_key_result, _key_result_progress(archived_key_result).label('progress'))
+        .where(archived_key_result.c.objective_id == objective_id)
+        .order_by(archived_key_result.c.id)
+    ).all()
+    updates = {}
+    for update in db.session.execute(
+        select(archived_key_result_update)
+        .where(archived_key_result_update.c.key_result_id.in_([kr.id for kr in key_results]))
+        .order_by(archived_key_result_update.c.timestamp.desc())
+    ):
+        updates.setdefault(update.key_result_id, []).append(update)
+    return objective, [(kr, updates.get(kr.id, [])) for kr in key_results]
@@ -0,0 +1,118 @@
+"""
+Fingerprinted, precompressed static assets.
+
+``build_assets`` copies every file under ``app/static`` to
+``app/static/dist`` with a content hash in its name (``css/style.css`` ->
+``dist/css/style.3f9a0c1b2d4e.css``), writes a gzip-compressed copy next
+to each compressible file and records the mapping in
+``dist/manifest.json``.
+
+``init_app`` makes ``url_for('static', filename='css/style.css')`` return
+the fingerprinted URL whenever a manifest is present, and serves
+fingerprinted files with ``Cache-Control: immutable`` so browsers never
+revalidate them. Clients that accept gzip get the precompressed copy, so
+nothing is compressed at request time. Without a manifest (e.g. in
+development) static files are served exactly as before.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from flask import request, send_from_directory
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+ONE_YEAR = 365 * 24 * 60 * 60
+
+
+def _fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def build_assets(static_folder):
+    """Write fingerprinted and gzip-compressed copies of the static files.
+
+    Returns the manifest mapping logical names to fingerprinted ones.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist]
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            stem, ext = os.path.splitext(logical)
+            hashed = f'{DIST_DIR}/{stem}.{_fingerprint(source)}{ext}'
+
+            target = os.path.join(static_folder, *hashed.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+            if ext.lower() in COMPRESSIBLE:
+                with open(source, 'rb') as src, \
+                        gzip.GzipFile(target + '.gz', 'wb', compresslevel=9, mtime=0) as dst:
+                    shutil.copyfileobj(src, dst)
+            manifest[logical] = hashed
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _accepts_gzip():
+    return request.accept_encodings['gzip'] > 0
+
+
+def _send_fingerprinted(static_folder, filename):
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    compressed = filename + '.gz'
+    use_gzip = _accepts_gzip() and os.path.isfile(os.path.join(static_folder, *compressed.split('/')))
+
+    response = send_from_directory(static_folder, compressed if use_gzip else filename,
+                                   mimetype=mimetype, max_age=ONE_YEAR)
+    response.headers.pop('Content-Disposition', None)
+    if use_gzip:
+        response.content_encoding = 'gzip'
+    if os.path.splitext(filename)[1].lower() in COMPRESSIBLE:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    manifest = load_manifest(app.static_folder)
+    app.extensions['asset_manifest'] = manifest
+    if not manifest:
+        return
+
+    @app.url_defaults
+    def fingerprinted_static_url(endpoint, values):
+        if endpoint == 'static':
+            hashed = manifest.get(values.get('filename'))
+            if hashed is not None:
+                values['filename'] = hashed
+
+    def static(filename):
+        if filename.startswith(DIST_DIR + '/'):
+            return _send_fingerprinted(app.static_folder, filename)
+        return app.send_static_file(filename)
+
+    app.view_functions['static'] = static
@@ -0,0 +1,275 @@
+"""
+Change feed for clients that keep a local copy of a user's OKRs.
+
+Every insert, update and delete of an objective, key result or check-in
+adds a row to ``change_log``. The row holds the owner's user id, the
+entity and its id, and the operation, ``upsert`` or ``delete``. Its
+``seq`` only ever grows. A client remembers the last ``seq`` it has seen
+and asks for what came after it with ``GET /changes?since=<seq>``
+(``feed``). Each page is one range scan of ``ix_change_log_user_seq``, so
+a client that is already up to date costs a single index lookup.
+
+A tombstone (``delete``) covers everything below the entity. A deleted
+objective takes its key results and check-ins with it, and a deleted key
+result takes its check-ins. Objectives are tombstoned when they are
+deleted or archived. Restoring one from the archive logs it and all of its
+children again.
+
+Where changes are recorded:
+
+* ORM writes are collected at each flush and logged at commit
+  (``_record_flushed``).
+* Bulk writes are logged by the code doing them: ``app.checkins`` and
+  ``app.archive``.
+* When a user moves to another shard, ``reset`` logs a ``reset`` row
+  followed by everything the user owns. On ``reset``, clients drop their
+  copy. Its ``seq`` is above any the user saw on the old shard, so the
+  client's cursor stays valid.
+
+Sequence numbers are assigned at insert. On PostgreSQL, a transaction
+that has logged a change to a user holds an advisory lock on that user
+until it ends. A user's rows therefore become visible in ``seq`` order,
+and their client never moves its cursor past a row that is still
+uncommitted. Writes for different users do not wait for each other. SQLite
+allows only one writer at a time anyway.
+"""
+from sqlalchemy import Integer, Select, String, bindparam, event, func, inspect, literal, select, text
+from app.models import db, ChangeLog, KeyResult, KeyResultUpdate, Objective, RoutingSession
+
+PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+# Parents before children
+ENTITIES = {Objective: 'objective', KeyResult: 'key_result', KeyResultUpdate: 'key_result_update'}
+
+_log = ChangeLog.__table__
+_objectives = Objective.__table__
+_key_results = KeyResult.__table__
+_updates = KeyResultUpdate.__table__
+_COLUMNS = ['user_id', 'entity', 'entity_id', 'op']
+_LOCK_KEY = 0x6f6b72
+
+
+def _parent(instance):
+    """The owner of an objective, the objective of a key result, the key
+    result of a check-in."""
+    if isinstance(instance, Objective):
+        return instance.user_id
+    if isinstance(instance, KeyResult):
+        return instance.objective_id
+    return instance.key_result_id
+
+
+def _owners(entity):
+    """The owner's user id, selected by the id of the entity's parent."""
+    parent_id = bindparam('parent_id', type_=Integer)
+    if entity == 'objective':
+        return select(parent_id)
+    if entity == 'key_result':
+        return select(_objectives.c.user_id).where(_objectives.c.id == parent_id)
+    return (select(_objectives.c.user_id)
+            .join_from(_key_results, _objectives, _key_results.c.objective_id == _objectives.c.id)
+            .where(_key_results.c.id == parent_id))
+
+
+_INSERTS = {
+    entity: _log.insert().from_select(_COLUMNS, _owners(entity).add_columns(
+        literal(entity, String), bindparam('entity_id', type_=Integer), bindparam('op', type_=String)))
+    for entity in ENTITIES.values()
+}
+
+
+def _owner_ids(entity, parent_ids):
+    """The owners of the entities with ``parent_ids``, as a list or a
+    SELECT."""
+    if entity == 'objective':
+        return parent_ids
+    if entity == 'key_result':
+        return select(_objectives.c.user_id).where(_objectives.c.id.in_(parent_ids))
+    return (select(_objectives.c.user_id)
+            .join_from(_key_results, _objectives, _key_results.c.objective_id == _objectives.c.id)
+            .where(_key_results.c.id.in_(parent_ids)))
+
+
+def _lock(connection, user_ids):
+    """Hold the advisory lock of each of ``user_ids`` (a list or a SELECT)
+    until the transaction ends. Taken in id order, so that two transactions
+    never wait for each other."""
+    if connection.dialect.name != 'postgresql':
+        return
+    if isinstance(user_ids, Select):
+        user_ids = connection.execute(user_ids).scalars()
+    for user_id in sorted(set(user_ids)):
+        connection.execute(text('SELECT pg_advisory_xact_lock(:key, :user_id)'),
+                           {'key': _LOCK_KEY, 'user_id': user_id})
+
+
+def record(connection, entity, changes, op='upsert'):
+    """Log ``op`` for ``changes``, a list of ``(entity id, parent id)``; see
+    ``_parent`` for what the parent is."""
+    if not changes:
+        return
+    _lock(connection, _owner_ids(entity, [parent_id for _, parent_id in changes]))
+    connection.execute(_INSERTS[entity], [
+        {'entity_id': entity_id, 'parent_id': parent_id, 'op': op} for entity_id, parent_id in changes
+    ])
+
+
+def record_objectives(connection, objective_ids, op='upsert'):
+    """Log ``op`` for whole objectives (a list or a SELECT of ids). An
+    upsert also logs every key result and check-in under them; a tombstone
+    on the objective covers those."""
+    owner = _objectives.c.user_id
+    _lock(connection, select(owner).where(_objectives.c.id.in_(objective_ids)))
+    rows = [select(owner, literal('objective', String), _objectives.c.id, literal(op, String))
+            .where(_objectives.c.id.in_(objective_ids)).order_by(_objectives.c.id)]
+    if op == 'upsert':
+        key_results = _key_results.join(_objectives, _key_results.c.objective_id == _objectives.c.id)
+        rows.append(select(owner, literal('key_result', String), _key_results.c.id, literal(op, String))
+                    .select_from(key_results)
+                    .where(_objectives.c.id.in_(objective_ids)).order_by(_key_results.c.id))
+        rows.append(select(owner, literal('key_result_update', String), _updates.c.id, literal(op, String))
+                    .select_from(_updates.join(key_results, _updates.c.key_result_id == _key_results.c.id))
+                    .where(_objectives.c.id.in_(objective_ids)).order_by(_updates.c.id))
+    for statement in rows:
+        connection.execute(_log.insert().from_select(_COLUMNS, statement))
+
+
+def last_seq(connection, user_id=None):
+    statement = select(func.max(_log.c.seq))
+    if user_id is not None:
+        statement = statement.where(_log.c.user_id == user_id)
+    return connection.execute(statement).scalar() or 0
+
+
+def reset(connection, user_id, above=0):
+    """Log a ``reset`` for ``user_id``, then everything they own. The reset
+    gets a ``seq`` greater than ``above`` (the last one the user had on
+    another shard) and than any already used here."""
+    _lock(connection, [user_id])
+    if connection.dialect.name == 'postgresql':
+        # Moving the sequence is only safe while no other transaction is
+        # logging: wait for those in progress and keep new ones out.
+        connection.execute(text('LOCK TABLE change_log IN EXCLUSIVE MODE'))
+    seq = max(last_seq(connection), above) + 1
+    connection.execute(_log.insert().values(seq=seq, user_id=user_id, entity='user',
+                                            entity_id=user_id, op='reset'))
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text("SELECT setval(pg_get_serial_sequence('change_log', 'seq'), :seq)"),
+                           {'seq': seq})
+    record_objectives(connection, select(_objectives.c.id).where(
+        _objectives.c.user_id == user_id, _objectives.c.deleted_at.is_(None)))
+
+
+def delete_user(connection, user_id):
+    connection.execute(_log.delete().where(_log.c.user_id == user_id))
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect_flush(session, flush_context):
+    # Collected until the commit, so that an entity flushed several times
+    # in one transaction is logged once.
+    pending = session.info.setdefault('changes', {})
+    flushed = [(instance, 'upsert') for instance in session.new]
+    flushed += [(instance, 'upsert') for instance in session.dirty if session.is_modified(instance)]
+    flushed += [(instance, 'delete') for instance in session.deleted]
+    for instance, op in flushed:
+        entity = ENTITIES.get(type(instance))
+        if entity is None:
+            continue
+        if entity == 'objective' and instance.deleted_at is not None:
+            op = 'delete'
+        pending.pop((entity, instance.id), None)
+        pending[(entity, instance.id)] = (_parent(instance), op)
+
+
+@event.listens_for(RoutingSession, 'before_commit')
+def _record_flushed(session):
+    session.flush()
+    pending = session.info.pop('changes', None)
+    if not pending:
+        return
+    grouped = {}
+    for (entity, entity_id), (parent_id, op) in pending.items():
+        grouped.setdefault((entity, op), []).append((entity_id, parent_id))
+    connection = session.connection(bind_arguments={'mapper': inspect(ChangeLog)})
+    for entity in ENTITIES.values():
+        for op in ('upsert', 'delete'):
+            record(connection, entity, grouped.get((entity, op)), op)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _discard(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('changes', None)
+
+
+def _date(value):
+    return value.isoformat() if value is not None else None
+
+
+def _objective_data(objective):
+    return {'id': objective.id, 'title': objective.title, 'description': objective.description,
+            'start_date': _date(objective.start_date), 'end_date': _date(objective.end_date),
+            'is_complete': bool(objective.is_complete), 'cycle_id': objective.cycle_id,
+            'tags': [tag.name for tag in objective.tags]}
+
+
+def _key_result_data(key_result):
+    return {'id': key_result.id, 'objective_id': key_result.objective_id, 'title': key_result.title,
+            'description': key_result.description, 'target_value': key_result.target_value,
+            'current_value': key_result.current_value, 'unit': key_result.unit,
+            'tags': [tag.name for tag in key_result.tags]}
+
+
+def _update_data(update):
+    return {'id': update.id, 'key_result_id': update.key_result_id, 'value': update.value,
+            'comment': update.comment, 'timestamp': _date(update.timestamp)}
+
+
+_LOADERS = {
+    'objective': (lambda ids: Objective.active().filter(Objective.id.in_(ids)), _objective_data),
+    'key_result': (lambda ids: KeyResult.query.filter(KeyResult.id.in_(ids)), _key_result_data),
+    'key_result_update': (lambda ids: KeyResultUpdate.query.filter(KeyResultUpdate.id.in_(ids)),
+                          _update_data),
+}
+
+
+def feed(user_id, since=0, limit=PAGE_SIZE):
+    """The changes to ``user_id``'s data after ``since``, oldest first, as
+    ``(changes, next, has_more)``.
+
+    Each entity appears once per page, at its latest change, with its
+    current data. Clients should apply a page as a whole, because a key
+    result can come before an update of its objective. An upsert whose
+    entity is gone by now is left out, because a later tombstone covers it.
+    """
+    rows = db.session.execute(
+        select(_log.c.seq, _log.c.entity, _log.c.entity_id, _log.c.op)
+        .where(_log.c.user_id == user_id, _log.c.seq > since)
+        .order_by(_log.c.seq).limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], since, False
+
+    latest = {}
+    for row in rows:
+        latest.pop((row.entity, row.entity_id), None)
+        latest[(row.entity, row.entity_id)] = row
+    data = {}
+    for entity, (query, serialize) in _LOADERS.items():
+        ids = [row.entity_id for row in latest.values() if row.entity == entity and row.op == 'upsert']
+        if ids:
+            data.update(((entity, item.id), serialize(item)) for item in query(ids))
+
+    changes = []
+    for key, row in latest.items():
+        change = {'seq': row.seq, 'type': row.entity, 'id': row.entity_id, 'op': row.op}
+        if row.op == 'upsert':
+            if key not in data:
+                continue
+            change['data'] = data[key]
+        changes.append(change)
+    return changes, rows[-1].seq, has_more
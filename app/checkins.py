@@ -0,0 +1,409 @@
+"""
+Write-behind buffering for key result check-ins.
+
+By default every check-in is inserted and committed by the request that
+receives it. With ``CHECKIN_BUFFER`` set to ``memory`` or ``journal`` the
+check-in is appended to a bounded in-process buffer instead and written in
+bulk - one multi-row insert and one ``current_value`` update per key result
+- when ``CHECKIN_FLUSH_SIZE`` check-ins are pending, every
+``CHECKIN_FLUSH_INTERVAL`` seconds, and when the process exits. If the
+buffer holds ``CHECKIN_MAX_PENDING`` check-ins the request that adds the
+next one flushes synchronously first, so a stalled database slows writers
+down (or fails their requests) instead of growing the buffer without limit.
+
+Durability:
+
+``memory``
+    Pending check-ins are lost if the process is killed before a flush.
+
+``journal``
+    Each check-in is appended to a per-process journal file in
+    ``CHECKIN_JOURNAL_DIR`` and fsynced before the request returns. A flush
+    rotates the journal and deletes the old segment once its rows are
+    committed. Segments left behind by a dead process are replayed by the
+    next process that starts buffering; rows that were already committed
+    are recognised by ``(key_result_id, timestamp)`` and skipped.
+
+Check-ins become visible, and ``current_value`` changes, only when they
+are flushed. ``flush()`` writes everything pending immediately. Each row
+remembers the shard of the request that added it, and a flush writes one
+transaction per shard.
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam, exists, select, tuple_
+from app.models import KeyResult, KeyResultUpdate, Objective, current_shard, shard_engine
+from app import changes, forecasts, tracking, webhooks
+
+MODES = ('off', 'memory', 'journal')
+
+_update_table = KeyResultUpdate.__table__
+_key_result_table = KeyResult.__table__
+_objective_table = Objective.__table__
+
+# Leave current_value alone if another process has already written a newer
+# check-in (replayed journals, or workers flushing out of order).
+_set_current_value = (
+    _key_result_table.update()
+    .where(_key_result_table.c.id == bindparam('kr_id'))
+    .where(~exists().where(
+        _update_table.c.key_result_id == bindparam('kr_id'),
+        _update_table.c.timestamp > bindparam('kr_timestamp', type_=_update_table.c.timestamp.type),
+    ))
+    .values(current_value=bindparam('kr_value'))
+)
+
+
+def write_checkins(connection, rows):
+    """Insert check-in rows, move each key result's ``current_value`` to
+    its latest check-in and refresh the objectives' status and the key
+    results' forecasts. Rows for key results that no longer exist are
+    dropped. Returns the number of rows written."""
+    if not rows:
+        return 0
+    ids = {row['key_result_id'] for row in rows}
+    key_results = {key_result.id: key_result for key_result in connection.execute(
+        select(_key_result_table.c.id, _key_result_table.c.objective_id, _key_result_table.c.title,
+               _key_result_table.c.target_value, _key_result_table.c.unit, _objective_table.c.user_id)
+        .join_from(_key_result_table, _objective_table,
+                   _key_result_table.c.objective_id == _objective_table.c.id)
+        .where(_key_result_table.c.id.in_(ids))
+    )}
+    rows = [row for row in rows if row['key_result_id'] in key_results]
+    if not rows:
+        return 0
+
+    inserted = connection.execute(
+        _update_table.insert().returning(_update_table.c.id, _update_table.c.key_result_id), rows
+    ).all()
+    latest = {}
+    for row in sorted(rows, key=lambda row: row['timestamp']):
+        latest[row['key_result_id']] = row
+    connection.execute(_set_current_value, [
+        {'kr_id': kr_id, 'kr_value': row['value'], 'kr_timestamp': row['timestamp']}
+        for kr_id, row in latest.items()
+    ])
+    changes.record(connection, 'key_result', [(kr_id, key_results[kr_id].objective_id) for kr_id in latest])
+    changes.record(connection, 'key_result_update', [tuple(row) for row in inserted])
+    tracking.refresh(connection, {key_results[kr_id].objective_id for kr_id in latest})
+    forecasts.refresh(connection, {kr_id: key_results[kr_id].target_value for kr_id in latest})
+    events = []
+    for row in rows:
+        key_result = key_results[row['key_result_id']]
+        events.append(webhooks.key_result_updated(key_result.user_id, key_result, row['value'],
+                                                  row['comment'], row['timestamp']))
+    webhooks.emit(connection, events)
+    return len(rows)
+
+
+def _by_shard(rows):
+    groups = {}
+    for row in rows:
+        row = dict(row)
+        groups.setdefault(row.pop('shard', None), []).append(row)
+    return groups.items()
+
+
+class _Journal:
+    """Append-only segment files, one active segment per process. Every
+    segment is held under an exclusive ``flock`` for as long as its owner
+    may still need it, which is how other processes tell orphaned segments
+    from live ones."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # Pids are reused (a restarted container often gets the same one),
+        # and a new segment must never replace an orphaned one on rename.
+        self._token = uuid.uuid4().hex[:12]
+        self._sequence = 0
+        self.segment = self._open_segment()
+
+    def _open_segment(self):
+        self._sequence += 1
+        name = f'checkins-{os.getpid()}-{self._token}-{self._sequence}'
+        path = os.path.join(self.directory, name + '.tmp')
+        handle = open(path, 'a', encoding='utf-8')
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        # Only expose the segment to recover() once it is locked.
+        final = os.path.join(self.directory, name + '.jsonl')
+        os.rename(path, final)
+        return final, handle
+
+    def append(self, rows):
+        handle = self.segment[1]
+        handle.writelines(json.dumps(_encode(row)) + '\n' for row in rows)
+        handle.flush()
+        os.fsync(handle.fileno())
+
+    def rotate(self):
+        """Start a new segment and return the previous one."""
+        previous = self.segment
+        self.segment = self._open_segment()
+        return previous
+
+    @staticmethod
+    def discard(segment):
+        path, handle = segment
+        os.unlink(path)
+        handle.close()
+
+    def recover(self):
+        """Yield ``(path, rows)`` for each segment whose owner has exited.
+        The segment stays locked until the caller's loop moves on, and is
+        deleted then if the caller did not raise."""
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.jsonl'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                handle = open(path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            with handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if os.fstat(handle.fileno()).st_nlink == 0:
+                    continue
+                rows = []
+                for line in handle:
+                    try:
+                        rows.append(_decode(json.loads(line)))
+                    except ValueError:
+                        # Torn final line from a crash mid-write; it was
+                        # never fsynced, so the request did not succeed.
+                        break
+                yield path, rows
+                os.unlink(path)
+
+    def close(self):
+        path, handle = self.segment
+        handle.close()
+        if os.path.getsize(path) == 0:
+            os.unlink(path)
+
+
+def _encode(row):
+    return dict(row, timestamp=row['timestamp'].isoformat())
+
+
+def _decode(data):
+    return dict(data, timestamp=datetime.fromisoformat(data['timestamp']))
+
+
+class CheckinBuffer:
+    def __init__(self, app, mode='memory', flush_size=200, flush_interval=2.0,
+                 max_pending=5000, journal_dir=None):
+        if mode not in ('memory', 'journal'):
+            raise ValueError(f'unknown check-in buffer mode: {mode!r}')
+        self.app = app
+        self.mode = mode
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.journal_dir = journal_dir
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = deque()
+        self._orphaned = []
+        self._pid = None
+        self._journal = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def _start(self):
+        """Set up per-process state. Runs lazily on the first check-in so
+        that nothing (threads, locked files) is inherited across a fork of
+        a preloaded app."""
+        self._pid = os.getpid()
+        self._pending = deque()
+        self._orphaned = []
+        self._wakeup = threading.Event()
+        if self.mode == 'journal':
+            self._journal = _Journal(self.journal_dir)
+        thread = threading.Thread(target=self._run, name='checkin-flusher', daemon=True)
+        thread.start()
+
+    def add(self, key_result_id, value, comment=None, timestamp=None, shard=None):
+        self.add_many([(key_result_id, value, comment)], timestamp=timestamp, shard=shard)
+
+    def add_many(self, checkins, timestamp=None, shard=None):
+        """Buffer ``(key_result_id, value, comment)`` check-ins together,
+        with a single journal write."""
+        timestamp = timestamp or datetime.utcnow()
+        rows = []
+        for key_result_id, value, comment in checkins:
+            row = {
+                'key_result_id': key_result_id,
+                'value': value,
+                'comment': comment,
+                'timestamp': timestamp,
+            }
+            if shard is not None:
+                row['shard'] = shard
+            rows.append(row)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+            full = len(self._pending) >= self.max_pending
+        if full:
+            # Flush before accepting the row, so if the database is down the
+            # check-in is rejected rather than silently queued past the limit.
+            self.flush()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(rows)
+            self._pending.extend(rows)
+            pending = len(self._pending)
+        if pending >= self.flush_size:
+            self._wakeup.set()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Write everything pending and return the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                if self._pid != os.getpid() or not self._pending:
+                    return 0
+                rows = list(self._pending)
+                self._pending.clear()
+                segment = self._journal.rotate() if self._journal is not None else None
+            try:
+                written = self._write(rows)
+            except Exception:
+                # Put the unwritten rows back in front of anything added
+                # meanwhile; their journal segment stays on disk until a
+                # later flush.
+                with self._lock:
+                    self._pending.extendleft(reversed(rows))
+                    if segment is not None:
+                        self._orphaned.append(segment)
+                raise
+            if segment is not None:
+                self._journal.discard(segment)
+                while self._orphaned:
+                    self._journal.discard(self._orphaned.pop())
+            return written
+
+    def _write(self, rows):
+        """Write ``rows`` in one transaction per shard. Rows are removed
+        from the list as their shard commits."""
+        written = 0
+        with self.app.app_context():
+            for shard, group in _by_shard(rows):
+                with shard_engine(shard).begin() as connection:
+                    written += write_checkins(connection, group)
+                rows[:] = [row for row in rows if row.get('shard') != shard]
+        return written
+
+    def _recover(self):
+        for path, rows in self._journal.recover():
+            with self.app.app_context():
+                for shard, group in _by_shard(rows):
+                    self._replay(shard, group)
+            self.app.logger.info('Replayed %d check-ins from %s', len(rows), path)
+
+    def _replay(self, shard, rows):
+        with shard_engine(shard).begin() as connection:
+            for start in range(0, len(rows), 500):
+                chunk = rows[start:start + 500]
+                keys = [(row['key_result_id'], row['timestamp']) for row in chunk]
+                written = {tuple(key) for key in connection.execute(
+                    select(_update_table.c.key_result_id, _update_table.c.timestamp)
+                    .where(tuple_(_update_table.c.key_result_id,
+                                  _update_table.c.timestamp).in_(keys))
+                )}
+                write_checkins(connection, [
+                    row for row, key in zip(chunk, keys) if key not in written
+                ])
+
+    def _run(self):
+        pid = os.getpid()
+        if self._journal is not None:
+            try:
+                self._recover()
+            except Exception:
+                self.app.logger.exception('Replaying check-in journals failed')
+        while not self._closed and self._pid == pid:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Flushing buffered check-ins failed')
+
+    def close(self):
+        """Flush and stop; registered with ``atexit``."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._pid != os.getpid():
+            return
+        try:
+            self.flush()
+        finally:
+            if self._journal is not None and not self._pending:
+                self._journal.close()
+
+
+def init_app(app):
+    mode = app.config.get('CHECKIN_BUFFER', 'off')
+    if mode not in MODES:
+        raise ValueError(f'CHECKIN_BUFFER must be one of {", ".join(MODES)}')
+    if mode == 'off':
+        app.extensions['checkins'] = None
+        return
+    journal_dir = (app.config.get('CHECKIN_JOURNAL_DIR')
+                   or os.path.join(app.instance_path, 'checkins'))
+    app.extensions['checkins'] = CheckinBuffer(
+        app,
+        mode=mode,
+        flush_size=app.config.get('CHECKIN_FLUSH_SIZE', 200),
+        flush_interval=app.config.get('CHECKIN_FLUSH_INTERVAL', 2.0),
+        max_pending=app.config.get('CHECKIN_MAX_PENDING', 5000),
+        journal_dir=journal_dir,
+    )
+
+
+def buffer():
+    return current_app.extensions.get('checkins')
+
+
+def enqueue(key_result, value, comment=None):
+    """Buffer a check-in. Returns False when buffering is off, in which case
+    the caller writes the ``KeyResultUpdate`` itself."""
+    checkin_buffer = buffer()
+    if checkin_buffer is None:
+        return False
+    checkin_buffer.add(key_result.id, value, comment, shard=current_shard())
+    return True
+
+
+def enqueue_many(checkins):
+    """Buffer several ``(key_result, value, comment)`` check-ins at once;
+    see ``enqueue``."""
+    checkin_buffer = buffer()
+    if checkin_buffer is None:
+        return False
+    checkin_buffer.add_many([(key_result.id, value, comment) for key_result, value, comment in checkins],
+                            shard=current_shard())
+    return True
+
+
+def flush():
+    """Write all buffered check-ins now; a no-op when buffering is off."""
+    checkin_buffer = buffer()
+    return checkin_buffer.flush() if checkin_buffer is not None else 0
@@ -0,0 +1,266 @@
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from datetime import datetime, timedelta
+from app import search, reports, assets, templating, archive, purge, sharding, webhooks, forecasts, tracking, stats
+from app.models import db, User, ShardMap, shard_engine
+
+search_cli = AppGroup('search', help='Manage the full-text search index.')
+
+@search_cli.command('reindex')
+def reindex():
+    """Rebuild the search index from the objectives and key results tables."""
+    for _ in sharding.each():
+        search.rebuild_index()
+    click.echo('Search index rebuilt.')
+
+reports_cli = AppGroup('reports', help='Maintain report data.')
+
+@reports_cli.command('snapshot')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last day to snapshot (default: today, UTC).')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Objectives per bulk insert.')
+def snapshot(until, batch_size):
+    """Record daily objective progress snapshots since the last run."""
+    written = 0
+    for _ in sharding.each():
+        written += reports.materialize_snapshots(until=until.date() if until else None,
+                                                 batch_size=batch_size)
+    click.echo(f'Wrote {written} snapshot rows.')
+
+users_cli = AppGroup('users', help='Manage user accounts.')
+
+@users_cli.command('set-admin')
+@click.argument('username')
+@click.option('--revoke', is_flag=True, help='Remove admin rights instead.')
+def set_admin(username, revoke):
+    """Grant (or revoke) admin rights for USERNAME."""
+    user = None
+    if sharding.activate_for_username(username):
+        user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user named {username}.')
+    user.is_admin = not revoke
+    db.session.commit()
+    click.echo(f"{username} is {'no longer' if revoke else 'now'} an admin.")
+
+assets_cli = AppGroup('assets', help='Build static assets.')
+
+@assets_cli.command('build')
+def build():
+    """Write fingerprinted, gzip-compressed static files and their manifest."""
+    manifest = assets.build_assets(current_app.static_folder)
+    for logical, hashed in sorted(manifest.items()):
+        click.echo(f'{logical} -> {hashed}')
+
+templates_cli = AppGroup('templates', help='Manage compiled templates.')
+
+@templates_cli.command('warm')
+def warm():
+    """Precompile all templates into the bytecode cache."""
+    if not current_app.config.get('TEMPLATE_CACHE_DIR'):
+        raise click.ClickException('TEMPLATE_CACHE_DIR is not set.')
+    timings = templating.warm_templates(current_app)
+    total = sum(seconds for _, seconds in timings)
+    click.echo(f'Compiled {len(timings)} templates in {total * 1000:.1f}ms '
+               f'into {current_app.config["TEMPLATE_CACHE_DIR"]}.')
+
+archive_cli = AppGroup('archive', help='Move finished objectives to and from the archive tables.')
+
+@archive_cli.command('run')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Archive objectives that ended before this day.')
+@click.option('--older-than-days', default=365, show_default=True,
+              help='Cutoff in days before today, if --before is not given.')
+@click.option('--batch-size', default=100, show_default=True,
+              help='Objectives moved per transaction.')
+def archive_run(before, older_than_days, batch_size):
+    """Archive completed objectives that ended before the cutoff."""
+    before = before or datetime.utcnow() - timedelta(days=older_than_days)
+    archived = 0
+    for shard in sharding.each():
+        try:
+            archived += archive.archive_objectives(before=before, batch_size=batch_size)
+        except archive.ArchiveError as exc:
+            raise click.ClickException(f'{shard}: {exc}' if shard else str(exc))
+    click.echo(f'Archived {archived} objectives that ended before {before:%Y-%m-%d}.')
+    if archived:
+        click.echo('Their report snapshots were archived too; progress reports no longer count them.')
+
+@archive_cli.command('restore')
+@click.argument('objective_id', type=int)
+@click.option('--shard', default=None, help='Shard holding the objective (with sharding on).')
+def archive_restore(objective_id, shard):
+    """Move OBJECTIVE_ID back from the archive."""
+    if sharding.enabled() and shard not in sharding.shard_names():
+        raise click.ClickException(f'--shard must be one of {", ".join(sharding.shard_names())}.')
+    try:
+        with sharding.use(shard):
+            objective = archive.restore_objective(objective_id)
+    except archive.ArchiveError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f'Restored objective {objective.id} ({objective.title}).')
+
+objectives_cli = AppGroup('objectives', help='Maintain objectives.')
+
+@objectives_cli.command('purge')
+@click.option('--batch-size', default=None, type=int,
+              help='Rows deleted per transaction (default: PURGE_BATCH_SIZE).')
+def purge_objectives(batch_size):
+    """Remove the rows of all deleted objectives."""
+    purged = 0
+    for _ in sharding.each():
+        purged += purge.purge_deleted(batch_size=batch_size or current_app.config['PURGE_BATCH_SIZE'])
+    click.echo(f'Purged {purged} deleted objectives.')
+
+@objectives_cli.command('refresh-status')
+@click.option('--batch-size', default=tracking.BATCH_SIZE, show_default=True,
+              help='Objectives updated per statement.')
+def refresh_status(batch_size):
+    """Recompute the on track / at risk / off track status of every objective."""
+    changed = 0
+    for shard in sharding.each():
+        with shard_engine(shard).begin() as connection:
+            changed += tracking.refresh_all(connection, batch_size=batch_size)
+    click.echo(f'Updated the status of {changed} objectives.')
+
+shards_cli = AppGroup('shards', help='Manage tenant shards.')
+
+@shards_cli.command('list')
+def shards_list():
+    """Show each shard and how many users it holds."""
+    sizes = sharding.shard_sizes() if sharding.enabled() else {}
+    for name in sharding.shard_names():
+        click.echo(f'{name}: {sizes.get(name, 0)} users')
+
+@shards_cli.command('upgrade')
+@click.option('--revision', default='head', show_default=True)
+def shards_upgrade(revision):
+    """Run the database migrations on every shard."""
+    init_migrate(current_app)
+    from flask_migrate import upgrade
+    for name in sharding.shard_names():
+        click.echo(f'Upgrading {name}...')
+        upgrade(revision=revision, x_arg=[f'shard={name}'])
+
+@shards_cli.command('init')
+def shards_init():
+    """Add the existing users of the default database to the shard map."""
+    if not sharding.enabled():
+        raise click.ClickException('No shards configured (SHARD_DATABASE_URLS).')
+    added = sharding.register_existing_users()
+    click.echo(f'Added {added} users to the shard map.')
+
+@shards_cli.command('rebalance')
+@click.argument('username')
+@click.argument('target')
+def shards_rebalance(username, target):
+    """Move all of USERNAME's data to the TARGET shard."""
+    entry = ShardMap.query.filter_by(username=username).first() if sharding.enabled() else None
+    if entry is None:
+        raise click.ClickException(f'{username} is not in the shard map.')
+    source = entry.shard
+    try:
+        copied = sharding.move_user(entry.id, target)
+    except sharding.ShardingError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f'Moved {username} from {source} to {target} ({copied} rows).')
+
+forecasts_cli = AppGroup('forecasts', help='Maintain key result forecasts.')
+
+@forecasts_cli.command('refresh')
+@click.option('--batch-size', default=forecasts.BATCH_SIZE, show_default=True,
+              help='Key results fitted per query.')
+def forecasts_refresh(batch_size):
+    """Recompute the completion forecast of every key result."""
+    started = time.perf_counter()
+    refreshed = 0
+    for shard in sharding.each():
+        with shard_engine(shard).begin() as connection:
+            refreshed += forecasts.refresh_all(connection, batch_size=batch_size)
+    click.echo(f'Refreshed {refreshed} forecasts in {time.perf_counter() - started:.1f}s '
+               f'({"NumPy" if forecasts.numpy_available() else "pure Python"}).')
+
+stats_cli = AppGroup('stats', help='Maintain the admin statistics.')
+
+@stats_cli.command('refresh')
+def stats_refresh():
+    """Recompute every user's totals for the admin overview."""
+    refreshed = 0
+    for shard in sharding.each():
+        with shard_engine(shard).begin() as connection:
+            refreshed += stats.refresh(connection)
+    click.echo(f'Refreshed statistics for {refreshed} users.')
+
+webhooks_cli = AppGroup('webhooks', help='Send outbound webhooks.')
+
+@webhooks_cli.command('deliver')
+@click.option('--loop', is_flag=True, help='Keep running, checking for new events every --interval seconds.')
+@click.option('--interval', default=2.0, show_default=True, help='Seconds between checks with --loop.')
+def webhooks_deliver(loop, interval):
+    """Send the webhook events that are due."""
+    client = webhooks.make_client()
+    try:
+        while True:
+            sent = failed = 0
+            for shard in sharding.each():
+                shard_sent, shard_failed = webhooks.deliver(shard_engine(shard), client)
+                sent += shard_sent
+                failed += shard_failed
+            if sent or failed or not loop:
+                click.echo(f'Sent {sent} events, {failed} failed.')
+            if not loop:
+                break
+            time.sleep(interval)
+    finally:
+        client.close()
+
+def init_migrate(app):
+    """Attach Flask-Migrate to ``app`` on first use.
+    
+    Alembic is by far the most expensive import in the project and is only
+    needed to manage the schema, not to serve requests, so it is kept out of
+    ``create_app``.
+    """
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        Migrate(app, db, render_as_batch=True, include_object=_include_object)
+    return app.extensions['migrate']
+
+def _include_object(object, name, type_, reflected, compare_to):
+    # The search index is managed by app.search, not by autogenerate
+    return not (type_ == 'table' and name.startswith('search_'))
+
+class LazyMigrateGroup(click.Group):
+    """The ``flask db`` command group, loaded only when it is invoked."""
+    
+    def __init__(self, app):
+        super().__init__('db', help='Perform database migrations.')
+        self.app = app
+    
+    def _group(self):
+        init_migrate(self.app)
+        from flask_migrate.cli import db as migrate_group
+        return migrate_group
+    
+    def list_commands(self, ctx):
+        return self._group().list_commands(ctx)
+    
+    def get_command(self, ctx, name):
+        return self._group().get_command(ctx, name)
+
+def register_commands(app):
+    app.cli.add_command(search_cli)
+    app.cli.add_command(reports_cli)
+    app.cli.add_command(users_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(templates_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(objectives_cli)
+    app.cli.add_command(shards_cli)
+    app.cli.add_command(forecasts_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(webhooks_cli)
+    app.cli.add_command(LazyMigrateGroup(app))
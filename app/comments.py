@@ -0,0 +1,126 @@
+"""
+Threaded comments on objectives and key results.
+
+Top-level comments are paginated newest first with a keyset cursor on
+``(timestamp, id)``; the replies of the threads on a page are fetched with
+one extra query through ``root_id``. Each new comment bumps the
+``comment_count`` and ``last_activity_at`` columns of the commented row in
+the same transaction, so listings never have to count comments.
+"""
+from datetime import datetime
+from sqlalchemy import and_, or_
+from app.models import db, Comment, Objective, KeyResult
+
+PER_PAGE = 20
+
+
+class Thread:
+    """A top-level comment and its replies as ``(depth, comment)`` pairs in
+    display order."""
+
+    def __init__(self, comment):
+        self.comment = comment
+        self.replies = []
+
+
+class CommentPage:
+    def __init__(self, threads, next_cursor):
+        self.threads = threads
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(comment):
+    return f'{comment.timestamp.isoformat()}_{comment.id}'
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, comment_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(comment_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _target_column(target):
+    if isinstance(target, Objective):
+        return Comment.objective_id
+    return Comment.key_result_id
+
+
+def add_comment(target, user, body, parent=None):
+    """Add a comment (or a reply to ``parent``) and bump the counters."""
+    now = datetime.utcnow()
+    comment = Comment(body=body, timestamp=now, user_id=user.id)
+    if isinstance(target, Objective):
+        comment.objective_id = target.id
+    else:
+        comment.key_result_id = target.id
+    if parent is not None:
+        comment.parent_id = parent.id
+        comment.root_id = parent.root_id or parent.id
+    db.session.add(comment)
+
+    model = type(target)
+    model.query.filter_by(id=target.id).update({
+        model.comment_count: model.comment_count + 1,
+        model.last_activity_at: now,
+    }, synchronize_session=False)
+    return comment
+
+
+def delete_comment(comment):
+    """Delete a comment together with its replies."""
+    doomed = [comment]
+    if comment.root_id is None:
+        doomed.extend(Comment.query.filter_by(root_id=comment.id).all())
+    else:
+        pending = [comment.id]
+        while pending:
+            children = Comment.query.filter(Comment.parent_id.in_(pending)).all()
+            doomed.extend(children)
+            pending = [child.id for child in children]
+
+    target_model = Objective if comment.objective_id else KeyResult
+    target_id = comment.objective_id or comment.key_result_id
+    target_model.query.filter_by(id=target_id).update({
+        target_model.comment_count: target_model.comment_count - len(doomed),
+    }, synchronize_session=False)
+
+    for doomed_comment in reversed(doomed):
+        db.session.delete(doomed_comment)
+
+
+def _flatten(replies, children, parent_id, depth):
+    for reply in children.get(parent_id, []):
+        replies.append((depth, reply))
+        _flatten(replies, children, reply.id, depth + 1)
+
+
+def thread_page(target, cursor=None, per_page=PER_PAGE):
+    """One page of threads on ``target``, newest first."""
+    column = _target_column(target)
+    query = Comment.query.filter(column == target.id, Comment.parent_id.is_(None))
+
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        timestamp, comment_id = position
+        query = query.filter(or_(
+            Comment.timestamp < timestamp,
+            and_(Comment.timestamp == timestamp, Comment.id < comment_id),
+        ))
+
+    roots = query.order_by(Comment.timestamp.desc(), Comment.id.desc())\
+        .limit(per_page + 1).all()
+    next_cursor = encode_cursor(roots[per_page - 1]) if len(roots) > per_page else None
+    roots = roots[:per_page]
+
+    threads = {root.id: Thread(root) for root in roots}
+    if threads:
+        children = {}
+        for reply in Comment.query.filter(Comment.root_id.in_(list(threads)))\
+                .order_by(Comment.timestamp, Comment.id):
+            children.setdefault(reply.parent_id, []).append(reply)
+        for thread in threads.values():
+            _flatten(thread.replies, children, thread.comment.id, 1)
+
+    return CommentPage(list(threads.values()), next_cursor)
@@ -0,0 +1,185 @@
+"""
+Response compression.
+
+``CompressionMiddleware`` wraps the WSGI app and gzip- or
+deflate-compresses responses for clients that accept it. It never buffers
+more than ``min_size`` bytes: once that much body has been seen (or the
+declared Content-Length is large enough) the rest is compressed chunk by
+chunk as the application produces it, so streamed and generator responses
+keep streaming. Small bodies, non-text content types and responses that
+already carry a Content-Encoding (such as precompressed static assets)
+pass through untouched.
+"""
+import zlib
+from werkzeug.http import parse_accept_header
+
+DEFAULT_MIMETYPES = frozenset({
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/xml',
+    'text/csv',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+})
+
+# zlib wbits for each content coding: gzip container and zlib ("deflate")
+WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+SKIP_STATUSES = ('204', '206', '304')
+
+
+class CompressionMiddleware:
+    def __init__(self, app, level=6, min_size=500, mimetypes=DEFAULT_MIMETYPES):
+        self.app = app
+        self.level = level
+        self.min_size = min_size
+        self.mimetypes = frozenset(mimetypes)
+
+    def __call__(self, environ, start_response):
+        coding = self._negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        response = {}
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+            response['exc_info'] = exc_info
+            return written.append
+
+        app_iter = self.app(environ, capture)
+
+        # Most apps (Flask included) start the response before returning;
+        # when the outcome is already clear, hand the body straight through.
+        if 'status' in response and not written:
+            decision = self._decide(response['status'], response['headers'], None)
+            if decision is False:
+                start_response(response['status'], response['headers'], response['exc_info'])
+                return app_iter
+
+        return self._stream(app_iter, coding, response, written, start_response)
+
+    @staticmethod
+    def _negotiate(header):
+        accept = parse_accept_header(header)
+        gzip, deflate = accept['gzip'], accept['deflate']
+        if gzip and gzip >= deflate:
+            return 'gzip'
+        if deflate:
+            return 'deflate'
+        return None
+
+    def _decide(self, status, headers, seen):
+        """True/False once it is known whether to compress, else None.
+
+        ``seen`` is the number of body bytes buffered so far, or None when
+        nothing has been read yet.
+        """
+        if status[:3] in SKIP_STATUSES:
+            return False
+        content_type = None
+        length = None
+        for name, value in headers:
+            name = name.lower()
+            if name == 'content-encoding':
+                return False
+            if name == 'cache-control' and 'no-transform' in value.lower():
+                return False
+            if name == 'content-type':
+                content_type = value.split(';', 1)[0].strip().lower()
+            elif name == 'content-length' and value.isdigit():
+                length = int(value)
+        if content_type not in self.mimetypes:
+            return False
+        if length is not None:
+            return length >= self.min_size
+        if seen is not None and seen >= self.min_size:
+            return True
+        return None
+
+    def _stream(self, app_iter, coding, response, written, start_response):
+        iterator = iter(app_iter)
+        try:
+            buffered = list(written)
+            seen = sum(len(chunk) for chunk in buffered)
+            exhausted = False
+            decision = None
+            while True:
+                if 'status' in response:
+                    decision = self._decide(response['status'], response['headers'], seen)
+                    if decision is not None:
+                        break
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                buffered.extend(written)
+                del written[:]
+                buffered.append(chunk)
+                seen += len(chunk)
+
+            buffered.extend(written)
+            del written[:]
+            if not decision:
+                start_response(response['status'], response['headers'], response['exc_info'])
+                yield from buffered
+                if not exhausted:
+                    yield from iterator
+                return
+
+            start_response(response['status'],
+                           self._compressed_headers(response['headers'], coding),
+                           response['exc_info'])
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, WBITS[coding])
+            if exhausted:
+                yield compressor.compress(b''.join(buffered)) + compressor.flush()
+                return
+
+            # Streaming: flush after each chunk so the client receives data
+            # as soon as the application produces it.
+            for chunk in buffered:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            for chunk in iterator:
+                data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    @staticmethod
+    def _compressed_headers(headers, coding):
+        result = []
+        vary = None
+        for name, value in headers:
+            lowered = name.lower()
+            if lowered == 'content-length':
+                continue
+            if lowered == 'etag' and not value.startswith('W/'):
+                value = 'W/' + value
+            if lowered == 'vary':
+                vary = value
+                continue
+            result.append((name, value))
+        if vary is None:
+            vary = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower() and vary.strip() != '*':
+            vary = vary + ', Accept-Encoding'
+        result.append(('Vary', vary))
+        result.append(('Content-Encoding', coding))
+        return result
+
+
+def init_app(app):
+    if app.config.get('COMPRESS_ENABLED', True):
+        app.wsgi_app = CompressionMiddleware(app.wsgi_app,
+                                             level=app.config.get('COMPRESS_LEVEL', 6),
+                                             min_size=app.config.get('COMPRESS_MIN_SIZE', 500))
@@ -3,7 +3,84 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+_shard_urls = [url.strip() for url in os.environ.get('SHARD_DATABASE_URLS', '').split(',') if url.strip()]
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'hard-to-guess-string'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///okr.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Directory for compiled template bytecode shared by all workers
+    # (app/templating.py); unset disables the cache.
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+    
+    # JSON request logs (app/requestlog.py), written by a background thread
+    # to REQUEST_LOG_FILE or stderr. Records beyond REQUEST_LOG_QUEUE_SIZE
+    # waiting to be written are dropped rather than slowing requests down.
+    REQUEST_LOG_ENABLED = os.environ.get('REQUEST_LOG_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    REQUEST_LOG_FILE = os.environ.get('REQUEST_LOG_FILE')
+    REQUEST_LOG_QUEUE_SIZE = int(os.environ.get('REQUEST_LOG_QUEUE_SIZE', 10000))
+    
+    # /readyz checks every shard at most once per READINESS_CACHE_SECONDS
+    # (app/health.py).
+    READINESS_CACHE_SECONDS = float(os.environ.get('READINESS_CACHE_SECONDS', 5))
+    
+    # Response compression (app/compression.py). Higher levels trade CPU
+    # for bandwidth; bodies smaller than COMPRESS_MIN_SIZE bytes are sent as is.
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+    
+    # Write-behind check-ins (app/checkins.py): 'off' commits each check-in
+    # in its request, 'memory' buffers them in process, 'journal' also
+    # fsyncs each one to CHECKIN_JOURNAL_DIR so a crash does not lose them.
+    CHECKIN_BUFFER = os.environ.get('CHECKIN_BUFFER', 'off').lower()
+    CHECKIN_FLUSH_SIZE = int(os.environ.get('CHECKIN_FLUSH_SIZE', 200))
+    CHECKIN_FLUSH_INTERVAL = float(os.environ.get('CHECKIN_FLUSH_INTERVAL', 2.0))
+    CHECKIN_MAX_PENDING = int(os.environ.get('CHECKIN_MAX_PENDING', 5000))
+    CHECKIN_JOURNAL_DIR = os.environ.get('CHECKIN_JOURNAL_DIR')
+    
+    # Outbound webhooks (app/webhooks.py), sent by `flask webhooks deliver`.
+    # Each round claims WEBHOOK_CLAIM_SIZE due events per shard for
+    # WEBHOOK_CLAIM_SECONDS and POSTs up to WEBHOOK_BATCH_SIZE events per
+    # request, on WEBHOOK_CONCURRENCY threads with at most
+    # WEBHOOK_ENDPOINT_CONCURRENCY requests in flight per receiving host.
+    # Failures are retried with exponential backoff from WEBHOOK_BACKOFF_BASE
+    # up to WEBHOOK_BACKOFF_MAX seconds, WEBHOOK_MAX_ATTEMPTS times in all.
+    WEBHOOK_CLAIM_SIZE = int(os.environ.get('WEBHOOK_CLAIM_SIZE', 500))
+    WEBHOOK_CLAIM_SECONDS = int(os.environ.get('WEBHOOK_CLAIM_SECONDS', 300))
+    WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', 50))
+    WEBHOOK_CONCURRENCY = int(os.environ.get('WEBHOOK_CONCURRENCY', 8))
+    WEBHOOK_ENDPOINT_CONCURRENCY = int(os.environ.get('WEBHOOK_ENDPOINT_CONCURRENCY', 2))
+    WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', 10))
+    WEBHOOK_BACKOFF_BASE = float(os.environ.get('WEBHOOK_BACKOFF_BASE', 30))
+    WEBHOOK_BACKOFF_MAX = float(os.environ.get('WEBHOOK_BACKOFF_MAX', 6 * 3600))
+    WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 12))
+    # Receivers on loopback, private or link-local addresses are refused
+    # unless this is set, e.g. for a receiver on the local network.
+    WEBHOOK_ALLOW_PRIVATE = os.environ.get('WEBHOOK_ALLOW_PRIVATE', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Login/registration throttling (app/ratelimit.py). Rates are
+    # "burst/seconds"; buckets are shared by all workers through
+    # RATELIMIT_STORAGE (a SQLite file, instance/ratelimit.sqlite by default).
+    # Behind a reverse proxy, set RATELIMIT_PROXY_COUNT to the number of
+    # proxies that append to X-Forwarded-For.
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RATELIMIT_STORAGE = os.environ.get('RATELIMIT_STORAGE')
+    RATELIMIT_PROXY_COUNT = int(os.environ.get('RATELIMIT_PROXY_COUNT', 0))
+    RATELIMIT_LOGIN_PER_IP = os.environ.get('RATELIMIT_LOGIN_PER_IP', '20/60')
+    RATELIMIT_LOGIN_PER_USERNAME = os.environ.get('RATELIMIT_LOGIN_PER_USERNAME', '5/60')
+    RATELIMIT_REGISTER_PER_IP = os.environ.get('RATELIMIT_REGISTER_PER_IP', '5/600')
+    
+    # Deleted objectives are hidden at once and removed in chunks of
+    # PURGE_BATCH_SIZE rows (app/purge.py), by a background thread in the
+    # worker that handled the delete or by `flask objectives purge`.
+    PURGE_IN_BACKGROUND = os.environ.get('PURGE_IN_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+    PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 1000))
+    
+    # Tenant sharding (app/sharding.py). SQLALCHEMY_DATABASE_URI is the
+    # 'default' shard and holds the shard directory; SHARD_DATABASE_URLS
+    # (comma separated) adds shard1, shard2, ... Moving a user waits
+    # SHARD_MOVE_GRACE seconds for in-flight writes to the old shard.
+    SQLALCHEMY_BINDS = {f'shard{number}': url for number, url in enumerate(_shard_urls, 1)}
+    SHARD_MOVE_GRACE = float(os.environ.get('SHARD_MOVE_GRACE', 5))
@@ -0,0 +1,185 @@
+"""
+OKR cycles: the periods, usually quarters, that objectives are planned in.
+
+Each objective can belong to one of its owner's cycles (``cycle_id``).
+The dashboard and the objectives list show the active cycle, the one
+today falls in, unless another cycle or all of them are picked with
+``?cycle=<id>`` or ``?cycle=all``. Users without cycles see everything.
+Objectives are indexed by ``(user_id, cycle_id, ...)``, so a cycle's
+objectives are read without going through the rest of the user's history.
+
+``roll_over`` carries the unfinished key results of one cycle into
+another with a fixed number of INSERT ... SELECT statements, however many
+objectives there are. Each incomplete objective with a key result short of
+its target gets a copy in the target cycle, with the target cycle's dates
+and the same tags. The copy holds copies of those key results at their
+current values. Check-in history stays with the originals. An objective
+is rolled over into a given cycle at most once (``rolled_over_from_id``),
+so running it again only picks up what is new.
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import exists, false, func, literal, select, update
+from app.models import db, Cycle, KeyResult, Objective, objective_tags
+from app import changes, search, tracking
+
+ALL = 'all'
+
+_objectives = Objective.__table__
+_key_results = KeyResult.__table__
+
+
+def for_user(user_id):
+    """The user's cycles, latest first."""
+    return Cycle.query.filter_by(user_id=user_id)\
+        .order_by(Cycle.start_date.desc(), Cycle.id.desc()).all()
+
+
+def active(cycles, today=None):
+    """The cycle of ``cycles`` (latest first) that ``today`` falls in."""
+    today = today or datetime.utcnow().date()
+    for cycle in cycles:
+        if cycle.start_date.date() <= today <= cycle.end_date.date():
+            return cycle
+    return None
+
+
+def pick(cycles, value):
+    """The cycle selected by a ``cycle`` query argument: a cycle id, ``all``
+    (None) or, by default, the active cycle."""
+    if value == ALL:
+        return None
+    for cycle in cycles:
+        if value and str(cycle.id) == value:
+            return cycle
+    return active(cycles)
+
+
+def filter_objectives(query, cycle):
+    """Restrict an Objective query to ``cycle`` (no-op for None)."""
+    if cycle is None:
+        return query
+    return query.filter(Objective.cycle_id == cycle.id)
+
+
+def choices(cycles):
+    """Choices for an objective's cycle field."""
+    return [(0, 'No cycle')] + [(cycle.id, cycle.name) for cycle in cycles]
+
+
+def quarter(day):
+    """``(name, first day, last day)`` of the calendar quarter of ``day``."""
+    first_month = (day.month - 1) // 3 * 3 + 1
+    start = date(day.year, first_month, 1)
+    following = date(day.year + 1, 1, 1) if first_month == 10 else date(day.year, first_month + 3, 1)
+    return f'{day.year} Q{first_month // 3 + 1}', start, following - timedelta(days=1)
+
+
+def next_quarter(cycles):
+    """The quarter after the latest of ``cycles``, or the current one."""
+    if cycles:
+        return quarter(max(cycle.end_date for cycle in cycles).date() + timedelta(days=1))
+    return quarter(datetime.utcnow().date())
+
+
+def copy_user(source, target, user_id):
+    """Copy a user's cycles to another shard. Returns ``{old id: new
+    id}``."""
+    cycles = Cycle.__table__
+    ids = {}
+    for row in source.execute(select(cycles).where(cycles.c.user_id == user_id)
+                              .order_by(cycles.c.id)).mappings():
+        row = dict(row)
+        old_id = row.pop('id')
+        ids[old_id] = target.execute(cycles.insert().values(**row)).inserted_primary_key[0]
+    return ids
+
+
+def delete_user(connection, user_id):
+    cycles = Cycle.__table__
+    connection.execute(cycles.delete().where(cycles.c.user_id == user_id))
+
+
+def objective_counts(user_id):
+    """``{cycle id: number of objectives}``."""
+    return dict(db.session.execute(
+        select(Objective.cycle_id, func.count())
+        .where(Objective.user_id == user_id, Objective.cycle_id.isnot(None),
+               Objective.deleted_at.is_(None))
+        .group_by(Objective.cycle_id)
+    ).all())
+
+
+def assign_objectives(cycle):
+    """Put the owner's objectives without a cycle that are due within
+    ``cycle`` into it, and log the change for sync clients. Returns their
+    number."""
+    connection = db.session.connection()
+    assigned = connection.execute(
+        update(_objectives)
+        .where(_objectives.c.user_id == cycle.user_id, _objectives.c.cycle_id.is_(None),
+               _objectives.c.end_date >= cycle.start_date,
+               _objectives.c.end_date < cycle.end_date + timedelta(days=1))
+        .values(cycle_id=cycle.id)
+        .returning(_objectives.c.id, _objectives.c.user_id)
+    ).all()
+    # Only the objectives themselves changed, not what is under them.
+    changes.record(connection, 'objective', [tuple(row) for row in assigned])
+    return len(assigned)
+
+
+def roll_over(source, target):
+    """Copy the unfinished key results of the ``source`` cycle, under copies
+    of their objectives, into the ``target`` cycle. The caller commits.
+    Returns ``(objectives, key results)`` copied."""
+    connection = db.session.connection()
+    copies = _objectives.alias('copy')
+    unfinished = KeyResult.progress < 100
+    already_rolled_over = exists().where(copies.c.rolled_over_from_id == _objectives.c.id,
+                                         copies.c.cycle_id == target.id, copies.c.deleted_at.is_(None))
+    objective_ids = connection.execute(
+        _objectives.insert().from_select(
+            ['title', 'description', 'start_date', 'end_date', 'is_complete', 'user_id',
+             'cycle_id', 'rolled_over_from_id', 'comment_count'],
+            select(_objectives.c.title, _objectives.c.description,
+                   literal(target.start_date, _objectives.c.start_date.type),
+                   literal(target.end_date, _objectives.c.end_date.type), false(),
+                   _objectives.c.user_id, literal(target.id), _objectives.c.id, literal(0))
+            .where(_objectives.c.user_id == source.user_id, _objectives.c.cycle_id == source.id,
+                   _objectives.c.deleted_at.is_(None), _objectives.c.is_complete.isnot(True),
+                   exists().where(_key_results.c.objective_id == _objectives.c.id, unfinished),
+                   ~already_rolled_over)
+            .order_by(_objectives.c.id)
+        ).returning(_objectives.c.id)
+    ).scalars().all()
+    if not objective_ids:
+        return 0, 0
+
+    copied = copies.c.id.in_(objective_ids)
+    key_results = connection.execute(
+        _key_results.insert().from_select(
+            ['title', 'description', 'target_value', 'current_value', 'unit', 'objective_id',
+             'comment_count'],
+            select(_key_results.c.title, _key_results.c.description, _key_results.c.target_value,
+                   _key_results.c.current_value, _key_results.c.unit, copies.c.id, literal(0))
+            .join_from(_key_results, copies, copies.c.rolled_over_from_id == _key_results.c.objective_id)
+            .where(copied, unfinished)
+            .order_by(copies.c.id, _key_results.c.id)
+        )
+    ).rowcount
+    connection.execute(objective_tags.insert().from_select(
+        ['objective_id', 'tag_id'],
+        select(copies.c.id, objective_tags.c.tag_id)
+        .join_from(objective_tags, copies, copies.c.rolled_over_from_id == objective_tags.c.objective_id)
+        .where(copied)
+    ))
+    changes.record_objectives(connection, objective_ids)
+    tracking.refresh(connection, objective_ids)
+
+    objectives = {objective.id: objective for objective in
+                  Objective.query.filter(Objective.id.in_(objective_ids))}
+    for objective in objectives.values():
+        search.index_objective(objective)
+    for key_result in KeyResult.query.options(db.lazyload(KeyResult.tags))\
+            .filter(KeyResult.objective_id.in_(objective_ids)):
+        search.index_key_result(key_result, objectives[key_result.objective_id])
+    return len(objective_ids), key_results
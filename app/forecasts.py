@@ -0,0 +1,266 @@
+"""
+Completion forecasts for key results.
+
+A key result's forecast is the least-squares line through its check-ins
+(value against time), extended to where it meets ``target_value``. It is
+one of:
+
+``reached``
+    The latest check-in is at or past the target.
+``projected``
+    The line reaches the target at ``eta``.
+``stalled``
+    The line is flat or heads away from the target, or it would take
+    longer than ``HORIZON_DAYS``.
+``unknown``
+    Fewer than two check-ins at different times, or no target.
+
+``compute`` fits every key result of a batch at once. One query loads the
+batch's check-ins, sorted by key result, as flat arrays. With NumPy
+installed the per key result sums, slopes and forecasts are computed over
+those arrays with ``bincount``, without a Python loop per key result.
+NumPy is optional: without it the same numbers are computed in one pass
+over the rows in plain Python, which is several times slower.
+
+Results are cached in ``key_result_forecast``. The writes that change
+check-ins or targets recompute the forecasts they affect in their own
+transaction (``refresh`` and ``refresh_objectives``): check-ins, edits of
+a key result, restores from the archive and moves to another shard. Pages
+read the cache with ``for_key_results`` and ``for_objectives`` and never
+write; a key result without a cached forecast shows as unknown. ``flask
+forecasts refresh`` recomputes them all, batch by batch, e.g. after an
+import.
+"""
+import math
+from collections import namedtuple
+from functools import cache
+from datetime import datetime, timedelta
+from sqlalchemy import extract, func, select
+from app.models import db, KeyResult, KeyResultForecast, KeyResultUpdate
+
+HORIZON_DAYS = 5 * 365
+BATCH_SIZE = 20000
+
+Forecast = namedtuple('Forecast', 'status eta')
+
+_EPOCH = datetime(1970, 1, 1)
+_key_results = KeyResult.__table__
+_updates = KeyResultUpdate.__table__
+_cache = KeyResultForecast.__table__
+
+
+def _eta(start, days):
+    return _EPOCH + timedelta(seconds=start) + timedelta(days=days)
+
+
+@cache
+def numpy_available():
+    """Whether NumPy can be imported. It is imported on the first fit
+    rather than with the module, which would slow down every app start."""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:  # pragma: no cover
+        return False
+    return True
+
+
+def _fit_numpy(rows, targets):
+    import numpy as np
+    data = np.array(rows, dtype=float)
+    ids, seconds, values = data[:, 0].astype(np.int64), data[:, 1], data[:, 2]
+    update_ids = data[:, 3].astype(np.int64)
+    boundary = np.r_[True, ids[1:] != ids[:-1]]
+    starts = np.flatnonzero(boundary)
+    ends = np.r_[starts[1:], len(ids)] - 1
+    group = np.cumsum(boundary) - 1
+    keys = ids[starts]
+    n = np.bincount(group)
+
+    # Days since each key result's first check-in, centred on the mean
+    # before the products are summed, for accuracy.
+    start = seconds[starts]
+    days = (seconds - start[group]) / 86400.0
+    mean_t = np.bincount(group, days) / n
+    mean_y = np.bincount(group, values) / n
+    dt = days - mean_t[group]
+    sxx = np.bincount(group, dt * dt)
+    sxy = np.bincount(group, dt * (values - mean_y[group]))
+
+    target = np.array([targets.get(key) for key in keys.tolist()], dtype=float)
+    direction = np.sign(target - values[starts])
+    remaining = (target - values[ends]) * direction
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = sxy / sxx
+        hit = np.maximum(mean_t + (target - mean_y) / slope, days[ends])
+    status = np.select(
+        [np.isnan(target), (direction == 0) | (remaining <= 0), (n < 2) | (sxx == 0),
+         slope * direction <= 0, hit - days[ends] > HORIZON_DAYS],
+        ['unknown', 'reached', 'unknown', 'stalled', 'stalled'], 'projected')
+    last_update_ids = np.maximum.reduceat(update_ids, starts)
+    return {
+        key: (Forecast(state, _eta(first, when) if state == 'projected' else None), last_update_id)
+        for key, state, first, when, last_update_id in zip(
+            keys.tolist(), status.tolist(), start.tolist(), hit.tolist(), last_update_ids.tolist())
+    }
+
+
+def _fit_one(seconds, values, target):
+    if target is None:
+        return Forecast('unknown', None)
+    direction = math.copysign(1, target - values[0]) if target != values[0] else 0
+    if direction == 0 or (target - values[-1]) * direction <= 0:
+        return Forecast('reached', None)
+    n = len(values)
+    days = [(second - seconds[0]) / 86400.0 for second in seconds]
+    mean_t = sum(days) / n
+    mean_y = sum(values) / n
+    sxx = sum((day - mean_t) ** 2 for day in days)
+    if n < 2 or sxx == 0:
+        return Forecast('unknown', None)
+    slope = sum((day - mean_t) * (value - mean_y) for day, value in zip(days, values)) / sxx
+    if slope * direction <= 0:
+        return Forecast('stalled', None)
+    hit = max(mean_t + (target - mean_y) / slope, days[-1])
+    if hit - days[-1] > HORIZON_DAYS:
+        return Forecast('stalled', None)
+    return Forecast('projected', _eta(seconds[0], hit))
+
+
+def _fit_python(rows, targets):
+    results = {}
+    start = 0
+    for index in range(1, len(rows) + 1):
+        if index < len(rows) and rows[index][0] == rows[start][0]:
+            continue
+        group = rows[start:index]
+        key = group[0][0]
+        forecast = _fit_one([float(row[1]) for row in group], [float(row[2]) for row in group],
+                            targets.get(key))
+        results[key] = (forecast, max(row[3] for row in group))
+        start = index
+    return results
+
+
+def fit(rows, targets):
+    """Forecasts from check-in ``rows`` of ``(key result id, epoch seconds,
+    value, update id)``, sorted by key result and time. ``targets`` maps
+    key result ids to target values. Returns ``{key result id: (Forecast,
+    last update id)}`` for the key results that have rows."""
+    if not rows:
+        return {}
+    return _fit_numpy(rows, targets) if numpy_available() else _fit_python(rows, targets)
+
+
+def compute(connection, targets, key_result_ids=None):
+    """Forecasts for the key results in ``targets`` (``{id: target
+    value}``), from one query. ``key_result_ids`` can narrow the query
+    down, e.g. to a range of ids. Returns ``{id: (Forecast, last update
+    id)}``."""
+    if key_result_ids is None:
+        key_result_ids = _updates.c.key_result_id.in_(list(targets))
+    rows = connection.execute(
+        select(_updates.c.key_result_id, extract('epoch', _updates.c.timestamp),
+               _updates.c.value, _updates.c.id)
+        .where(key_result_ids, _updates.c.value.isnot(None),
+               _updates.c.timestamp.isnot(None))
+        .order_by(_updates.c.key_result_id, _updates.c.timestamp, _updates.c.id)
+    ).all()
+    results = fit(rows, targets)
+    for key in targets:
+        results.setdefault(key, (Forecast('unknown', None), None))
+    return results
+
+
+def store(connection, results, targets, key_result_ids=None):
+    """Write ``compute`` results to the cache, replacing the rows of
+    ``key_result_ids`` (default: the ids in ``results``)."""
+    if not results:
+        return
+    now = datetime.utcnow()
+    if key_result_ids is None:
+        key_result_ids = _cache.c.key_result_id.in_(list(results))
+    connection.execute(_cache.delete().where(key_result_ids))
+    connection.execute(_cache.insert(), [
+        {'key_result_id': key, 'last_update_id': last_update_id, 'target_value': targets[key],
+         'status': forecast.status, 'eta': forecast.eta, 'computed_at': now}
+        for key, (forecast, last_update_id) in results.items()
+    ])
+
+
+def refresh_all(connection, batch_size=BATCH_SIZE):
+    """Recompute the forecasts of every key result, ``batch_size`` key
+    results (and their check-ins) at a time. Returns the number of key
+    results."""
+    refreshed = 0
+    last_id = 0
+    while True:
+        targets = dict(connection.execute(
+            select(_key_results.c.id, _key_results.c.target_value)
+            .where(_key_results.c.id > last_id)
+            .order_by(_key_results.c.id).limit(batch_size)
+        ).all())
+        if not targets:
+            return refreshed
+        first, last = min(targets), max(targets)
+        results = compute(connection, targets, _updates.c.key_result_id.between(first, last))
+        store(connection, results, targets, _cache.c.key_result_id.between(first, last))
+        refreshed += len(targets)
+        last_id = last
+
+
+def refresh(connection, targets):
+    """Recompute and store the forecasts of the key results in ``targets``
+    (``{id: target value}``)."""
+    if targets:
+        store(connection, compute(connection, targets), targets)
+
+
+def refresh_objectives(connection, objective_ids):
+    """Recompute and store the forecasts of every key result of
+    ``objective_ids``."""
+    refresh(connection, dict(connection.execute(
+        select(_key_results.c.id, _key_results.c.target_value)
+        .where(_key_results.c.objective_id.in_(list(objective_ids)))
+    ).all()))
+
+
+def _load(criteria):
+    rows = db.session.execute(
+        select(_key_results.c.id, _key_results.c.objective_id, _cache.c.status, _cache.c.eta)
+        .outerjoin(_cache, _cache.c.key_result_id == _key_results.c.id)
+        .where(criteria)
+    ).all()
+    forecasts = {row.id: Forecast(row.status or 'unknown', row.eta) for row in rows}
+    return rows, forecasts
+
+
+def for_key_results(key_result_ids):
+    """``{key result id: Forecast}``."""
+    if not key_result_ids:
+        return {}
+    return _load(_key_results.c.id.in_(list(key_result_ids)))[1]
+
+
+def for_objectives(objective_ids):
+    """``{objective id: Forecast}`` for objectives with key results: when
+    the last of their key results is forecast to reach its target. An
+    objective is stalled if any key result is, and unknown if any has no
+    forecast."""
+    if not objective_ids:
+        return {}
+    rows, forecasts = _load(_key_results.c.objective_id.in_(list(objective_ids)))
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.objective_id, []).append(forecasts[row.id])
+    summary = {}
+    for objective_id, items in grouped.items():
+        statuses = {item.status for item in items}
+        for status in ('stalled', 'unknown'):
+            if status in statuses:
+                summary[objective_id] = Forecast(status, None)
+                break
+        else:
+            etas = [item.eta for item in items if item.eta is not None]
+            summary[objective_id] = Forecast('projected', max(etas)) if etas else Forecast('reached', None)
+    return summary
+
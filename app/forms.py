@@ -1,7 +1,24 @@
+from flask import current_app
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, PasswordField, BooleanField, SubmitField, FloatField, DateField
-from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Optional
-from app.models import User
+from urllib.parse import urlsplit
+from wtforms import Form, StringField, TextAreaField, PasswordField, BooleanField, SubmitField, FloatField, DateField, IntegerField, FieldList, FormField, SelectField, SelectMultipleField
+from wtforms.widgets import HiddenInput, ListWidget, CheckboxInput
+from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Optional, Length, URL
+from app import sharding, webhooks
+
+class TagListField(StringField):
+    """Comma separated tags, exposed as a list of names."""
+    
+    def _value(self):
+        if not self.data:
+            return ''
+        return ', '.join(getattr(tag, 'name', tag) for tag in self.data)
+    
+    def process_formdata(self, valuelist):
+        if valuelist:
+            self.data = [name.strip() for name in valuelist[0].split(',') if name.strip()]
+        else:
+            self.data = []
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -17,13 +34,11 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField('Register')
     
     def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user is not None:
+        if sharding.is_taken(username=username.data):
             raise ValidationError('Please use a different username.')
     
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user is not None:
+        if sharding.is_taken(email=email.data):
             raise ValidationError('Please use a different email address.')
 
 class ObjectiveForm(FlaskForm):
@@ -31,17 +46,66 @@ class ObjectiveForm(FlaskForm):
     description = TextAreaField('Description')
     start_date = DateField('Start Date', validators=[DataRequired()])
     end_date = DateField('End Date', validators=[DataRequired()])
+    # Choices are the owner's cycles, see app.cycles.choices; 0 is no cycle
+    cycle_id = SelectField('Cycle', coerce=int, default=0)
+    tags = TagListField('Tags (comma separated)')
     submit = SubmitField('Save')
 
+class CycleForm(FlaskForm):
+    name = StringField('Name', validators=[DataRequired(), Length(max=64)])
+    start_date = DateField('Start Date', validators=[DataRequired()])
+    end_date = DateField('End Date', validators=[DataRequired()])
+    submit = SubmitField('Add Cycle')
+    
+    def validate_end_date(self, end_date):
+        if self.start_date.data and end_date.data < self.start_date.data:
+            raise ValidationError('The cycle must end after it starts.')
+
 class KeyResultForm(FlaskForm):
     title = StringField('Title', validators=[DataRequired()])
     description = TextAreaField('Description')
     target_value = FloatField('Target Value', validators=[DataRequired()])
     current_value = FloatField('Current Value', default=0)
     unit = StringField('Unit (e.g., %, count)', validators=[DataRequired()])
+    tags = TagListField('Tags (comma separated)')
     submit = SubmitField('Save')
 
 class KeyResultUpdateForm(FlaskForm):
     value = FloatField('Current Value', validators=[DataRequired()])
     comment = TextAreaField('Comment')
-    submit = SubmitField('Update Progress')
\ No newline at end of file
+    submit = SubmitField('Update Progress')
+
+class KeyResultCheckInForm(Form):
+    """One row of ``BatchCheckInForm``; a blank value leaves the key result
+    alone."""
+    key_result_id = IntegerField(widget=HiddenInput(), validators=[DataRequired()])
+    value = FloatField('Current Value', validators=[Optional()])
+    comment = StringField('Comment', validators=[Length(max=5000)])
+
+class BatchCheckInForm(FlaskForm):
+    checkins = FieldList(FormField(KeyResultCheckInForm), max_entries=200)
+    submit = SubmitField('Save Check-ins')
+
+class CommentForm(FlaskForm):
+    body = TextAreaField('Comment', validators=[DataRequired(), Length(max=5000)])
+    parent_id = IntegerField(validators=[Optional()])
+    submit = SubmitField('Post Comment')
+
+class WebhookForm(FlaskForm):
+    url = StringField('Payload URL', validators=[DataRequired(), URL(require_tld=False), Length(max=500)])
+    events = SelectMultipleField('Events', choices=list(webhooks.EVENTS.items()),
+                                 validators=[DataRequired(message='Pick at least one event.')],
+                                 widget=ListWidget(prefix_label=False), option_widget=CheckboxInput())
+    submit = SubmitField('Add Webhook')
+    
+    def validate_url(self, url):
+        if urlsplit(url.data).scheme not in ('http', 'https'):
+            raise ValidationError('Use an http:// or https:// URL.')
+        if current_app.config['WEBHOOK_ALLOW_PRIVATE']:
+            return
+        try:
+            webhooks.check_url(url.data)
+        except webhooks.UnsafeAddress:
+            raise ValidationError('Use a URL on the public internet.')
+        except (OSError, ValueError):
+            raise ValidationError('Could not find the host of this URL.')
@@ -0,0 +1,76 @@
+"""
+Readiness checks for load balancer and orchestrator probes.
+
+A worker is ready when, for every shard, the connection pool has a
+connection to spare, the database answers, and its schema is at the
+migration head. The result is cached for ``READINESS_CACHE_SECONDS`` so
+that probes arriving every second or two do not each cost a round of
+queries; concurrent probes wait for the one refresh instead of all
+running it.
+"""
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from app.models import shard_engine
+from app import sharding
+
+_heads = None
+_lock = threading.Lock()
+
+
+def migration_heads():
+    """The head revisions of ``migrations/``, read once per process.
+    Alembic is imported here rather than at startup, see
+    app.commands.init_migrate."""
+    global _heads
+    if _heads is None:
+        from alembic.script import ScriptDirectory
+        from app.commands import init_migrate
+        _heads = set(ScriptDirectory(init_migrate(current_app).directory).get_heads())
+    return _heads
+
+
+def _pool_exhausted(engine):
+    pool = engine.pool
+    if not isinstance(pool, QueuePool) or pool._max_overflow < 0:
+        return False
+    return pool.checkedout() >= pool.size() + pool._max_overflow
+
+
+def check_shard(name):
+    """Return a list of problems with shard ``name``; empty when ready."""
+    engine = shard_engine(name)
+    # Checking out a connection from an exhausted pool would block for the
+    # pool timeout, so report it instead.
+    if _pool_exhausted(engine):
+        return ['connection pool exhausted']
+    try:
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+            try:
+                revisions = set(connection.execute(
+                    text('SELECT version_num FROM alembic_version')).scalars())
+            except Exception:
+                revisions = set()
+    except Exception as exc:
+        return [f'database unreachable: {exc.__class__.__name__}']
+    if revisions != migration_heads():
+        return ['migrations not at head (at %s, head is %s)' % (
+            ', '.join(sorted(revisions)) or 'none', ', '.join(sorted(migration_heads())))]
+    return []
+
+
+def readiness():
+    """Return ``(ready, problems by shard)``, cached per app."""
+    cache = current_app.extensions.setdefault('readiness', {})
+    max_age = current_app.config.get('READINESS_CACHE_SECONDS', 5)
+    if time.monotonic() - cache.get('checked', float('-inf')) < max_age:
+        return cache['result']
+    with _lock:
+        if time.monotonic() - cache.get('checked', float('-inf')) >= max_age:
+            problems = {name: check_shard(name) for name in sharding.shard_names()}
+            cache['result'] = (not any(problems.values()), problems)
+            cache['checked'] = time.monotonic()
+    return cache['result']
@@ -1,9 +1,72 @@
+import sqlite3
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import UserMixin
+from sqlalchemy import MetaData, Table, case, event, func, inspect
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.hybrid import hybrid_property
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
-db = SQLAlchemy()
+# Named constraints let Alembic alter them later (SQLite batch migrations
+# cannot drop an unnamed constraint).
+NAMING_CONVENTION = {
+    'ix': 'ix_%(column_0_label)s',
+    'uq': 'uq_%(table_name)s_%(column_0_name)s',
+    'ck': 'ck_%(table_name)s_%(constraint_name)s',
+    'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s',
+    'pk': 'pk_%(table_name)s',
+}
+
+# The shard living in SQLALCHEMY_DATABASE_URI; further shards are the
+# ``shard*`` entries of SQLALCHEMY_BINDS (see app/sharding.py).
+DEFAULT_SHARD = 'default'
+
+
+def current_shard():
+    """The shard selected for this request or command, or None."""
+    return g.get('shard') if has_app_context() else None
+
+
+def shard_engine(name):
+    return db.engines[None if name in (None, DEFAULT_SHARD) else name]
+
+
+def _is_directory(mapper, clause):
+    table = None
+    if mapper is not None:
+        table = inspect(mapper).local_table
+    elif isinstance(clause, Table):
+        table = clause
+    elif isinstance(clause, UpdateBase) and isinstance(clause.table, Table):
+        table = clause.table
+    return table is not None and table.info.get('directory', False)
+
+
+class RoutingSession(Session):
+    """Sends every statement to the current shard, except those on
+    directory tables (``ShardMap``), which always use the default database."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = current_shard()
+        if bind is None and shard is not None and not _is_directory(mapper, clause):
+            return shard_engine(shard)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(metadata=MetaData(naming_convention=NAMING_CONVENTION),
+                session_options={'class_': RoutingSession})
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys, including ON DELETE CASCADE, unless
+    # they are switched on for every connection.
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -22,6 +85,56 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+class ShardMap(db.Model):
+    """Where each user's data lives. A user keeps the id allocated here in
+    whichever shard holds their rows."""
+    __tablename__ = 'shard_map'
+    __table_args__ = {'info': {'directory': True}}
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(64), unique=True, index=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, index=True, nullable=False)
+    shard = db.Column(db.String(64), nullable=False, index=True)
+    # Set while a rebalance copies the user to another shard (writes are
+    # refused meanwhile), and until the old shard has been cleaned up.
+    moving_to = db.Column(db.String(64))
+    moved_from = db.Column(db.String(64))
+
+objective_tags = db.Table(
+    'objective_tags',
+    db.Column('objective_id', db.Integer, db.ForeignKey('objective.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    db.Index('ix_objective_tags_tag_id', 'tag_id', 'objective_id'),
+)
+
+key_result_tags = db.Table(
+    'key_result_tags',
+    db.Column('key_result_id', db.Integer, db.ForeignKey('key_result.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    db.Index('ix_key_result_tags_tag_id', 'tag_id', 'key_result_id'),
+)
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, index=True, nullable=False)
+    
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
+class Cycle(db.Model):
+    """An OKR period, e.g. a quarter. Each user has their own."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(64), nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_cycle_user_start_date', 'user_id', 'start_date'),
+    )
+    
+    def __repr__(self):
+        return f'<Cycle {self.name}>'
+
 class Objective(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(120))
@@ -29,16 +142,51 @@ class Objective(db.Model):
     start_date = db.Column(db.DateTime, default=datetime.utcnow)
     end_date = db.Column(db.DateTime)
     is_complete = db.Column(db.Boolean, default=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    key_results = db.relationship('KeyResult', backref='objective', lazy='dynamic', cascade='all, delete-orphan')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    cycle_id = db.Column(db.Integer, db.ForeignKey('cycle.id'))
+    # The objective of an earlier cycle this one was rolled over from
+    rolled_over_from_id = db.Column(db.Integer, db.ForeignKey('objective.id', ondelete='SET NULL'), index=True)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_activity_at = db.Column(db.DateTime)
+    # on_track, at_risk or off_track, kept up to date by app.tracking
+    status = db.Column(db.String(16))
+    # Set when the owner deletes the objective; the rows are removed later
+    # by app.purge.
+    deleted_at = db.Column(db.DateTime, index=True)
+    key_results = db.relationship('KeyResult', backref='objective', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    tags = db.relationship('Tag', secondary=objective_tags, lazy='selectin', order_by='Tag.name', passive_deletes=True)
+    snapshots = db.relationship('ObjectiveSnapshot', backref='objective', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    comments = db.relationship('Comment', backref='objective', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    
+    __table_args__ = (
+        db.Index('ix_objective_user_cycle_status', 'user_id', 'cycle_id', 'status'),
+        db.Index('ix_objective_user_cycle_end_date', 'user_id', 'cycle_id', 'end_date'),
+    )
+    
+    @classmethod
+    def active(cls):
+        """Query for objectives that have not been deleted."""
+        return cls.query.filter(cls.deleted_at.is_(None))
+    
+    @classmethod
+    def load_progress(cls, objectives):
+        """Compute ``progress()`` for all of ``objectives`` with one query,
+        so that listing them does not cost a query per objective. The
+        result is kept on the instances, i.e. for the rest of the request."""
+        objectives = list(objectives)
+        averages = dict(db.session.execute(
+            db.select(KeyResult.objective_id, func.avg(KeyResult.progress))
+            .where(KeyResult.objective_id.in_([objective.id for objective in objectives]))
+            .group_by(KeyResult.objective_id)
+        ).all()) if objectives else {}
+        for objective in objectives:
+            objective._progress = averages.get(objective.id) or 0
+        return objectives
     
     def progress(self):
-        key_results = self.key_results.all()
-        if not key_results:
-            return 0
-        
-        total_progress = sum(kr.progress for kr in key_results)
-        return total_progress / len(key_results)
+        if getattr(self, '_progress', None) is None:
+            Objective.load_progress([self])
+        return self._progress
     
     def __repr__(self):
         return f'<Objective {self.title}>'
@@ -50,16 +198,36 @@ class KeyResult(db.Model):
     target_value = db.Column(db.Float)
     current_value = db.Column(db.Float, default=0)
     unit = db.Column(db.String(32))
-    objective_id = db.Column(db.Integer, db.ForeignKey('objective.id'))
-    updates = db.relationship('KeyResultUpdate', backref='key_result', lazy='dynamic', cascade='all, delete-orphan')
+    objective_id = db.Column(db.Integer, db.ForeignKey('objective.id', ondelete='CASCADE'), index=True)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_activity_at = db.Column(db.DateTime)
+    updates = db.relationship('KeyResultUpdate', backref='key_result', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    tags = db.relationship('Tag', secondary=key_result_tags, lazy='selectin', order_by='Tag.name', passive_deletes=True)
+    comments = db.relationship('Comment', backref='key_result', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    
+    @classmethod
+    def with_objective(cls):
+        """Query that loads each key result's objective in the same SELECT
+        (but not the objective's tags)."""
+        return cls.query.options(db.joinedload(cls.objective).lazyload(Objective.tags))
     
-    @property
+    @hybrid_property
     def progress(self):
         if self.target_value == 0:
             return 0
         progress = (self.current_value / self.target_value) * 100
         return min(100, max(0, progress))
     
+    @progress.expression
+    def progress(cls):
+        ratio = func.coalesce(cls.current_value, 0) * 100.0 / cls.target_value
+        return case(
+            (func.coalesce(cls.target_value, 0) == 0, 0.0),
+            (ratio > 100, 100.0),
+            (ratio < 0, 0.0),
+            else_=ratio,
+        )
+    
     def __repr__(self):
         return f'<KeyResult {self.title}>'
 
@@ -68,7 +236,178 @@ class KeyResultUpdate(db.Model):
     value = db.Column(db.Float)
     comment = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    key_result_id = db.Column(db.Integer, db.ForeignKey('key_result.id'))
+    key_result_id = db.Column(db.Integer, db.ForeignKey('key_result.id', ondelete='CASCADE'))
+    
+    __table_args__ = (
+        db.Index('ix_key_result_update_key_result_timestamp', 'key_result_id', 'timestamp'),
+    )
     
     def __repr__(self):
-        return f'<Update {self.value} at {self.timestamp}>'
\ No newline at end of file
+        return f'<Update {self.value} at {self.timestamp}>'
+
+class KeyResultForecast(db.Model):
+    """Cached completion forecast of a key result, valid while its latest
+    check-in is ``last_update_id`` and its target ``target_value``; see
+    ``app.forecasts``."""
+    key_result_id = db.Column(db.Integer, db.ForeignKey('key_result.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    last_update_id = db.Column(db.Integer)
+    target_value = db.Column(db.Float)
+    status = db.Column(db.String(16), nullable=False)
+    eta = db.Column(db.DateTime)
+    computed_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<KeyResultForecast {self.key_result_id} {self.status}>'
+
+class UserStatistics(db.Model):
+    """A user's totals for the admin overview, as of ``refreshed_at``;
+    recomputed by ``flask stats refresh`` (see ``app.stats``)."""
+    __tablename__ = 'user_statistics'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    objectives = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    key_results = db.Column(db.Integer, nullable=False, default=0)
+    stale_key_results = db.Column(db.Integer, nullable=False, default=0)
+    progress = db.Column(db.Float, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<UserStatistics {self.user_id}>'
+
+class ObjectiveSnapshot(db.Model):
+    """Progress of one objective at the end of one day, written by
+    ``app.reports.materialize_snapshots`` and read by the report views."""
+    id = db.Column(db.Integer, primary_key=True)
+    objective_id = db.Column(db.Integer, db.ForeignKey('objective.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    progress = db.Column(db.Float, nullable=False, default=0)
+    is_complete = db.Column(db.Boolean, nullable=False, default=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('objective_id', 'day', name='uq_objective_snapshot_objective_day'),
+        db.Index('ix_objective_snapshot_user_day', 'user_id', 'day'),
+        db.Index('ix_objective_snapshot_day', 'day'),
+    )
+    
+    def __repr__(self):
+        return f'<ObjectiveSnapshot {self.objective_id} on {self.day}>'
+
+
+class Comment(db.Model):
+    """A comment on an objective or a key result.
+    
+    Replies point at the comment they answer (``parent_id``) and at the
+    top-level comment of their thread (``root_id``), so a page of threads
+    and all of their replies can be loaded with two queries.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    body = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    objective_id = db.Column(db.Integer, db.ForeignKey('objective.id', ondelete='CASCADE'))
+    key_result_id = db.Column(db.Integer, db.ForeignKey('key_result.id', ondelete='CASCADE'))
+    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id', ondelete='CASCADE'))
+    root_id = db.Column(db.Integer)
+    author = db.relationship('User', lazy='joined')
+    replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]), lazy='dynamic')
+    
+    __table_args__ = (
+        db.Index('ix_comment_objective_thread', 'objective_id', 'parent_id', 'timestamp', 'id'),
+        db.Index('ix_comment_key_result_thread', 'key_result_id', 'parent_id', 'timestamp', 'id'),
+        db.Index('ix_comment_root_timestamp', 'root_id', 'timestamp'),
+    )
+    
+    def __repr__(self):
+        return f'<Comment {self.id}>'
+
+
+class ChangeLog(db.Model):
+    """One row per change to a user's objectives, key results and check-ins,
+    numbered by ``seq``; see ``app.changes``."""
+    seq = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    entity = db.Column(db.String(32), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(8), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_change_log_user_seq', 'user_id', 'seq'),
+        # Never reuse the seq of a deleted row
+        {'sqlite_autoincrement': True},
+    )
+    
+    def __repr__(self):
+        return f'<ChangeLog {self.seq} {self.op} {self.entity} {self.entity_id}>'
+
+
+class WebhookSubscription(db.Model):
+    """An endpoint receiving some of a user's events; see ``app.webhooks``."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    url = db.Column(db.String(500), nullable=False)
+    secret = db.Column(db.String(64), nullable=False)
+    # Comma separated event types
+    events = db.Column(db.String(200), nullable=False)
+    active = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    deliveries = db.relationship('WebhookDelivery', backref='subscription', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+    
+    def __repr__(self):
+        return f'<WebhookSubscription {self.url}>'
+
+
+class WebhookDelivery(db.Model):
+    """An event waiting to be sent to a subscription (the outbox). Deleted
+    once the endpoint has accepted it."""
+    id = db.Column(db.Integer, primary_key=True)
+    subscription_id = db.Column(db.Integer, db.ForeignKey('webhook_subscription.id', ondelete='CASCADE'), nullable=False, index=True)
+    # The same for every subscription the event goes to, and across
+    # retries, so that receivers can drop duplicates.
+    event_id = db.Column(db.String(32), nullable=False)
+    event = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # NULL once the delivery has been given up
+    next_attempt_at = db.Column(db.DateTime, index=True)
+    last_error = db.Column(db.String(200))
+    
+    def __repr__(self):
+        return f'<WebhookDelivery {self.event} {self.event_id}>'
+
+
+def _archive_table(table, *extra, exclude=()):
+    """A cold-storage copy of ``table`` for ``app.archive``: the same
+    columns (less ``exclude``) and primary key, without foreign keys,
+    defaults or the hot table's indexes."""
+    columns = [db.Column(column.name, column.type, primary_key=column.primary_key,
+                         nullable=column.nullable, autoincrement=False)
+               for column in table.columns if column.name not in exclude]
+    return db.Table(f'archived_{table.name}', *columns, *extra)
+
+archived_objective = _archive_table(
+    Objective.__table__,
+    db.Column('archived_at', db.DateTime, nullable=False),
+    db.Index('ix_archived_objective_user_end_date', 'user_id', 'end_date'),
+    exclude=('deleted_at', 'status', 'rolled_over_from_id'),
+)
+archived_objective_tags = _archive_table(objective_tags)
+archived_objective_snapshot = _archive_table(
+    ObjectiveSnapshot.__table__,
+    db.Index('ix_archived_objective_snapshot_objective_id', 'objective_id'),
+)
+archived_key_result = _archive_table(
+    KeyResult.__table__,
+    db.Index('ix_archived_key_result_objective_id', 'objective_id'),
+)
+archived_key_result_tags = _archive_table(key_result_tags)
+archived_key_result_update = _archive_table(
+    KeyResultUpdate.__table__,
+    db.Index('ix_archived_key_result_update_key_result_timestamp', 'key_result_id', 'timestamp'),
+)
+archived_comment = _archive_table(
+    Comment.__table__,
+    db.Index('ix_archived_comment_objective_id', 'objective_id'),
+    db.Index('ix_archived_comment_key_result_id', 'key_result_id'),
+)
@@ -0,0 +1,104 @@
+"""
+Removal of deleted objectives.
+
+Deleting an objective only sets ``deleted_at``. Every page stops showing
+it at once and the request returns immediately. The rows are removed
+later by ``purge_objective``, which deletes the objective's check-in
+history, comments and snapshots in chunks of ``PURGE_BATCH_SIZE`` rows.
+Each chunk is committed on its own, so no single transaction holds the
+write lock for long. The objective row is deleted last, and ``ON DELETE
+CASCADE`` removes whatever is left (key results, tag links).
+
+With ``PURGE_IN_BACKGROUND`` set, the delete view hands the objective to a
+per-process worker thread. ``flask objectives purge`` purges every
+objective still marked as deleted, e.g. after a restart interrupted a
+purge, and is what to schedule when the background worker is off.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, select
+from app.models import db, Objective, KeyResult, KeyResultUpdate, Comment, ObjectiveSnapshot, current_shard
+from app import search, sharding
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def soft_delete(objective):
+    """Hide ``objective`` everywhere; the caller commits."""
+    objective.deleted_at = datetime.utcnow()
+    search.remove_objective(objective)
+
+
+def _delete_in_chunks(table, id_query, batch_size):
+    deleted = 0
+    while True:
+        result = db.session.execute(
+            delete(table).where(table.c.id.in_(id_query.limit(batch_size).scalar_subquery()))
+        )
+        db.session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+def purge_objective(objective_id, batch_size=1000):
+    """Remove a soft-deleted objective and everything that belongs to it.
+    Returns the number of rows deleted, not counting cascades."""
+    still_deleted = db.session.execute(
+        select(Objective.id).where(Objective.id == objective_id, Objective.deleted_at.is_not(None))
+    ).first()
+    if still_deleted is None:
+        return 0
+    key_results = select(KeyResult.id).where(KeyResult.objective_id == objective_id)
+    updates = KeyResultUpdate.__table__
+    comments = Comment.__table__
+    snapshots = ObjectiveSnapshot.__table__
+    deleted = _delete_in_chunks(
+        updates, select(updates.c.id).where(updates.c.key_result_id.in_(key_results)), batch_size)
+    deleted += _delete_in_chunks(
+        comments, select(comments.c.id).where(
+            (comments.c.objective_id == objective_id) | comments.c.key_result_id.in_(key_results)
+        ), batch_size)
+    deleted += _delete_in_chunks(
+        snapshots, select(snapshots.c.id).where(snapshots.c.objective_id == objective_id), batch_size)
+    result = db.session.execute(
+        delete(Objective.__table__).where(Objective.__table__.c.id == objective_id,
+                                          Objective.__table__.c.deleted_at.is_not(None))
+    )
+    db.session.commit()
+    return deleted + result.rowcount
+
+
+def purge_deleted(batch_size=1000):
+    """Purge every soft-deleted objective. Returns the number purged."""
+    objective_ids = db.session.execute(
+        select(Objective.id).where(Objective.deleted_at.is_not(None)).order_by(Objective.id)
+    ).scalars().all()
+    for objective_id in objective_ids:
+        purge_objective(objective_id, batch_size=batch_size)
+    return len(objective_ids)
+
+
+def _run(app, shard, objective_id, batch_size):
+    with app.app_context(), sharding.use(shard):
+        try:
+            purge_objective(objective_id, batch_size=batch_size)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Purging objective %s failed', objective_id)
+
+
+def schedule(objective_id):
+    """Purge ``objective_id`` on the background worker, if it is enabled."""
+    global _executor
+    if not current_app.config.get('PURGE_IN_BACKGROUND', True):
+        return False
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='purge')
+    _executor.submit(_run, current_app._get_current_object(), current_shard(), objective_id,
+                     current_app.config.get('PURGE_BATCH_SIZE', 1000))
+    return True
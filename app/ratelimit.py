@@ -0,0 +1,205 @@
+"""
+Token-bucket rate limiting for the authentication endpoints.
+
+Each rule allows a burst of ``capacity`` attempts, and tokens refill at an
+even rate so that a full bucket is restored after ``period`` seconds.
+Rules are configured as ``"capacity/period"`` strings. For example,
+``RATELIMIT_LOGIN_PER_USERNAME = '5/60'`` allows five quick login
+attempts for one username, then one more every twelve seconds.
+
+All gunicorn workers share the bucket state through a small SQLite file
+(``RATELIMIT_STORAGE``). Every check is a single ``BEGIN IMMEDIATE``
+transaction, so concurrent workers cannot both spend the last token.
+``RATELIMIT_STORAGE = 'memory'`` keeps the buckets in process, which is
+only correct with a single worker.
+
+``enforce`` runs before the form is validated, so a rejected request never
+reaches password hashing. It responds with 429 and a ``Retry-After`` header.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app, request
+from werkzeug.exceptions import TooManyRequests
+
+# How many checks between sweeps of buckets that have refilled completely.
+PRUNE_EVERY = 1000
+
+
+class Rate:
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self.per_second = capacity / period
+
+    @classmethod
+    def parse(cls, value):
+        capacity, _, period = str(value).partition('/')
+        try:
+            capacity, period = int(capacity), float(period)
+        except ValueError:
+            raise ValueError(f'invalid rate {value!r}, expected "capacity/seconds"') from None
+        if capacity < 1 or period <= 0:
+            raise ValueError(f'invalid rate {value!r}')
+        return cls(capacity, period)
+
+
+def _spend(state, buckets, now):
+    """Take one token from every bucket or from none of them.
+
+    ``state`` maps bucket keys to ``(tokens, updated)``. Returns the new
+    state for the buckets that were spent, plus the seconds until all of
+    them have a token again (0 if the request is allowed)."""
+    refilled = {}
+    wait = 0.0
+    for key, rate in buckets:
+        tokens, updated = state.get(key, (rate.capacity, now))
+        tokens = min(rate.capacity, tokens + (now - updated) * rate.per_second)
+        refilled[key] = tokens
+        if tokens < 1:
+            wait = max(wait, (1 - tokens) / rate.per_second)
+    if wait:
+        return {}, wait
+    return {key: (tokens - 1, now) for key, tokens in refilled.items()}, 0.0
+
+
+class MemoryStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+        self._calls = 0
+
+    def spend(self, buckets, now, idle_after):
+        with self._lock:
+            changes, wait = _spend(self._state, buckets, now)
+            self._state.update(changes)
+            self._calls += 1
+            if self._calls % PRUNE_EVERY == 0:
+                self._state = {key: value for key, value in self._state.items()
+                               if value[1] >= now - idle_after}
+            return wait
+
+
+class SQLiteStore:
+    """Buckets in a SQLite file shared by every process on the host.
+
+    Connections are opened per thread and per process, so a connection
+    made before gunicorn forks its workers is never shared between them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Losing the last few updates in a power cut is harmless here.
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS bucket ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def spend(self, buckets, now, idle_after):
+        connection = self._connection()
+        keys = [key for key, _ in buckets]
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            state = {
+                key: (tokens, updated) for key, tokens, updated in connection.execute(
+                    'SELECT key, tokens, updated FROM bucket WHERE key IN (%s)'
+                    % ', '.join('?' * len(keys)), keys)
+            }
+            changes, wait = _spend(state, buckets, now)
+            connection.executemany(
+                'INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)',
+                [(key, tokens, updated) for key, (tokens, updated) in changes.items()]
+            )
+            self._calls += 1
+            if self._calls % PRUNE_EVERY == 0:
+                connection.execute('DELETE FROM bucket WHERE updated < ?', (now - idle_after,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+
+class RateLimiter:
+    def __init__(self, store, rules):
+        self.store = store
+        self.rules = rules
+        # A bucket untouched for the longest period is full again, which
+        # is the same as having no row at all.
+        self.idle_after = max(rate.period for rate in rules.values())
+
+    def hit(self, scope, identities):
+        """Spend a token from each ``(scope, kind)`` bucket that has a rule,
+        keyed by ``identities[kind]``. Returns the seconds to wait, or 0."""
+        buckets = []
+        for kind, identity in identities.items():
+            rate = self.rules.get((scope, kind))
+            if rate is not None and identity:
+                buckets.append((f'{scope}:{kind}:{identity}', rate))
+        if not buckets:
+            return 0
+        return self.store.spend(buckets, time.time(), self.idle_after)
+
+
+def client_ip():
+    """The client address, taken from ``X-Forwarded-For`` when the app sits
+    behind ``RATELIMIT_PROXY_COUNT`` trusted proxies."""
+    proxies = current_app.config.get('RATELIMIT_PROXY_COUNT', 0)
+    if not proxies:
+        return request.remote_addr
+    # Each proxy appends the address it received the request from, so
+    # entries further left than that were supplied by the client.
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    chain = [ip.strip() for ip in forwarded.split(',') if ip.strip()]
+    chain.append(request.remote_addr)
+    return chain[max(len(chain) - 1 - proxies, 0)]
+
+
+def enforce(scope, username=None):
+    """Count one attempt against ``scope`` for this client and ``username``,
+    and raise ``TooManyRequests`` when any of the buckets is empty."""
+    limiter = current_app.extensions.get('ratelimit')
+    if limiter is None:
+        return
+    identities = {'ip': client_ip()}
+    if username:
+        identities['username'] = username.strip().lower()
+    wait = limiter.hit(scope, identities)
+    if wait:
+        raise TooManyRequests(retry_after=math.ceil(wait))
+
+
+def init_app(app):
+    if not app.config.get('RATELIMIT_ENABLED', True):
+        app.extensions['ratelimit'] = None
+        return
+    rules = {
+        ('login', 'ip'): app.config.get('RATELIMIT_LOGIN_PER_IP'),
+        ('login', 'username'): app.config.get('RATELIMIT_LOGIN_PER_USERNAME'),
+        ('register', 'ip'): app.config.get('RATELIMIT_REGISTER_PER_IP'),
+    }
+    rules = {key: Rate.parse(value) for key, value in rules.items() if value}
+    if not rules:
+        app.extensions['ratelimit'] = None
+        return
+    storage = (app.config.get('RATELIMIT_STORAGE')
+               or os.path.join(app.instance_path, 'ratelimit.sqlite'))
+    store = MemoryStore() if storage == 'memory' else SQLiteStore(storage)
+    app.extensions['ratelimit'] = RateLimiter(store, rules)
@@ -0,0 +1,141 @@
+"""
+Daily objective progress snapshots.
+
+``materialize_snapshots`` turns ``KeyResultUpdate`` history into one
+``ObjectiveSnapshot`` row per objective per day. It resumes from the most
+recent snapshot day, so the nightly run only touches a day or two, and it
+is idempotent: each day it covers is deleted and rewritten, so running it
+several times a day simply refreshes today's rows. Report views read only
+the snapshot table.
+"""
+from datetime import datetime, time, timedelta
+from sqlalchemy import func, insert, case
+from app.models import db, Objective, KeyResult, KeyResultUpdate, ObjectiveSnapshot
+
+
+def _progress(value, target):
+    if not target:
+        return 0
+    return min(100, max(0, (value / target) * 100))
+
+
+def materialize_snapshots(until=None, batch_size=500):
+    """Write snapshots for every day from the last snapshot day up to
+    ``until`` (default: today, UTC). Returns the number of rows written.
+
+    Days are written oldest first and each day is only started once the
+    previous one is complete, so an interrupted run is picked up again by
+    the next one.
+    """
+    until = until or datetime.utcnow().date()
+    start = db.session.query(func.max(ObjectiveSnapshot.day)).scalar()
+    if start is None:
+        first = db.session.query(func.min(Objective.start_date)).scalar()
+        if first is None:
+            return 0
+        start = first.date()
+
+    written = 0
+    day = start
+    while day <= until:
+        written += materialize_day(day, batch_size=batch_size)
+        day += timedelta(days=1)
+    return written
+
+
+def materialize_day(day, batch_size=500):
+    """(Re)write the snapshot rows of a single day."""
+    day_end = datetime.combine(day + timedelta(days=1), time.min)
+
+    db.session.query(ObjectiveSnapshot)\
+        .filter(ObjectiveSnapshot.day == day)\
+        .delete(synchronize_session=False)
+
+    written = 0
+    last_id = 0
+    while True:
+        objectives = db.session.query(
+            Objective.id, Objective.user_id, Objective.is_complete
+        ).filter(Objective.id > last_id)\
+            .filter(Objective.start_date < day_end)\
+            .filter(Objective.deleted_at.is_(None))\
+            .order_by(Objective.id).limit(batch_size).all()
+        if not objectives:
+            break
+        last_id = objectives[-1].id
+
+        rows = _snapshot_rows(objectives, day, day_end)
+        db.session.execute(insert(ObjectiveSnapshot), rows)
+        written += len(rows)
+
+    db.session.commit()
+    return written
+
+
+def _snapshot_rows(objectives, day, day_end):
+    objective_ids = [objective.id for objective in objectives]
+    key_results = db.session.query(
+        KeyResult.id, KeyResult.objective_id, KeyResult.target_value, KeyResult.current_value
+    ).filter(KeyResult.objective_id.in_(objective_ids)).all()
+
+    # The value of a key result at the end of the day is its latest update
+    # up to then, by timestamp and then id: check-ins can be recorded with
+    # an earlier timestamp than updates inserted before them. Key results
+    # that were never updated keep their current value; ones whose first
+    # update comes later count as zero.
+    values = {}
+    ever_updated = set()
+    if key_results:
+        key_result_ids = [kr.id for kr in key_results]
+        before = KeyResultUpdate.timestamp < day_end
+        history = db.session.query(
+            KeyResultUpdate.key_result_id,
+            case((before, KeyResultUpdate.value)).label('value'),
+            func.row_number().over(
+                partition_by=KeyResultUpdate.key_result_id,
+                order_by=(case((before, 0), else_=1), KeyResultUpdate.timestamp.desc(), KeyResultUpdate.id.desc()),
+            ).label('position'),
+        ).filter(KeyResultUpdate.key_result_id.in_(key_result_ids)).subquery()
+        for key_result_id, value in db.session.query(history.c.key_result_id, history.c.value)\
+                .filter(history.c.position == 1):
+            ever_updated.add(key_result_id)
+            if value is not None:
+                values[key_result_id] = value
+
+    progress = {}
+    for kr in key_results:
+        if kr.id in values:
+            value = values[kr.id]
+        elif kr.id in ever_updated:
+            value = 0
+        else:
+            value = kr.current_value or 0
+        progress.setdefault(kr.objective_id, []).append(_progress(value, kr.target_value))
+
+    return [{
+        'objective_id': objective.id,
+        'user_id': objective.user_id,
+        'day': day,
+        'progress': sum(progress[objective.id]) / len(progress[objective.id]) if objective.id in progress else 0,
+        'is_complete': bool(objective.is_complete),
+    } for objective in objectives]
+
+
+def progress_trend(user_ids, start, end):
+    """Daily ``(day, progress, objectives, completed)`` rows averaged over
+    the objectives owned by ``user_ids`` between ``start`` and ``end``.
+    Objectives deleted but not yet purged are left out."""
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    return db.session.query(
+        ObjectiveSnapshot.day,
+        func.avg(ObjectiveSnapshot.progress).label('progress'),
+        func.count(ObjectiveSnapshot.id).label('objectives'),
+        func.sum(case((ObjectiveSnapshot.is_complete, 1), else_=0)).label('completed'),
+    ).join(Objective, Objective.id == ObjectiveSnapshot.objective_id)\
+        .filter(ObjectiveSnapshot.user_id.in_(user_ids))\
+        .filter(ObjectiveSnapshot.day.between(start, end))\
+        .filter(Objective.deleted_at.is_(None))\
+        .group_by(ObjectiveSnapshot.day)\
+        .order_by(ObjectiveSnapshot.day)\
+        .all()
@@ -0,0 +1,170 @@
+"""
+Structured request logging.
+
+Every request produces one JSON line on the ``okr.request`` logger with
+its request id, user id, endpoint, method, path, status, duration, and the
+number and total time of the SQL statements it ran.
+
+The request id is taken from an incoming ``X-Request-ID`` header (set by
+nginx or an upstream service) when it looks sane, otherwise generated. It is
+available as ``g.request_id`` and echoed back in the response.
+
+Log records are put on an in-memory queue and written by a listener thread,
+so a slow sink (a full disk, a blocked pipe) never holds up a request. The
+queue holds ``REQUEST_LOG_QUEUE_SIZE`` records. If the sink cannot keep up
+beyond that, records are dropped and counted rather than making requests
+wait. Each process starts its own listener on its first request, because
+gunicorn forks workers from a preloaded app and threads do not survive a
+fork.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import g, has_request_context, request, session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LOGGER = 'okr.request'
+
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A queue handler that never blocks: when the queue is full the record
+    is dropped and counted."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestLog:
+    def __init__(self, app, path=None, queue_size=10000):
+        self.app = app
+        self.path = path
+        self.queue_size = queue_size
+        self.logger = logging.getLogger(LOGGER)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._handler = None
+        self._listener = None
+        atexit.register(self.stop)
+
+    def _sink(self):
+        if self.path:
+            handler = logging.handlers.WatchedFileHandler(self.path)
+        else:
+            handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JSONFormatter())
+        return handler
+
+    def _start(self):
+        log_queue = queue.Queue(self.queue_size)
+        handler = DroppingQueueHandler(log_queue)
+        listener = logging.handlers.QueueListener(log_queue, self._sink(), respect_handler_level=True)
+        listener.start()
+        self._handler, self._listener, self._pid = handler, listener, os.getpid()
+
+    def log(self, fields):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+        if self._handler.dropped:
+            fields['log_records_dropped'], self._handler.dropped = self._handler.dropped, 0
+        # Handed to this app's queue directly rather than through the logger's
+        # handlers, which every app in the process would share.
+        self._handler.handle(self.logger.makeRecord(
+            LOGGER, logging.INFO, __file__, 0, 'request', (), None, extra={'fields': fields}))
+
+    def stop(self):
+        """Write out whatever is queued; registered with ``atexit``. The
+        next record starts a new listener."""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener, self._pid = None, None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault('request_log_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(connection, cursor, statement, parameters, context, executemany):
+    started = connection.info['request_log_started'].pop()
+    if has_request_context() and 'request_log_db' in g:
+        g.request_log_db[0] += 1
+        g.request_log_db[1] += time.perf_counter() - started
+
+
+def _request_id():
+    incoming = request.headers.get('X-Request-ID', '')
+    return incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+
+
+def init_app(app):
+    if not app.config.get('REQUEST_LOG_ENABLED', True):
+        return
+    request_log = app.extensions['requestlog'] = RequestLog(
+        app,
+        path=app.config.get('REQUEST_LOG_FILE'),
+        queue_size=app.config.get('REQUEST_LOG_QUEUE_SIZE', 10000),
+    )
+
+    @app.before_request
+    def start_request_log():
+        g.request_id = _request_id()
+        g.request_log_start = time.perf_counter()
+        g.request_log_db = [0, 0.0]
+
+    @app.after_request
+    def write_request_log(response):
+        if 'request_log_start' not in g:
+            return response
+        queries, db_seconds = g.request_log_db
+        response.headers['X-Request-ID'] = g.request_id
+        request_log.log({
+            'request_id': g.request_id,
+            # From the session rather than current_user, which could cost a
+            # query to load or refresh the user.
+            'user_id': session.get('_user_id'),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - g.request_log_start) * 1000, 2),
+            'db_queries': queries,
+            'db_ms': round(db_seconds * 1000, 2),
+            'remote_addr': request.remote_addr,
+        })
+        return response
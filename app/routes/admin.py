@@ -0,0 +1,47 @@
+from functools import wraps
+from flask import Blueprint, render_template, request, abort, g
+from flask_login import login_required, current_user
+from app import sharding, stats
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+def admin_required(view):
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if not current_user.is_admin:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
+@admin_bp.route('/')
+@admin_required
+def overview():
+    sort = request.args.get('sort', 'progress')
+    if sort not in stats.USER_SORTS:
+        sort = 'progress'
+    direction = 'asc' if request.args.get('dir') == 'asc' else 'desc'
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    # Statistics are per shard; admins pick which one to look at.
+    shards = sharding.shard_names() if sharding.enabled() else []
+    shard = request.args.get('shard')
+    if shard not in shards:
+        shard = g.get('shard')
+    
+    with sharding.use(shard):
+        summary = stats.overview()
+        users, has_next = stats.user_performance(sort=sort, direction=direction, page=page)
+        top = stats.performers()
+        bottom = stats.performers(lowest=True)
+    return render_template('admin/overview.html',
+                           summary=summary,
+                           top=top,
+                           bottom=bottom,
+                           users=users,
+                           sort=sort,
+                           direction=direction,
+                           page=page,
+                           has_next=has_next,
+                           shards=shards,
+                           shard=shard)
@@ -0,0 +1,23 @@
+from flask import Blueprint, render_template, request, abort
+from flask_login import login_required, current_user
+from app import archive
+
+archive_bp = Blueprint('archive', __name__)
+
+@archive_bp.route('/archive')
+@login_required
+def list_archived():
+    page = max(request.args.get('page', 1, type=int), 1)
+    objectives, progress, has_next = archive.archived_objectives(current_user.id, page=page)
+    return render_template('archive/list.html', objectives=objectives, progress=progress,
+                           page=page, has_next=has_next)
+
+@archive_bp.route('/archive/<int:id>')
+@login_required
+def view_archived(id):
+    objective, key_results = archive.archived_objective_detail(id)
+    if objective is None:
+        abort(404)
+    if objective.user_id != current_user.id:
+        abort(403)
+    return render_template('archive/view.html', objective=objective, key_results=key_results)
@@ -3,6 +3,7 @@ from flask_login import login_user, logout_user, login_required, current_user
 from urllib.parse import urlparse
 from app.models import User, db
 from app.forms import LoginForm, RegistrationForm
+from app import ratelimit, sharding
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -11,9 +12,14 @@ def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.dashboard'))
     
+    if request.method == 'POST':
+        ratelimit.enforce('login', username=request.form.get('username'))
+    
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
+        user = None
+        if sharding.activate_for_username(form.username.data):
+            user = User.query.filter_by(username=form.username.data).first()
         if user is None or not user.check_password(form.password.data):
             flash('Invalid username or password')
             return redirect(url_for('auth.login'))
@@ -36,11 +42,15 @@ def register():
     if current_user.is_authenticated:
         return redirect(url_for('main.dashboard'))
     
+    if request.method == 'POST':
+        ratelimit.enforce('register')
+    
     form = RegistrationForm()
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data)
+        # Hash first: placing the user starts the write transaction.
         user.set_password(form.password.data)
-        db.session.add(user)
+        sharding.place_new_user(user)
         db.session.commit()
         flash('Congratulations, you are now a registered user!')
         return redirect(url_for('auth.login'))
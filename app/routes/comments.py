@@ -0,0 +1,79 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask_login import login_required, current_user
+from app.models import Objective, KeyResult, Comment, db
+from app.forms import CommentForm
+from app import comments
+
+comments_bp = Blueprint('comments', __name__)
+
+def _belongs_to(comment, target):
+    if isinstance(target, Objective):
+        return comment.objective_id == target.id
+    return comment.key_result_id == target.id
+
+def _post_comment(target, form):
+    parent = None
+    if form.parent_id.data:
+        parent = Comment.query.get_or_404(form.parent_id.data)
+        if not _belongs_to(parent, target):
+            abort(400)
+    comments.add_comment(target, current_user, form.body.data, parent=parent)
+    db.session.commit()
+    flash('Comment posted.')
+
+@comments_bp.route('/objectives/<int:id>/comments', methods=['GET', 'POST'])
+@login_required
+def objective_comments(id):
+    objective = Objective.active().filter_by(id=id).first_or_404()
+    if objective.user_id != current_user.id:
+        abort(403)
+    
+    form = CommentForm()
+    if form.validate_on_submit():
+        _post_comment(objective, form)
+        if request.args.get('next') == 'view':
+            return redirect(url_for('objectives.view_objective', id=objective.id, _anchor='comments'))
+        return redirect(url_for('comments.objective_comments', id=objective.id))
+    
+    page = comments.thread_page(objective, cursor=request.args.get('before'))
+    return render_template('comments/list.html', form=form, page=page, target=objective,
+                           objective=objective, title=objective.title,
+                           action=url_for('comments.objective_comments', id=objective.id),
+                           endpoint='comments.objective_comments')
+
+@comments_bp.route('/keyresults/<int:id>/comments', methods=['GET', 'POST'])
+@login_required
+def key_result_comments(id):
+    key_result = KeyResult.with_objective().filter_by(id=id).first_or_404()
+    objective = key_result.objective
+    if objective.deleted_at is not None:
+        abort(404)
+    if objective.user_id != current_user.id:
+        abort(403)
+    
+    form = CommentForm()
+    if form.validate_on_submit():
+        _post_comment(key_result, form)
+        return redirect(url_for('comments.key_result_comments', id=key_result.id))
+    
+    page = comments.thread_page(key_result, cursor=request.args.get('before'))
+    return render_template('comments/list.html', form=form, page=page, target=key_result,
+                           objective=objective, title=key_result.title,
+                           action=url_for('comments.key_result_comments', id=key_result.id),
+                           endpoint='comments.key_result_comments')
+
+@comments_bp.route('/comments/<int:id>/delete', methods=['POST'])
+@login_required
+def delete_comment(id):
+    comment = Comment.query.get_or_404(id)
+    if comment.user_id != current_user.id:
+        abort(403)
+    
+    if comment.objective_id:
+        next_page = url_for('comments.objective_comments', id=comment.objective_id)
+    else:
+        next_page = url_for('comments.key_result_comments', id=comment.key_result_id)
+    comments.delete_comment(comment)
+    db.session.commit()
+    flash('Comment deleted.')
+    return redirect(next_page)
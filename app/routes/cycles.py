@@ -0,0 +1,56 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask_login import login_required, current_user
+from app.models import Cycle, db
+from app.forms import CycleForm
+from app import cycles
+
+cycles_bp = Blueprint('cycles', __name__)
+
+@cycles_bp.route('/cycles', methods=['GET', 'POST'])
+@login_required
+def list_cycles():
+    user_cycles = cycles.for_user(current_user.id)
+    form = CycleForm()
+    if form.validate_on_submit():
+        cycle = Cycle(
+            user_id=current_user.id,
+            name=form.name.data,
+            start_date=form.start_date.data,
+            end_date=form.end_date.data,
+        )
+        db.session.add(cycle)
+        db.session.flush()
+        assigned = cycles.assign_objectives(cycle)
+        db.session.commit()
+        flash(f'Cycle {cycle.name} added'
+              + (f', with the {assigned} objectives due within it.' if assigned else '.'))
+        return redirect(url_for('cycles.list_cycles'))
+    
+    if not form.is_submitted():
+        form.name.data, form.start_date.data, form.end_date.data = cycles.next_quarter(user_cycles)
+    return render_template('cycles/list.html', form=form, cycles=user_cycles,
+                           active=cycles.active(user_cycles),
+                           counts=cycles.objective_counts(current_user.id))
+
+def _own_cycle(id):
+    cycle = db.get_or_404(Cycle, id)
+    if cycle.user_id != current_user.id:
+        abort(403)
+    return cycle
+
+@cycles_bp.route('/cycles/<int:id>/rollover', methods=['POST'])
+@login_required
+def roll_over(id):
+    source = _own_cycle(id)
+    target_id = request.form.get('target', type=int)
+    if target_id is None or target_id == source.id:
+        abort(400)
+    target = _own_cycle(target_id)
+    objectives, key_results = cycles.roll_over(source, target)
+    db.session.commit()
+    if objectives:
+        flash(f'Rolled {key_results} unfinished key results over into {target.name}, '
+              f'under {objectives} objectives.')
+    else:
+        flash(f'Nothing left to roll over from {source.name} into {target.name}.')
+    return redirect(url_for('objectives.list_objectives', cycle=target.id))
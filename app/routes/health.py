@@ -0,0 +1,22 @@
+from flask import Blueprint, jsonify
+from app import health
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/healthz')
+def healthz():
+    """Liveness: the worker is up and serving. No I/O."""
+    return _no_store(jsonify(status='ok'))
+
+@health_bp.route('/readyz')
+def readyz():
+    """Readiness: every shard is reachable and migrated (see app/health.py)."""
+    ready, problems = health.readiness()
+    response = jsonify(status='ok' if ready else 'unavailable',
+                       checks={name: issues or 'ok' for name, issues in problems.items()})
+    response.status_code = 200 if ready else 503
+    return _no_store(response)
+
+def _no_store(response):
+    response.headers['Cache-Control'] = 'no-store'
+    return response
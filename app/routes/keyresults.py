@@ -1,14 +1,16 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
 from flask_login import login_required, current_user
-from app.models import Objective, KeyResult, KeyResultUpdate, db
-from app.forms import KeyResultForm, KeyResultUpdateForm
+from datetime import datetime
+from app.models import Objective, KeyResult, db
+from app.forms import KeyResultForm, KeyResultUpdateForm, BatchCheckInForm
+from app import checkins, forecasts, search, tags, tracking
 
 keyresults_bp = Blueprint('keyresults', __name__)
 
 @keyresults_bp.route('/objectives/<int:objective_id>/keyresults/new', methods=['GET', 'POST'])
 @login_required
 def new_key_result(objective_id):
-    objective = Objective.query.get_or_404(objective_id)
+    objective = Objective.active().filter_by(id=objective_id).first_or_404()
     if objective.user_id != current_user.id:
         abort(403)
     
@@ -22,7 +24,11 @@ def new_key_result(objective_id):
             unit=form.unit.data,
             objective_id=objective.id
         )
+        key_result.tags = tags.resolve(form.tags.data)
         db.session.add(key_result)
+        db.session.flush()
+        search.index_key_result(key_result, objective)
+        tracking.refresh(db.session.connection(), [objective.id])
         db.session.commit()
         flash('Key Result added successfully.')
         return redirect(url_for('objectives.view_objective', id=objective.id))
@@ -32,18 +38,27 @@ def new_key_result(objective_id):
 @keyresults_bp.route('/keyresults/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_key_result(id):
-    key_result = KeyResult.query.get_or_404(id)
+    key_result = KeyResult.with_objective().filter_by(id=id).first_or_404()
     objective = key_result.objective
+    if objective.deleted_at is not None:
+        abort(404)
     if objective.user_id != current_user.id:
         abort(403)
     
     form = KeyResultForm(obj=key_result)
     if form.validate_on_submit():
+        target_changed = key_result.target_value != form.target_value.data
         key_result.title = form.title.data
         key_result.description = form.description.data
         key_result.target_value = form.target_value.data
         key_result.current_value = form.current_value.data
         key_result.unit = form.unit.data
+        key_result.tags = tags.resolve(form.tags.data)
+        search.index_key_result(key_result, objective)
+        db.session.flush()
+        tracking.refresh(db.session.connection(), [objective.id])
+        if target_changed:
+            forecasts.refresh(db.session.connection(), {key_result.id: key_result.target_value})
         db.session.commit()
         flash('Key Result updated successfully.')
         return redirect(url_for('objectives.view_objective', id=objective.id))
@@ -53,12 +68,17 @@ def edit_key_result(id):
 @keyresults_bp.route('/keyresults/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_key_result(id):
-    key_result = KeyResult.query.get_or_404(id)
+    key_result = KeyResult.with_objective().filter_by(id=id).first_or_404()
     objective = key_result.objective
+    if objective.deleted_at is not None:
+        abort(404)
     if objective.user_id != current_user.id:
         abort(403)
     
+    search.remove_key_result(key_result)
     db.session.delete(key_result)
+    db.session.flush()
+    tracking.refresh(db.session.connection(), [objective.id])
     db.session.commit()
     flash('Key Result deleted successfully.')
     return redirect(url_for('objectives.view_objective', id=objective.id))
@@ -66,23 +86,72 @@ def delete_key_result(id):
 @keyresults_bp.route('/keyresults/<int:id>/update', methods=['GET', 'POST'])
 @login_required
 def update_key_result(id):
-    key_result = KeyResult.query.get_or_404(id)
+    key_result = KeyResult.with_objective().filter_by(id=id).first_or_404()
     objective = key_result.objective
+    if objective.deleted_at is not None:
+        abort(404)
     if objective.user_id != current_user.id:
         abort(403)
     
     form = KeyResultUpdateForm()
     if form.validate_on_submit():
-        update = KeyResultUpdate(
-            value=form.value.data,
-            comment=form.comment.data,
-            key_result_id=key_result.id
-        )
-        key_result.current_value = form.value.data
-        db.session.add(update)
+        if checkins.enqueue(key_result, form.value.data, form.comment.data):
+            flash('Key Result progress update received; it will appear shortly.')
+            return redirect(url_for('objectives.view_objective', id=objective.id))
+        objective_id = objective.id
+        checkins.write_checkins(db.session.connection(), [{
+            'key_result_id': key_result.id, 'value': form.value.data,
+            'comment': form.comment.data, 'timestamp': datetime.utcnow(),
+        }])
         db.session.commit()
         flash('Key Result progress updated.')
-        return redirect(url_for('objectives.view_objective', id=objective.id))
+        # objective_id rather than objective.id, which the commit expired
+        return redirect(url_for('objectives.view_objective', id=objective_id))
     
     form.value.data = key_result.current_value
-    return render_template('keyresults/update.html', form=form, key_result=key_result)
\ No newline at end of file
+    return render_template('keyresults/update.html', form=form, key_result=key_result)
+
+@keyresults_bp.route('/objectives/<int:objective_id>/keyresults/update', methods=['GET', 'POST'])
+@login_required
+def update_key_results(objective_id):
+    """Check in on all key results of an objective with one form and one
+    write."""
+    objective = Objective.active().filter_by(id=objective_id).first_or_404()
+    if objective.user_id != current_user.id:
+        abort(403)
+    key_results = {key_result.id: key_result for key_result in
+                   objective.key_results.options(db.lazyload(KeyResult.tags)).order_by(KeyResult.id)}
+    
+    form = BatchCheckInForm()
+    if not form.is_submitted():
+        for key_result in key_results.values():
+            form.checkins.append_entry({'key_result_id': key_result.id, 'value': key_result.current_value})
+    elif any(entry.key_result_id.data not in key_results for entry in form.checkins):
+        abort(400)
+    
+    if form.validate_on_submit():
+        changes = []
+        for entry in form.checkins:
+            key_result = key_results[entry.key_result_id.data]
+            value, comment = entry.value.data, entry.comment.data
+            # Rows left as they were are not check-ins
+            if value is None or (value == key_result.current_value and not comment):
+                continue
+            changes.append((key_result, value, comment))
+        if not changes:
+            flash('Nothing to update.')
+        elif checkins.enqueue_many(changes):
+            flash(f'{len(changes)} check-ins received; they will appear shortly.')
+        else:
+            now = datetime.utcnow()
+            checkins.write_checkins(db.session.connection(), [
+                {'key_result_id': key_result.id, 'value': value, 'comment': comment, 'timestamp': now}
+                for key_result, value, comment in changes
+            ])
+            db.session.commit()
+            flash(f'Progress updated for {len(changes)} key results.')
+        # objective_id rather than objective.id, which the commit expired
+        return redirect(url_for('objectives.view_objective', id=objective_id))
+    
+    return render_template('keyresults/update_all.html', form=form, objective=objective,
+                           key_results=key_results)
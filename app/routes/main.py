@@ -1,6 +1,7 @@
-from flask import Blueprint, render_template, redirect, url_for
+from flask import Blueprint, render_template, redirect, url_for, request
 from flask_login import login_required, current_user
-from app.models import Objective, KeyResult
+from app.models import Objective, KeyResult, db
+from app import cycles, forecasts, tracking
 from datetime import datetime
 
 main_bp = Blueprint('main', __name__)
@@ -14,7 +15,10 @@ def index():
 @main_bp.route('/dashboard')
 @login_required
 def dashboard():
-    objectives = Objective.query.filter_by(user_id=current_user.id).all()
+    user_cycles = cycles.for_user(current_user.id)
+    cycle = cycles.pick(user_cycles, request.args.get('cycle'))
+    objectives = Objective.load_progress(
+        cycles.filter_objectives(Objective.active().filter_by(user_id=current_user.id), cycle))
     
     # Calculate overall progress
     total_progress = 0
@@ -31,13 +35,29 @@ def dashboard():
         overall_progress = 0
     
     # Get upcoming objectives
-    upcoming = Objective.query.filter_by(user_id=current_user.id)\
-        .filter(Objective.end_date >= datetime.utcnow())\
-        .filter(Objective.is_complete == False)\
-        .order_by(Objective.end_date).limit(5).all()
+    now = datetime.utcnow()
+    upcoming = sorted((obj for obj in objectives
+                       if obj.end_date and obj.end_date >= now and not obj.is_complete),
+                      key=lambda obj: obj.end_date)[:5]
+    
+    # Objectives behind schedule, furthest behind first
+    behind = cycles.filter_objectives(
+        Objective.active().options(db.lazyload(Objective.tags)).filter_by(user_id=current_user.id), cycle)\
+        .filter(Objective.status.in_(('at_risk', 'off_track')))\
+        .order_by(*tracking.by_severity()).limit(5).all()
+    status_counts = {status: 0 for status in tracking.STATUSES}
+    for obj in objectives:
+        if obj.status in status_counts:
+            status_counts[obj.status] += 1
     
     return render_template('dashboard.html', 
                           objectives=objectives, 
                           overall_progress=overall_progress,
                           completed=completed,
-                          upcoming=upcoming)
\ No newline at end of file
+                          upcoming=upcoming,
+                          behind=behind,
+                          status_counts=status_counts,
+                          statuses=tracking.STATUSES,
+                          cycles=user_cycles,
+                          cycle=cycle,
+                          forecasts=forecasts.for_objectives([obj.id for obj in upcoming]))
\ No newline at end of file
@@ -1,7 +1,8 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify
 from flask_login import login_required, current_user
 from app.models import Objective, KeyResult, db
-from app.forms import ObjectiveForm, KeyResultForm
+from app.forms import ObjectiveForm, KeyResultForm, CommentForm
+from app import search, tags, comments, purge, webhooks, forecasts, tracking, cycles
 from datetime import datetime
 
 objectives_bp = Blueprint('objectives', __name__)
@@ -9,63 +10,129 @@ objectives_bp = Blueprint('objectives', __name__)
 @objectives_bp.route('/objectives')
 @login_required
 def list_objectives():
-    objectives = Objective.query.filter_by(user_id=current_user.id).all()
-    return render_template('objectives/list.html', objectives=objectives)
+    selected_tags = tags.normalize(request.args.getlist('tag'))
+    status = request.args.get('status')
+    if status not in tracking.STATUSES:
+        status = None
+    sort = 'status' if request.args.get('sort') == 'status' else None
+    user_cycles = cycles.for_user(current_user.id)
+    cycle = cycles.pick(user_cycles, request.args.get('cycle'))
+    query = cycles.filter_objectives(Objective.active().filter_by(user_id=current_user.id), cycle)
+    if status:
+        query = query.filter_by(status=status)
+    if sort:
+        query = query.order_by(*tracking.by_severity())
+    objectives = Objective.load_progress(tags.filter_objectives(query, selected_tags))
+    tag_cloud = tags.tag_counts(current_user.id)
+    return render_template('objectives/list.html', objectives=objectives,
+                           selected_tags=selected_tags, tag_cloud=tag_cloud,
+                           status=status, sort=sort, statuses=tracking.STATUSES,
+                           cycles=user_cycles, cycle=cycle)
 
 @objectives_bp.route('/objectives/new', methods=['GET', 'POST'])
 @login_required
 def new_objective():
+    user_cycles = cycles.for_user(current_user.id)
     form = ObjectiveForm()
+    form.cycle_id.choices = cycles.choices(user_cycles)
     if form.validate_on_submit():
         objective = Objective(
             title=form.title.data,
             description=form.description.data,
             start_date=form.start_date.data,
             end_date=form.end_date.data,
+            cycle_id=form.cycle_id.data or None,
             user_id=current_user.id
         )
+        objective.tags = tags.resolve(form.tags.data)
         db.session.add(objective)
+        db.session.flush()
+        search.index_objective(objective)
         db.session.commit()
         flash('Objective created successfully.')
         return redirect(url_for('objectives.view_objective', id=objective.id))
     
+    if not form.is_submitted():
+        cycle = cycles.active(user_cycles)
+        if cycle is not None:
+            form.cycle_id.data = cycle.id
+            form.start_date.data, form.end_date.data = cycle.start_date, cycle.end_date
     return render_template('objectives/new.html', form=form)
 
 @objectives_bp.route('/objectives/<int:id>')
 @login_required
 def view_objective(id):
-    objective = Objective.query.get_or_404(id)
+    objective = Objective.active().filter_by(id=id).first_or_404()
     if objective.user_id != current_user.id:
         abort(403)
-    return render_template('objectives/view.html', objective=objective)
+    key_results = objective.key_results.all()
+    return render_template('objectives/view.html', objective=objective,
+                           key_results=key_results,
+                           forecasts=forecasts.for_key_results([kr.id for kr in key_results]),
+                           comments=comments.thread_page(objective),
+                           comment_form=CommentForm())
 
 @objectives_bp.route('/objectives/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_objective(id):
-    objective = Objective.query.get_or_404(id)
+    objective = Objective.active().filter_by(id=id).first_or_404()
     if objective.user_id != current_user.id:
         abort(403)
     
     form = ObjectiveForm(obj=objective)
+    form.cycle_id.choices = cycles.choices(cycles.for_user(current_user.id))
+    if form.cycle_id.data is None:
+        form.cycle_id.data = 0
     if form.validate_on_submit():
         objective.title = form.title.data
         objective.description = form.description.data
         objective.start_date = form.start_date.data
         objective.end_date = form.end_date.data
+        objective.cycle_id = form.cycle_id.data or None
+        objective.tags = tags.resolve(form.tags.data)
+        search.index_objective(objective)
+        db.session.flush()
+        tracking.refresh(db.session.connection(), [objective.id])
         db.session.commit()
         flash('Objective updated successfully.')
         return redirect(url_for('objectives.view_objective', id=objective.id))
     
     return render_template('objectives/edit.html', form=form, objective=objective)
 
+@objectives_bp.route('/objectives/<int:id>/complete', methods=['POST'])
+@login_required
+def complete_objective(id):
+    """Mark an objective complete or not. Answers the checkbox on the
+    objective page (JSON) with JSON, and plain form posts with a redirect."""
+    objective = Objective.active().options(db.lazyload(Objective.tags)).filter_by(id=id).first_or_404()
+    if objective.user_id != current_user.id:
+        abort(403)
+    
+    if request.is_json:
+        is_complete = bool((request.get_json(silent=True) or {}).get('is_complete'))
+    else:
+        is_complete = request.form.get('is_complete', '').lower() in ('1', 'true', 'on', 'y', 'yes')
+    if is_complete != bool(objective.is_complete):
+        objective.is_complete = is_complete
+        if is_complete:
+            webhooks.emit(db.session.connection(), [webhooks.objective_completed(objective)])
+        db.session.flush()
+        tracking.refresh(db.session.connection(), [objective.id])
+        db.session.commit()
+    if request.is_json:
+        return jsonify(success=True, is_complete=is_complete)
+    flash('Objective marked as complete.' if is_complete else 'Objective reopened.')
+    return redirect(url_for('objectives.view_objective', id=id))
+
 @objectives_bp.route('/objectives/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_objective(id):
-    objective = Objective.query.get_or_404(id)
+    objective = Objective.active().filter_by(id=id).first_or_404()
     if objective.user_id != current_user.id:
         abort(403)
     
-    db.session.delete(objective)
+    purge.soft_delete(objective)
     db.session.commit()
+    purge.schedule(objective.id)
     flash('Objective deleted successfully.')
     return redirect(url_for('objectives.list_objectives'))
\ No newline at end of file
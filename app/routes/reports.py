@@ -0,0 +1,30 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import login_required, current_user
+from app import reports
+from app.routes.admin import admin_required
+from datetime import datetime, timedelta
+
+reports_bp = Blueprint('reports', __name__)
+
+PERIODS = (30, 90, 180, 365)
+
+@reports_bp.route('/reports')
+@login_required
+def progress_report():
+    days = request.args.get('days', 90, type=int)
+    if days not in PERIODS:
+        days = 90
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    trend = reports.progress_trend(current_user.id, start, end)
+    return render_template('reports/progress.html', trend=trend, days=days,
+                           periods=PERIODS, start=start, end=end)
+
+# Snapshots every user's objectives since the last run, so it is left to
+# admins; the nightly `flask reports snapshot` is the usual way.
+@reports_bp.route('/reports/refresh', methods=['POST'])
+@admin_required
+def refresh_report():
+    reports.materialize_snapshots()
+    flash('Report data refreshed.')
+    return redirect(url_for('reports.progress_report', days=request.args.get('days', 90, type=int)))
@@ -0,0 +1,13 @@
+from flask import Blueprint, render_template, request
+from flask_login import login_required, current_user
+from app import search
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/search')
+@login_required
+def search_okrs():
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    results = search.search(current_user.id, query, page=max(page, 1))
+    return render_template('search/results.html', query=query, results=results)
@@ -0,0 +1,17 @@
+from flask import Blueprint, jsonify, request
+from flask_login import login_required, current_user
+from app import changes
+
+sync_bp = Blueprint('sync', __name__)
+
+@sync_bp.route('/changes')
+@login_required
+def list_changes():
+    """Changes to the current user's objectives, key results and check-ins
+    after ``since`` (see app/changes.py)."""
+    since = max(request.args.get('since', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', changes.PAGE_SIZE, type=int), 1), changes.MAX_PAGE_SIZE)
+    entries, next_seq, has_more = changes.feed(current_user.id, since=since, limit=limit)
+    response = jsonify(changes=entries, next=next_seq, has_more=has_more)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
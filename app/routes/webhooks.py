@@ -0,0 +1,51 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, abort
+from flask_login import login_required, current_user
+from app.models import WebhookSubscription, db
+from app.forms import WebhookForm
+from app import webhooks
+
+webhooks_bp = Blueprint('webhooks', __name__)
+
+@webhooks_bp.route('/webhooks', methods=['GET', 'POST'])
+@login_required
+def list_webhooks():
+    form = WebhookForm()
+    if form.validate_on_submit():
+        db.session.add(WebhookSubscription(
+            user_id=current_user.id,
+            url=form.url.data,
+            secret=webhooks.new_secret(),
+            events=','.join(form.events.data),
+        ))
+        db.session.commit()
+        flash('Webhook added. Use its secret to check the signature of each request.')
+        return redirect(url_for('webhooks.list_webhooks'))
+
+    subscriptions = WebhookSubscription.query.filter_by(user_id=current_user.id)\
+        .order_by(WebhookSubscription.id).all()
+    counts = webhooks.delivery_counts([subscription.id for subscription in subscriptions])
+    return render_template('webhooks/list.html', form=form, subscriptions=subscriptions,
+                           counts=counts, events=webhooks.EVENTS)
+
+def _own_subscription(id):
+    subscription = db.get_or_404(WebhookSubscription, id)
+    if subscription.user_id != current_user.id:
+        abort(403)
+    return subscription
+
+@webhooks_bp.route('/webhooks/<int:id>/retry', methods=['POST'])
+@login_required
+def retry_webhook(id):
+    subscription = _own_subscription(id)
+    retried = webhooks.retry_failed(db.session.connection(), subscription.id)
+    db.session.commit()
+    flash(f'{retried} failed events will be sent again.')
+    return redirect(url_for('webhooks.list_webhooks'))
+
+@webhooks_bp.route('/webhooks/<int:id>/delete', methods=['POST'])
+@login_required
+def delete_webhook(id):
+    db.session.delete(_own_subscription(id))
+    db.session.commit()
+    flash('Webhook deleted.')
+    return redirect(url_for('webhooks.list_webhooks'))
@@ -0,0 +1,299 @@
+"""
+Full-text search over objectives and key results.
+
+The index lives next to the OKR tables and is updated in the same
+transaction as the write that changes a document. On SQLite it is an FTS5
+virtual table ranked with bm25(); on PostgreSQL it is a plain table with a
+GIN-indexed tsvector column ranked with ts_rank().
+"""
+import re
+from sqlalchemy import event, text
+from app.models import db
+
+OBJECTIVE = 'objective'
+KEY_RESULT = 'key_result'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchHit:
+    def __init__(self, kind, ref_id, objective_id, title, snippet):
+        self.kind = kind
+        self.ref_id = ref_id
+        self.objective_id = objective_id
+        self.title = title
+        self.snippet = snippet
+
+
+class SearchPage:
+    def __init__(self, hits, page, per_page, has_next):
+        self.hits = hits
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+
+class SQLiteBackend:
+    """FTS5 index. The rowid encodes the document (2 * id, +1 for key
+    results) so upserts and deletes are primary-key lookups, and the
+    ``scope`` column carries ``u<user_id>`` and ``o<objective_id>`` tokens
+    so ownership filters and cascading deletes also use the index."""
+
+    def create(self, connection):
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "title, body, scope, kind UNINDEXED, ref_id UNINDEXED, "
+            "objective_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+
+    def drop(self, connection):
+        connection.execute(text("DROP TABLE IF EXISTS search_index"))
+
+    @staticmethod
+    def _rowid(kind, ref_id):
+        return ref_id * 2 + (1 if kind == KEY_RESULT else 0)
+
+    def upsert(self, kind, ref_id, user_id, objective_id, title, body):
+        rowid = self._rowid(kind, ref_id)
+        db.session.execute(text("DELETE FROM search_index WHERE rowid = :rowid"),
+                           {'rowid': rowid})
+        db.session.execute(text(
+            "INSERT INTO search_index (rowid, title, body, scope, kind, ref_id, objective_id) "
+            "VALUES (:rowid, :title, :body, :scope, :kind, :ref_id, :objective_id)"
+        ), {
+            'rowid': rowid,
+            'title': title or '',
+            'body': body or '',
+            'scope': f'u{user_id} o{objective_id}',
+            'kind': kind,
+            'ref_id': ref_id,
+            'objective_id': objective_id,
+        })
+
+    def populate(self):
+        db.session.execute(text(
+            "INSERT INTO search_index (rowid, title, body, scope, kind, ref_id, objective_id) "
+            "SELECT id * 2, coalesce(title, ''), coalesce(description, ''), "
+            "'u' || user_id || ' o' || id, 'objective', id, id FROM objective "
+            "WHERE deleted_at IS NULL"
+        ))
+        db.session.execute(text(
+            "INSERT INTO search_index (rowid, title, body, scope, kind, ref_id, objective_id) "
+            "SELECT kr.id * 2 + 1, coalesce(kr.title, ''), coalesce(kr.description, ''), "
+            "'u' || o.user_id || ' o' || o.id, 'key_result', kr.id, o.id "
+            "FROM key_result kr JOIN objective o ON o.id = kr.objective_id "
+            "WHERE o.deleted_at IS NULL"
+        ))
+
+    def delete(self, kind, ref_id):
+        db.session.execute(text("DELETE FROM search_index WHERE rowid = :rowid"),
+                           {'rowid': self._rowid(kind, ref_id)})
+
+    def delete_objective(self, objective_id):
+        db.session.execute(text(
+            "DELETE FROM search_index WHERE rowid IN ("
+            "SELECT rowid FROM search_index WHERE search_index MATCH :scope)"
+        ), {'scope': f'scope:o{objective_id}'})
+
+    def search(self, user_id, terms, limit, offset):
+        match = ' AND '.join('"%s"*' % term for term in terms)
+        rows = db.session.execute(text(
+            "SELECT kind, ref_id, objective_id, "
+            "highlight(search_index, 0, '', '') AS title, "
+            "snippet(search_index, 1, '', '', '...', 16) AS snippet "
+            "FROM search_index "
+            "WHERE search_index MATCH :match "
+            "ORDER BY bm25(search_index, 10.0, 1.0, 0.0) "
+            "LIMIT :limit OFFSET :offset"
+        ), {
+            'match': f'scope:u{user_id} AND {{title body}}: ({match})',
+            'limit': limit,
+            'offset': offset,
+        })
+        return rows.all()
+
+
+class PostgresBackend:
+    """tsvector index with title weighted above body."""
+
+    def create(self, connection):
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS search_document ("
+            "kind VARCHAR(16) NOT NULL, "
+            "ref_id INTEGER NOT NULL, "
+            "user_id INTEGER NOT NULL, "
+            "objective_id INTEGER NOT NULL, "
+            "title TEXT NOT NULL, "
+            "body TEXT NOT NULL, "
+            "document TSVECTOR NOT NULL, "
+            "PRIMARY KEY (kind, ref_id))"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_document_document "
+            "ON search_document USING GIN (document)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_document_user_id "
+            "ON search_document (user_id)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_document_objective_id "
+            "ON search_document (objective_id)"
+        ))
+
+    def drop(self, connection):
+        connection.execute(text("DROP TABLE IF EXISTS search_document"))
+
+    def upsert(self, kind, ref_id, user_id, objective_id, title, body):
+        db.session.execute(text(
+            "INSERT INTO search_document "
+            "(kind, ref_id, user_id, objective_id, title, body, document) "
+            "VALUES (:kind, :ref_id, :user_id, :objective_id, :title, :body, "
+            "setweight(to_tsvector('simple', :title), 'A') || "
+            "setweight(to_tsvector('simple', :body), 'B')) "
+            "ON CONFLICT (kind, ref_id) DO UPDATE SET "
+            "user_id = EXCLUDED.user_id, objective_id = EXCLUDED.objective_id, "
+            "title = EXCLUDED.title, body = EXCLUDED.body, document = EXCLUDED.document"
+        ), {
+            'kind': kind,
+            'ref_id': ref_id,
+            'user_id': user_id,
+            'objective_id': objective_id,
+            'title': title or '',
+            'body': body or '',
+        })
+
+    def populate(self):
+        db.session.execute(text(
+            "INSERT INTO search_document "
+            "(kind, ref_id, user_id, objective_id, title, body, document) "
+            "SELECT 'objective', id, user_id, id, coalesce(title, ''), coalesce(description, ''), "
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'B') "
+            "FROM objective WHERE deleted_at IS NULL"
+        ))
+        db.session.execute(text(
+            "INSERT INTO search_document "
+            "(kind, ref_id, user_id, objective_id, title, body, document) "
+            "SELECT 'key_result', kr.id, o.user_id, o.id, "
+            "coalesce(kr.title, ''), coalesce(kr.description, ''), "
+            "setweight(to_tsvector('simple', coalesce(kr.title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(kr.description, '')), 'B') "
+            "FROM key_result kr JOIN objective o ON o.id = kr.objective_id "
+            "WHERE o.deleted_at IS NULL"
+        ))
+
+    def delete(self, kind, ref_id):
+        db.session.execute(text(
+            "DELETE FROM search_document WHERE kind = :kind AND ref_id = :ref_id"
+        ), {'kind': kind, 'ref_id': ref_id})
+
+    def delete_objective(self, objective_id):
+        db.session.execute(text(
+            "DELETE FROM search_document WHERE objective_id = :objective_id"
+        ), {'objective_id': objective_id})
+
+    def search(self, user_id, terms, limit, offset):
+        query = ' & '.join("'%s':*" % term for term in terms)
+        rows = db.session.execute(text(
+            "SELECT kind, ref_id, objective_id, title, left(body, 160) AS snippet "
+            "FROM search_document, to_tsquery('simple', :query) AS q "
+            "WHERE document @@ q AND user_id = :user_id "
+            "ORDER BY ts_rank(document, q) DESC, ref_id DESC "
+            "LIMIT :limit OFFSET :offset"
+        ), {'query': query, 'user_id': user_id, 'limit': limit, 'offset': offset})
+        return rows.all()
+
+
+_BACKENDS = {
+    'sqlite': SQLiteBackend(),
+    'postgresql': PostgresBackend(),
+}
+
+
+def _backend(dialect_name=None):
+    if dialect_name is None:
+        dialect_name = db.session.get_bind().dialect.name
+    return _BACKENDS.get(dialect_name)
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query or '')[:16]
+
+
+def index_objective(objective):
+    backend = _backend()
+    if backend is None:
+        return
+    backend.upsert(OBJECTIVE, objective.id, objective.user_id, objective.id,
+                   objective.title, objective.description)
+
+
+def index_key_result(key_result, objective):
+    backend = _backend()
+    if backend is None:
+        return
+    backend.upsert(KEY_RESULT, key_result.id, objective.user_id, objective.id,
+                   key_result.title, key_result.description)
+
+
+def remove_key_result(key_result):
+    backend = _backend()
+    if backend is not None:
+        backend.delete(KEY_RESULT, key_result.id)
+
+
+def remove_objective(objective):
+    """Remove an objective and all of its key results from the index."""
+    backend = _backend()
+    if backend is not None:
+        backend.delete_objective(objective.id)
+
+
+def remove_objectives(objective_ids):
+    backend = _backend()
+    if backend is not None:
+        for objective_id in objective_ids:
+            backend.delete_objective(objective_id)
+
+
+def search(user_id, query, page=1, per_page=20):
+    terms = tokenize(query)
+    backend = _backend()
+    if not terms or backend is None:
+        return SearchPage([], page, per_page, False)
+
+    rows = backend.search(user_id, terms, per_page + 1, (page - 1) * per_page)
+    hits = [SearchHit(*row) for row in rows[:per_page]]
+    return SearchPage(hits, page, per_page, len(rows) > per_page)
+
+
+def rebuild_index():
+    """Drop and repopulate the index from the OKR tables, leaving out
+    deleted objectives."""
+    connection = db.session.connection()
+    backend = _backend(connection.dialect.name)
+    if backend is None:
+        return
+    backend.drop(connection)
+    backend.create(connection)
+    backend.populate()
+    db.session.commit()
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_index(target, connection, **kw):
+    backend = _backend(connection.dialect.name)
+    if backend is not None:
+        backend.create(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_index(target, connection, **kw):
+    backend = _backend(connection.dialect.name)
+    if backend is not None:
+        backend.drop(connection)
@@ -0,0 +1,360 @@
+"""
+Tenant sharding.
+
+Each user's rows (the user itself, cycles, objectives, key results,
+check-ins, tags, comments, snapshots and their archived copies, webhook
+subscriptions and their outbox) live in exactly one shard. The default database (``SQLALCHEMY_DATABASE_URI``) is the shard
+named ``default``. Further shards are the ``shard*`` entries of
+``SQLALCHEMY_BINDS``, set through ``SHARD_DATABASE_URLS``. Without them
+sharding is off and everything below is a no-op.
+
+The default database also holds the directory, ``ShardMap``. It maps each
+user to a shard and allocates user ids, so that ids stay unique across
+shards. Usernames and emails are reserved there at registration.
+
+Every request resolves its shard from the directory when the user is
+loaded (``activate_for_user``) and stores it on ``g``. From then on
+``RoutingSession`` sends every query to that shard, so the views need no
+changes. The lookup is a primary key read, done on every request rather
+than cached in the session cookie, so a rebalanced user never keeps
+writing to the shard they left.
+
+``move_user`` rebalances one user to another shard:
+
+1. The directory entry is marked ``moving_to``. From then on the user's
+   write requests get a 503; reads keep going to the old shard.
+2. All of the user's rows are copied to the target in one transaction.
+   Rows get new ids there (key results, comments and so on are renumbered
+   together with everything that points at them). Tags are matched by name.
+3. The directory entry is switched to the target, and the old shard is
+   cleaned up.
+
+A move that was interrupted is finished or rolled back by running it
+again.
+
+Commands that work on the whole database (``flask search reindex``,
+``flask archive run`` and so on) run once per shard through ``each``.
+"""
+import time
+from contextlib import contextmanager
+from flask import current_app, g, request
+from flask_login import current_user
+from sqlalchemy import func, select, text
+from werkzeug.exceptions import ServiceUnavailable
+from app.models import db, DEFAULT_SHARD, ShardMap, User, Objective, Tag, shard_engine
+from app import archive, changes, cycles, forecasts, search, stats, webhooks
+
+# Tables whose rows get new ids when they are copied to another shard.
+RENUMBERED = ('objective', 'objective_snapshot', 'key_result', 'key_result_update', 'comment')
+
+# Columns pointing at renumbered rows (or tags), whatever table they are in.
+REFERENCES = {
+    'objective_id': 'objective',
+    'rolled_over_from_id': 'objective',
+    'cycle_id': 'cycle',
+    'key_result_id': 'key_result',
+    'parent_id': 'comment',
+    'root_id': 'comment',
+    'tag_id': 'tag',
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ShardingError(Exception):
+    pass
+
+
+def shard_names():
+    binds = current_app.config.get('SQLALCHEMY_BINDS') or {}
+    return [DEFAULT_SHARD] + [key for key in binds if key.startswith('shard')]
+
+
+def enabled():
+    return len(shard_names()) > 1
+
+
+@contextmanager
+def use(shard):
+    """Route queries to ``shard`` inside the block.
+
+    The session is closed when the shard changes, so that its identity map
+    never mixes rows of two databases. Commit before switching."""
+    previous = g.get('shard')
+    if shard != previous:
+        db.session.close()
+    g.shard = shard
+    try:
+        yield shard
+    finally:
+        if shard != previous:
+            db.session.close()
+        g.shard = previous
+
+
+def each():
+    """Run the loop body once per shard, with that shard active."""
+    if not enabled():
+        yield None
+        return
+    for name in shard_names():
+        with use(name):
+            yield name
+
+
+def _activate(entry):
+    if entry is None:
+        return False
+    g.shard = entry.shard
+    g.shard_moving = entry.moving_to is not None
+    return True
+
+
+def activate_for_user(user_id):
+    """Select the shard holding ``user_id``. Returns False if the directory
+    does not know the user."""
+    if not enabled():
+        return True
+    return _activate(db.session.get(ShardMap, user_id))
+
+
+def activate_for_username(username):
+    if not enabled():
+        return True
+    return _activate(ShardMap.query.filter_by(username=username).first())
+
+
+def is_taken(**criteria):
+    """Whether a user with ``criteria`` (username or email) exists in any
+    shard."""
+    model = ShardMap if enabled() else User
+    return model.query.filter_by(**criteria).first() is not None
+
+
+def _least_loaded():
+    counts = dict(db.session.execute(
+        select(ShardMap.shard, func.count()).group_by(ShardMap.shard)
+    ).all())
+    return min(shard_names(), key=lambda name: counts.get(name, 0))
+
+
+def place_new_user(user):
+    """Add the new ``user`` on the shard with the fewest users, with an id
+    from the directory, and activate that shard. The directory entry is
+    only flushed: the caller's commit saves it together with the user, and
+    a failed registration rolls both back."""
+    if not enabled():
+        db.session.add(user)
+        return
+    entry = ShardMap(username=user.username, email=user.email, shard=_least_loaded())
+    db.session.add(entry)
+    db.session.flush()
+    user.id = entry.id
+    _activate(entry)
+    db.session.add(user)
+
+
+def register_existing_users():
+    """Add directory entries for users of the default shard that have none,
+    e.g. when sharding is switched on for an existing database. Returns the
+    number of users added."""
+    with use(DEFAULT_SHARD):
+        known = set(db.session.execute(select(ShardMap.id)).scalars())
+        users = db.session.execute(select(User.id, User.username, User.email)).all()
+        missing = [user for user in users if user.id not in known]
+        db.session.add_all(ShardMap(id=user.id, username=user.username, email=user.email,
+                                    shard=DEFAULT_SHARD) for user in missing)
+        db.session.commit()
+    return len(missing)
+
+
+def shard_sizes():
+    return dict(db.session.execute(
+        select(ShardMap.shard, func.count()).group_by(ShardMap.shard)
+    ).all())
+
+
+class _TagIds(dict):
+    """Source tag id -> target tag id, creating missing tags by name."""
+
+    def __init__(self, source, target):
+        super().__init__()
+        tags = Tag.__table__
+        self.target = target
+        self.names = dict(source.execute(select(tags.c.id, tags.c.name)).all())
+        self.existing = dict(target.execute(select(tags.c.name, tags.c.id)).all())
+
+    def __missing__(self, source_id):
+        name = self.names[source_id]
+        if name not in self.existing:
+            self.existing[name] = self.target.execute(
+                Tag.__table__.insert().values(name=name)).inserted_primary_key[0]
+        self[source_id] = self.existing[name]
+        return self[source_id]
+
+
+def _tenant_rows(tables, user_id):
+    objective_ids = select(tables['objective'].c.id).where(tables['objective'].c.user_id == user_id)
+    return archive.objective_rows(tables, objective_ids)
+
+
+def _delete_tenant(connection, user_id):
+    for tables in (archive.HOT, archive.ARCHIVE):
+        criteria = _tenant_rows(tables, user_id)
+        for name in reversed(list(tables)):
+            connection.execute(tables[name].delete().where(criteria[name]))
+    changes.delete_user(connection, user_id)
+    webhooks.delete_user(connection, user_id)
+    cycles.delete_user(connection, user_id)
+    stats.delete_user(connection, user_id)
+    users = User.__table__
+    connection.execute(users.delete().where(users.c.id == user_id))
+
+
+def _next_id(connection, name):
+    return max(connection.execute(select(func.max(tables[name].c.id))).scalar() or 0
+               for tables in (archive.HOT, archive.ARCHIVE)) + 1
+
+
+def _copy_tenant(source, target, user_id, chunk_size=1000):
+    """Copy a user's rows from the ``source`` to the ``target`` connection.
+    Returns the number of rows copied."""
+    users = User.__table__
+    if target.dialect.name == 'postgresql':
+        # Keep other tenants' inserts from taking the ids handed out below.
+        target.execute(text('LOCK TABLE %s IN EXCLUSIVE MODE'
+                            % ', '.join(archive.HOT[name].name for name in RENUMBERED)))
+    # On SQLite this first write takes the database lock, which has the
+    # same effect.
+    user = source.execute(select(users).where(users.c.id == user_id)).one()
+    target.execute(users.insert(), [dict(user._mapping)])
+    copied = 1
+    ids = {'tag': _TagIds(source, target), 'cycle': cycles.copy_user(source, target, user_id)}
+    copied += len(ids['cycle'])
+    next_ids = {}
+    for name in RENUMBERED:
+        ids[name] = {}
+        next_ids[name] = _next_id(target, name)
+    # Hot and archived rows share one id space per table, see app.archive.
+    for tables in (archive.HOT, archive.ARCHIVE):
+        criteria = _tenant_rows(tables, user_id)
+        for name, table in tables.items():
+            result = source.execute(
+                select(table).where(criteria[name]).order_by(*table.primary_key.columns))
+            for chunk in result.partitions(chunk_size):
+                rows = []
+                for row in chunk:
+                    row = dict(row._mapping)
+                    for column, kind in REFERENCES.items():
+                        if row.get(column) is not None:
+                            row[column] = ids[kind][row[column]]
+                    if name in next_ids:
+                        ids[name][row['id']] = row['id'] = next_ids[name]
+                        next_ids[name] += 1
+                    rows.append(row)
+                target.execute(table.insert(), rows)
+                copied += len(rows)
+    copied += webhooks.copy_user(source, target, user_id)
+    if target.dialect.name == 'postgresql':
+        for name in RENUMBERED:
+            target.execute(text(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                "(SELECT max(id) FROM {0}))".format(archive.HOT[name].name)))
+    return copied
+
+
+def _drop_from_shard(user_id, shard):
+    with use(shard):
+        objective_ids = db.session.execute(
+            select(Objective.id).where(Objective.user_id == user_id)).scalars().all()
+        search.remove_objectives(objective_ids)
+        _delete_tenant(db.session.connection(), user_id)
+        db.session.commit()
+
+
+def _index_in_shard(user_id, shard):
+    with use(shard):
+        objectives = Objective.active().filter_by(user_id=user_id).all()
+        for objective in objectives:
+            search.index_objective(objective)
+            for key_result in objective.key_results:
+                search.index_key_result(key_result, objective)
+        # The forecast cache is not copied: the key results have new ids.
+        forecasts.refresh_objectives(db.session.connection(), [objective.id for objective in objectives])
+        db.session.commit()
+
+
+def _finish(user_id):
+    entry = db.session.get(ShardMap, user_id)
+    if entry.moved_from is not None:
+        _drop_from_shard(user_id, entry.moved_from)
+        entry = db.session.get(ShardMap, user_id)
+        entry.moved_from = None
+        db.session.commit()
+
+
+def move_user(user_id, target):
+    """Move everything belonging to ``user_id`` to the ``target`` shard.
+    Returns the number of rows copied."""
+    if target not in shard_names():
+        raise ShardingError(f'unknown shard {target!r}')
+    entry = db.session.get(ShardMap, user_id)
+    if entry is None:
+        raise ShardingError(f'user {user_id} is not in the shard map')
+    _finish(user_id)
+    entry = db.session.get(ShardMap, user_id)
+    if entry.moving_to not in (None, target):
+        # An earlier move to another shard died while copying.
+        with shard_engine(entry.moving_to).begin() as connection:
+            _delete_tenant(connection, user_id)
+    source = entry.shard
+    if source == target:
+        if entry.moving_to is not None:
+            entry.moving_to = None
+            db.session.commit()
+        return 0
+
+    entry.moving_to = target
+    db.session.commit()
+    # Let requests that got past the check before the flag was set, and
+    # check-in buffers, finish writing to the old shard.
+    time.sleep(current_app.config.get('SHARD_MOVE_GRACE', 5))
+    try:
+        with shard_engine(source).connect() as source_connection, \
+                shard_engine(target).begin() as target_connection:
+            # Leftovers of an earlier attempt that failed half way.
+            _delete_tenant(target_connection, user_id)
+            copied = _copy_tenant(source_connection, target_connection, user_id)
+            # Ids changed: tell the user's sync clients to start over
+            changes.reset(target_connection, user_id, above=changes.last_seq(source_connection, user_id))
+    except Exception:
+        db.session.rollback()
+        entry = db.session.get(ShardMap, user_id)
+        entry.moving_to = None
+        db.session.commit()
+        raise
+
+    entry = db.session.get(ShardMap, user_id)
+    entry.shard, entry.moved_from, entry.moving_to = target, source, None
+    db.session.commit()
+    _index_in_shard(user_id, target)
+    _finish(user_id)
+    return copied
+
+
+def create_all():
+    """Create the tables in every shard (for tests and development; use
+    ``flask shards upgrade`` otherwise)."""
+    for name in shard_names():
+        db.metadata.create_all(shard_engine(name))
+
+
+def init_app(app):
+    @app.before_request
+    def refuse_writes_while_moving():
+        if request.method in SAFE_METHODS or not enabled():
+            return
+        # Loading the user activates its shard.
+        if current_user.is_authenticated and g.get('shard_moving'):
+            raise ServiceUnavailable('Your data is being moved to another server. '
+                                     'Please try again in a minute.', retry_after=60)
@@ -0,0 +1,138 @@
+"""
+Organisation-wide statistics for the admin overview.
+
+Counting every user's objectives and key results takes a scan of both
+tables, which is too slow to run on each page view (seconds with a million
+objectives). ``refresh`` runs it once and stores each user's totals in
+``user_statistics``; ``flask stats refresh`` does so for every shard and
+is meant to be scheduled. The overview page only reads that table: the
+summary is one aggregate over it, and the user table and the top and
+bottom performers are each one ``ORDER BY ... LIMIT`` query. Users who
+registered after the last refresh show up with zeros.
+
+``benchmarks/stats.py`` measures both sides.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func, case, literal, select
+from app.models import db, User, Objective, KeyResult, KeyResultUpdate, UserStatistics
+
+USER_SORTS = ('username', 'objectives', 'completed', 'progress')
+STALE_DAYS = 14
+
+_statistics = UserStatistics.__table__
+_COUNTERS = ('objectives', 'completed', 'key_results', 'stale_key_results', 'progress')
+
+
+def _objective_rows():
+    """Subquery of ``(user_id, is_complete, progress, key_results)`` per
+    live objective: the average progress and the number of its key results."""
+    return select(
+        Objective.user_id,
+        Objective.is_complete,
+        func.coalesce(func.avg(KeyResult.progress), 0).label('progress'),
+        func.count(KeyResult.id).label('key_results'),
+    ).outerjoin(KeyResult, KeyResult.objective_id == Objective.id)\
+        .where(Objective.deleted_at.is_(None))\
+        .group_by(Objective.id).subquery()
+
+
+def _stale_rows(days):
+    """Subquery of ``(user_id, stale_key_results)``: key results without an
+    update in the last ``days`` days."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    recent = select(KeyResultUpdate.id).where(KeyResultUpdate.key_result_id == KeyResult.id,
+                                              KeyResultUpdate.timestamp >= cutoff)
+    return select(Objective.user_id, func.count(KeyResult.id).label('stale_key_results'))\
+        .join(KeyResult, KeyResult.objective_id == Objective.id)\
+        .where(Objective.deleted_at.is_(None), ~recent.exists())\
+        .group_by(Objective.user_id).subquery()
+
+
+def refresh(connection, stale_days=STALE_DAYS):
+    """Recompute ``user_statistics`` for every user, from one pass over the
+    live objectives and their key results. Returns the number of users."""
+    objectives = _objective_rows()
+    per_user = select(
+        objectives.c.user_id,
+        func.count().label('objectives'),
+        func.sum(case((objectives.c.is_complete, 1), else_=0)).label('completed'),
+        func.sum(objectives.c.key_results).label('key_results'),
+        func.avg(objectives.c.progress).label('progress'),
+    ).group_by(objectives.c.user_id).subquery()
+    stale = _stale_rows(stale_days)
+    counters = [per_user.c.objectives, per_user.c.completed, per_user.c.key_results,
+                stale.c.stale_key_results, per_user.c.progress]
+    connection.execute(_statistics.delete())
+    return connection.execute(_statistics.insert().from_select(
+        ['user_id', *_COUNTERS, 'refreshed_at'],
+        select(User.id, *(func.coalesce(column, 0) for column in counters),
+               literal(datetime.utcnow(), _statistics.c.refreshed_at.type))
+        .outerjoin(per_user, per_user.c.user_id == User.id)
+        .outerjoin(stale, stale.c.user_id == User.id)
+    )).rowcount
+
+
+def delete_user(connection, user_id):
+    connection.execute(_statistics.delete().where(_statistics.c.user_id == user_id))
+
+
+def _counter(name):
+    return func.coalesce(_statistics.c[name], 0).label(name)
+
+
+def _users():
+    return select(User.id, User.username, User.email, User.is_admin, *(_counter(name) for name in _COUNTERS))\
+        .outerjoin(_statistics, _statistics.c.user_id == User.id)
+
+
+def overview():
+    """Totals over all users, as of the last refresh (``refreshed_at``,
+    None if there was none)."""
+    row = db.session.execute(
+        select(func.count(User.id).label('users'),
+               func.coalesce(func.sum(_statistics.c.objectives), 0).label('objectives'),
+               func.coalesce(func.sum(_statistics.c.completed), 0).label('completed'),
+               func.coalesce(func.sum(_statistics.c.key_results), 0).label('key_results'),
+               func.coalesce(func.sum(_statistics.c.stale_key_results), 0).label('stale_key_results'),
+               func.coalesce(func.sum(_statistics.c.progress * _statistics.c.objectives), 0).label('weighted'),
+               func.max(_statistics.c.refreshed_at).label('refreshed_at'))
+        .outerjoin(_statistics, _statistics.c.user_id == User.id)
+    ).one()
+    return {
+        'users': row.users,
+        'objectives': row.objectives,
+        'completed': row.completed,
+        'completion_rate': (row.completed / row.objectives * 100) if row.objectives else 0,
+        'progress': (row.weighted / row.objectives) if row.objectives else 0,
+        'key_results': row.key_results,
+        'stale_key_results': row.stale_key_results,
+        'stale_days': STALE_DAYS,
+        'refreshed_at': row.refreshed_at,
+    }
+
+
+def user_performance(sort='progress', direction='desc', page=1, per_page=25):
+    """One page of users with their statistics, sorted by any of
+    ``USER_SORTS``. Ties are broken by user id.
+
+    Returns the rows plus whether another page follows.
+    """
+    if sort not in USER_SORTS:
+        sort = 'progress'
+    column = User.username if sort == 'username' else _statistics.c[sort]
+    if sort != 'username':
+        column = func.coalesce(column, 0)
+    rows = db.session.execute(
+        _users().order_by(column.asc() if direction == 'asc' else column.desc(), User.id)
+        .limit(per_page + 1).offset((page - 1) * per_page)
+    ).all()
+    return rows[:per_page], len(rows) > per_page
+
+
+def performers(limit=5, lowest=False):
+    """Users with at least one objective, ranked by average progress."""
+    progress = _statistics.c.progress
+    return db.session.execute(
+        _users().where(_statistics.c.objectives > 0)
+        .order_by(progress.asc() if lowest else progress.desc(), User.id).limit(limit)
+    ).all()
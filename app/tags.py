@@ -0,0 +1,87 @@
+"""
+Tag helpers: resolving tag names to rows, filtering objectives by tags and
+computing tag-cloud counts with a single grouped query.
+"""
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Tag, Objective, objective_tags
+
+# INSERT ... ON CONFLICT DO NOTHING, so that two requests creating the same
+# new tag do not fail on the unique name.
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+MAX_TAG_LENGTH = 50
+
+
+def normalize(names):
+    """Lower-case, strip and de-duplicate tag names, preserving order."""
+    seen = []
+    for name in names or []:
+        name = name.strip().lower()[:MAX_TAG_LENGTH]
+        if name and name not in seen:
+            seen.append(name)
+    return seen
+
+
+def resolve(names):
+    """Return Tag rows for ``names``, creating the missing ones.
+
+    Existing tags are fetched in one query; only new names are inserted,
+    skipping any that a concurrent request has just created, and then
+    fetched with a second query.
+    """
+    names = normalize(names)
+    if not names:
+        return []
+    existing = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(names))}
+    missing = [name for name in names if name not in existing]
+    if missing:
+        _insert_missing(missing)
+        existing.update((tag.name, tag) for tag in Tag.query.filter(Tag.name.in_(missing)))
+    return [existing[name] for name in names]
+
+
+def _insert_missing(names):
+    dialect = db.session.get_bind(Tag).dialect.name
+    if dialect in _INSERTS:
+        db.session.execute(_INSERTS[dialect](Tag).on_conflict_do_nothing(index_elements=['name']),
+                           [{'name': name} for name in names])
+        return
+    for name in names:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Tag).values(name=name))
+        except IntegrityError:
+            pass
+
+
+def filter_objectives(query, names):
+    """Restrict an Objective query to objectives carrying *all* ``names``."""
+    names = normalize(names)
+    if not names:
+        return query
+    matching = select(objective_tags.c.objective_id)\
+        .join(Tag, Tag.id == objective_tags.c.tag_id)\
+        .where(Tag.name.in_(names))\
+        .group_by(objective_tags.c.objective_id)\
+        .having(func.count(objective_tags.c.tag_id) == len(names))
+    return query.filter(Objective.id.in_(matching))
+
+
+def tag_counts(user_ids, limit=50):
+    """Return ``(name, count)`` rows for the objectives owned by ``user_ids``.
+
+    ``user_ids`` may be a single user's id or the ids of a whole team.
+    """
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    count = func.count(objective_tags.c.objective_id).label('count')
+    return db.session.query(Tag.name, count)\
+        .join(objective_tags, objective_tags.c.tag_id == Tag.id)\
+        .join(Objective, Objective.id == objective_tags.c.objective_id)\
+        .filter(Objective.user_id.in_(user_ids), Objective.deleted_at.is_(None))\
+        .group_by(Tag.id, Tag.name)\
+        .order_by(count.desc(), Tag.name)\
+        .limit(limit)\
+        .all()
@@ -0,0 +1,102 @@
+"""
+Schedule status of objectives: whether progress keeps pace with time.
+
+An objective that is X% of the way from ``start_date`` to ``end_date`` is
+expected to be X% done. Its status is
+
+``on_track``
+    Progress (the average of its key results) is at least the expected
+    progress.
+``at_risk``
+    Behind, by less than ``OFF_TRACK_GAP`` percentage points.
+``off_track``
+    Behind by more.
+
+Completed objectives, objectives without key results and objectives
+without a valid date range have no status (NULL).
+
+The status is stored in ``objective.status`` so that lists can filter and
+sort by it in SQL. ``refresh`` recomputes it for given objectives with one
+set-based UPDATE, and the views that change progress, key results or
+dates call it in the same transaction. The expected progress also grows
+from one day to the next without any write, so ``flask objectives
+refresh-status`` recomputes every objective in batches and should run
+nightly.
+"""
+from datetime import datetime
+from sqlalchemy import case, extract, func, literal, select, update
+from app.models import KeyResult, Objective
+
+STATUSES = {
+    'on_track': 'On track',
+    'at_risk': 'At risk',
+    'off_track': 'Off track',
+}
+# Percentage points behind schedule from which an objective is off track
+OFF_TRACK_GAP = 25
+BATCH_SIZE = 1000
+
+_EPOCH = datetime(1970, 1, 1)
+_objectives = Objective.__table__
+
+
+def _status(progress, now):
+    start = extract('epoch', _objectives.c.start_date)
+    end = extract('epoch', _objectives.c.end_date)
+    elapsed = (literal((now - _EPOCH).total_seconds()) - start) * 100.0 / (end - start)
+    expected = case((elapsed > 100, 100.0), (elapsed < 0, 0.0), else_=elapsed)
+    return case(
+        (_objectives.c.is_complete.is_(True), None),
+        (progress.is_(None), None),
+        (_objectives.c.start_date.is_(None) | _objectives.c.end_date.is_(None), None),
+        (_objectives.c.end_date <= _objectives.c.start_date, None),
+        (progress >= expected, 'on_track'),
+        (progress >= expected - OFF_TRACK_GAP, 'at_risk'),
+        else_='off_track',
+    )
+
+
+def refresh(connection, objective_ids=None, criteria=None, now=None):
+    """Recompute the status of ``objective_ids`` (or of the objectives
+    matching ``criteria``). Only rows whose status changes are written.
+    Returns their number."""
+    if objective_ids is not None:
+        if not objective_ids:
+            return 0
+        criteria = _objectives.c.id.in_(list(objective_ids))
+    progress = (
+        select(_objectives.c.id, func.avg(KeyResult.progress).label('progress'))
+        .outerjoin(KeyResult.__table__, KeyResult.objective_id == _objectives.c.id)
+        .where(criteria)
+        .group_by(_objectives.c.id)
+        .subquery()
+    )
+    status = _status(progress.c.progress, now or datetime.utcnow())
+    return connection.execute(
+        update(_objectives)
+        .where(_objectives.c.id == progress.c.id, _objectives.c.status.is_distinct_from(status))
+        .values(status=status)
+    ).rowcount
+
+
+def refresh_all(connection, batch_size=BATCH_SIZE, now=None):
+    """Recompute the status of every objective, ``batch_size`` objectives
+    at a time. Returns the number of statuses that changed."""
+    now = now or datetime.utcnow()
+    changed = 0
+    last_id = 0
+    while True:
+        ids = connection.execute(
+            select(_objectives.c.id).where(_objectives.c.id > last_id)
+            .order_by(_objectives.c.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return changed
+        changed += refresh(connection, criteria=_objectives.c.id.between(ids[0], ids[-1]), now=now)
+        last_id = ids[-1]
+
+
+def by_severity():
+    """Order by status, furthest behind first, then by due date."""
+    return (case({'off_track': 0, 'at_risk': 1, 'on_track': 2}, value=Objective.status, else_=3),
+            Objective.end_date, Objective.id)
@@ -0,0 +1,457 @@
+"""
+Outbound webhooks.
+
+Users subscribe URLs to event types (``WebhookSubscription``):
+
+``key_result.updated``
+    A check-in on a key result, with its new value.
+``objective.completed``
+    An objective was marked complete.
+
+Events are written to an outbox table, ``webhook_delivery``, by ``emit``,
+in the transaction that makes the change. An event is either committed
+together with the change or not at all. One ``INSERT ... SELECT`` fans an
+event out to the user's matching subscriptions, so for a user without
+subscriptions an event costs that one statement.
+
+``flask webhooks deliver`` sends the outbox (``deliver``). Each round
+claims up to ``WEBHOOK_CLAIM_SIZE`` due deliveries of a shard and groups
+them by subscription. Each POST carries up to ``WEBHOOK_BATCH_SIZE``
+events::
+
+    {"events": [{"id": "...", "type": "key_result.updated",
+                 "created_at": "...", "data": {...}}]}
+
+Requests run on ``WEBHOOK_CONCURRENCY`` threads. At most
+``WEBHOOK_ENDPOINT_CONCURRENCY`` requests are in flight per endpoint
+(scheme, host and port), so a slow receiver holds no more than its share
+of the threads and no receiver is flooded. Each thread keeps its
+connection to an endpoint open between requests.
+
+Every request is signed. The header is
+``X-Webhook-Signature: t=<unix time>,v1=<signature>``, where the signature
+is the hex HMAC-SHA256 of ``"<t>.<body>"`` keyed with the subscription's
+secret.
+
+A 2xx response deletes the deliveries. Any other response, and any
+connection error, schedules a retry after ``WEBHOOK_BACKOFF_BASE *
+2 ** (attempts - 1)`` seconds. The wait is capped at
+``WEBHOOK_BACKOFF_MAX``, jittered, and extended to the receiver's
+Retry-After if that is longer. After ``WEBHOOK_MAX_ATTEMPTS`` the delivery
+is given up and kept, with ``next_attempt_at`` NULL, until the user
+retries it from the webhooks page.
+
+Receivers must be on the internet. A URL is refused when it is saved if
+its host resolves to a loopback, private, link-local or otherwise
+non-public address, and again when a connection is opened. The
+connection goes to the address that was checked, so a DNS answer that
+changes in between cannot point a webhook at the servers next to ours.
+``WEBHOOK_ALLOW_PRIVATE`` turns the check off, for receivers on a local
+network.
+
+Delivery is at least once. If a worker dies between sending and recording
+the result, another sends the events again once the claim lapses after
+``WEBHOOK_CLAIM_SECONDS``. A user moved to another shard can also get an
+event twice. Receivers should drop events whose id they have already
+seen.
+"""
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import random
+import secrets
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
+from flask import current_app
+from sqlalchemy import DateTime, Integer, String, bindparam, func, literal, select
+from app.models import db, WebhookDelivery, WebhookSubscription
+
+EVENTS = {
+    'key_result.updated': 'Key result check-ins',
+    'objective.completed': 'Objectives completed',
+}
+USER_AGENT = 'OKR-Tracker-Webhooks/1.0'
+
+_subscriptions = WebhookSubscription.__table__
+_deliveries = WebhookDelivery.__table__
+
+_emit = _deliveries.insert().from_select(
+    ['subscription_id', 'event_id', 'event', 'payload', 'created_at', 'next_attempt_at'],
+    select(_subscriptions.c.id, bindparam('event_id', type_=String), bindparam('event', type_=String),
+           bindparam('payload', type_=String), bindparam('now', type_=DateTime),
+           bindparam('now', type_=DateTime))
+    .where(_subscriptions.c.user_id == bindparam('user_id', type_=Integer),
+           _subscriptions.c.active.is_(True),
+           (literal(',') + _subscriptions.c.events + literal(','))
+           .contains(bindparam('pattern', type_=String), escape='\\'))
+)
+
+_failed = (
+    _deliveries.update()
+    .where(_deliveries.c.id == bindparam('delivery_id'))
+    .values(attempts=bindparam('attempts'), next_attempt_at=bindparam('retry_at'),
+            last_error=bindparam('error'))
+)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{value!r} is not JSON serializable')
+
+
+def emit(connection, events):
+    """Queue ``events``, a list of ``(user id, event type, data)``, for
+    every subscription of the user to that type. Call it on the connection
+    of the transaction making the change."""
+    if not events:
+        return
+    now = datetime.utcnow()
+    connection.execute(_emit, [{
+        'user_id': user_id,
+        'event': event,
+        # LIKE pattern matching the type in the comma separated list
+        'pattern': ',%s,' % event.replace('_', '\\_'),
+        'event_id': uuid.uuid4().hex,
+        'payload': json.dumps(data, default=_json_default),
+        'now': now,
+    } for user_id, event, data in events])
+
+
+def key_result_updated(user_id, key_result, value, comment, timestamp):
+    """The event for a check-in. ``key_result`` is a ``KeyResult`` or a
+    row with the same columns."""
+    return (user_id, 'key_result.updated', {
+        'key_result': {'id': key_result.id, 'objective_id': key_result.objective_id,
+                       'title': key_result.title, 'target_value': key_result.target_value,
+                       'unit': key_result.unit},
+        'value': value,
+        'comment': comment,
+        'timestamp': timestamp,
+    })
+
+
+def objective_completed(objective):
+    return (objective.user_id, 'objective.completed', {
+        'objective': {'id': objective.id, 'title': objective.title,
+                      'end_date': objective.end_date, 'progress': round(objective.progress(), 1)},
+        'completed_at': datetime.utcnow(),
+    })
+
+
+def new_secret():
+    return secrets.token_hex(32)
+
+
+def sign(secret, timestamp, body):
+    message = b'%d.%s' % (timestamp, body)
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def delivery_counts(subscription_ids):
+    """``{subscription id: (pending, given up)}`` with one query."""
+    if not subscription_ids:
+        return {}
+    rows = db.session.execute(
+        select(_deliveries.c.subscription_id,
+               func.count(_deliveries.c.next_attempt_at),
+               func.count() - func.count(_deliveries.c.next_attempt_at))
+        .where(_deliveries.c.subscription_id.in_(subscription_ids))
+        .group_by(_deliveries.c.subscription_id)
+    ).all()
+    return {subscription_id: (pending, failed) for subscription_id, pending, failed in rows}
+
+
+def retry_failed(connection, subscription_id):
+    """Make the given-up deliveries of a subscription due again."""
+    return connection.execute(
+        _deliveries.update()
+        .where(_deliveries.c.subscription_id == subscription_id,
+               _deliveries.c.next_attempt_at.is_(None))
+        .values(attempts=0, next_attempt_at=datetime.utcnow())
+    ).rowcount
+
+
+def copy_user(source, target, user_id):
+    """Copy a user's subscriptions and their deliveries to another shard.
+    Returns the number of rows copied."""
+    copied = 0
+    subscriptions = source.execute(
+        select(_subscriptions).where(_subscriptions.c.user_id == user_id)
+        .order_by(_subscriptions.c.id)).mappings().all()
+    columns = [column for column in _deliveries.c if column.name != 'id']
+    for subscription in subscriptions:
+        row = dict(subscription)
+        old_id = row.pop('id')
+        new_id = target.execute(_subscriptions.insert().values(**row)).inserted_primary_key[0]
+        deliveries = [dict(delivery, subscription_id=new_id) for delivery in source.execute(
+            select(*columns).where(_deliveries.c.subscription_id == old_id)
+            .order_by(_deliveries.c.id)).mappings()]
+        if deliveries:
+            target.execute(_deliveries.insert(), deliveries)
+        copied += 1 + len(deliveries)
+    return copied
+
+
+def delete_user(connection, user_id):
+    subscription_ids = select(_subscriptions.c.id).where(_subscriptions.c.user_id == user_id)
+    connection.execute(_deliveries.delete().where(_deliveries.c.subscription_id.in_(subscription_ids)))
+    connection.execute(_subscriptions.delete().where(_subscriptions.c.user_id == user_id))
+
+
+class UnsafeAddress(Exception):
+    pass
+
+
+def public_address(host, port):
+    """The address to connect to for ``host``. Raises ``UnsafeAddress`` if
+    any of its addresses is not a public one, and ``OSError`` if it does
+    not resolve."""
+    addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise UnsafeAddress(f'{host} resolves to {ip}, which is not a public address')
+    return addresses[0]
+
+
+def check_url(url):
+    """Raise ``UnsafeAddress`` or ``OSError`` unless ``url`` points at a
+    public address."""
+    parts = urlsplit(url)
+    if not parts.hostname:
+        raise ValueError(f'{url!r} has no host')
+    public_address(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+
+
+def _connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    # Stands in for socket.create_connection in http.client. TLS still
+    # checks the certificate against the host name.
+    host, port = address
+    return socket.create_connection((public_address(host, port), port), timeout, source_address)
+
+
+class Client:
+    """A small concurrent HTTP/1.1 client. Requests run on ``concurrency``
+    threads, each keeping one connection per endpoint open between
+    requests, with at most ``per_endpoint`` in flight per endpoint. Unless
+    ``allow_private`` is set, connections to non-public addresses fail with
+    ``UnsafeAddress``."""
+
+    def __init__(self, concurrency=8, per_endpoint=2, timeout=10, allow_private=False):
+        self.per_endpoint = per_endpoint
+        self.timeout = timeout
+        self.allow_private = allow_private
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='webhook')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _connection(self, endpoint):
+        connections = self._local.__dict__.setdefault('connections', {})
+        if endpoint not in connections:
+            scheme, netloc = endpoint
+            factory = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connections[endpoint] = factory(netloc, timeout=self.timeout)
+            if not self.allow_private:
+                connections[endpoint]._create_connection = _connect_public
+            with self._lock:
+                self._all.append(connections[endpoint])
+        return connections[endpoint]
+
+    def _drop(self, endpoint):
+        connection = self._local.connections.pop(endpoint)
+        connection.close()
+        with self._lock:
+            self._all.remove(connection)
+
+    def post(self, url, body, headers):
+        """POST ``body`` and return ``(status, headers)``."""
+        parts = urlsplit(url)
+        endpoint = (parts.scheme, parts.netloc)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        reused = endpoint in self._local.__dict__.get('connections', {})
+        connection = self._connection(endpoint)
+        try:
+            connection.request('POST', path, body, headers)
+            response = connection.getresponse()
+            response.read()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            self._drop(endpoint)
+            if not reused:
+                raise
+            # The receiver closed the idle connection before reading the
+            # request; send it once more on a new one.
+            return self.post(url, body, headers)
+        except Exception:
+            self._drop(endpoint)
+            raise
+        if response.will_close:
+            self._drop(endpoint)
+        return response.status, response.headers
+
+    def send_all(self, requests):
+        """Send ``requests``. Returns ``(request, result of _send)`` pairs."""
+        queues = {}
+        for request in requests:
+            queues.setdefault(request.endpoint, deque()).append(request)
+        running = {}
+
+        def start(endpoint):
+            request = queues[endpoint].popleft()
+            running[self._executor.submit(_send, self, request)] = request
+
+        for endpoint, queue in queues.items():
+            for _ in range(min(self.per_endpoint, len(queue))):
+                start(endpoint)
+        results = []
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                request = running.pop(future)
+                results.append((request, future.result()))
+                if queues[request.endpoint]:
+                    start(request.endpoint)
+        return results
+
+    def close(self):
+        self._executor.shutdown()
+        with self._lock:
+            connections, self._all = self._all, []
+        for connection in connections:
+            connection.close()
+
+
+class _Request:
+    def __init__(self, subscription, deliveries):
+        self.subscription = subscription
+        self.deliveries = deliveries
+        parts = urlsplit(subscription.url)
+        self.endpoint = (parts.scheme, parts.netloc)
+
+    def body(self):
+        # The payloads are already JSON; splice them in rather than parse
+        # and encode them again.
+        return ('{"events": [%s]}' % ', '.join(
+            '{"id": %s, "type": %s, "created_at": %s, "data": %s}' % (
+                json.dumps(delivery.event_id), json.dumps(delivery.event),
+                json.dumps(delivery.created_at.isoformat()), delivery.payload)
+            for delivery in self.deliveries)).encode()
+
+
+def _send(client, request):
+    """Send one request; returns ``None`` on success, otherwise ``(error,
+    Retry-After seconds or None)``."""
+    body = request.body()
+    timestamp = int(time.time())
+    headers = {
+        'Content-Type': 'application/json',
+        'User-Agent': USER_AGENT,
+        'X-Webhook-Signature': 't=%d,v1=%s' % (timestamp, sign(request.subscription.secret, timestamp, body)),
+    }
+    try:
+        status, response_headers = client.post(request.subscription.url, body, headers)
+    except Exception as exc:
+        return f'{exc.__class__.__name__}: {exc}'[:200], None
+    if 200 <= status < 300:
+        return None
+    retry_after = response_headers.get('Retry-After')
+    return f'HTTP {status}', int(retry_after) if retry_after and retry_after.isdigit() else None
+
+
+def backoff(attempts, base, maximum):
+    """Seconds to wait before attempt ``attempts + 1``."""
+    delay = min(base * 2 ** (attempts - 1), maximum)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _claim(engine, now, limit, lease):
+    """Take up to ``limit`` due deliveries, moving their next attempt past
+    the lease so that other workers leave them alone."""
+    due = (select(_deliveries.c.id).where(_deliveries.c.next_attempt_at <= now)
+           .order_by(_deliveries.c.next_attempt_at, _deliveries.c.id).limit(limit))
+    with engine.begin() as connection:
+        # Re-checking next_attempt_at makes a row that another worker
+        # claimed in the meantime drop out.
+        deliveries = connection.execute(
+            _deliveries.update()
+            .where(_deliveries.c.id.in_(due), _deliveries.c.next_attempt_at <= now)
+            .values(next_attempt_at=now + lease)
+            .returning(_deliveries.c.id, _deliveries.c.subscription_id, _deliveries.c.event_id,
+                       _deliveries.c.event, _deliveries.c.payload, _deliveries.c.created_at,
+                       _deliveries.c.attempts)
+        ).all()
+        if not deliveries:
+            return [], {}
+        subscriptions = {row.id: row for row in connection.execute(
+            select(_subscriptions.c.id, _subscriptions.c.url, _subscriptions.c.secret)
+            .where(_subscriptions.c.id.in_({delivery.subscription_id for delivery in deliveries}))
+        )}
+    return deliveries, subscriptions
+
+
+def _record(engine, results, now, config):
+    sent, failed = [], []
+    for request, result in results:
+        if result is None:
+            sent.extend(delivery.id for delivery in request.deliveries)
+            continue
+        error, retry_after = result
+        for delivery in request.deliveries:
+            attempts = delivery.attempts + 1
+            retry_at = None
+            if attempts < config['WEBHOOK_MAX_ATTEMPTS']:
+                delay = backoff(attempts, config['WEBHOOK_BACKOFF_BASE'], config['WEBHOOK_BACKOFF_MAX'])
+                retry_at = now + timedelta(seconds=max(delay, retry_after or 0))
+            failed.append({'delivery_id': delivery.id, 'attempts': attempts,
+                           'retry_at': retry_at, 'error': error})
+    with engine.begin() as connection:
+        if sent:
+            connection.execute(_deliveries.delete().where(_deliveries.c.id.in_(sent)))
+        if failed:
+            connection.execute(_failed, failed)
+    return len(sent), len(failed)
+
+
+def make_client():
+    """A ``Client`` configured from the app's WEBHOOK_* settings."""
+    config = current_app.config
+    return Client(concurrency=config['WEBHOOK_CONCURRENCY'],
+                  per_endpoint=config['WEBHOOK_ENDPOINT_CONCURRENCY'],
+                  timeout=config['WEBHOOK_TIMEOUT'],
+                  allow_private=config['WEBHOOK_ALLOW_PRIVATE'])
+
+
+def deliver(engine, client):
+    """Send the due deliveries of one shard through ``client``, round after
+    round until none are left. Returns ``(events sent, events failed)``."""
+    config = current_app.config
+    lease = timedelta(seconds=config['WEBHOOK_CLAIM_SECONDS'])
+    batch_size = config['WEBHOOK_BATCH_SIZE']
+    sent = failed = 0
+    while True:
+        deliveries, subscriptions = _claim(engine, datetime.utcnow(), config['WEBHOOK_CLAIM_SIZE'], lease)
+        if not deliveries:
+            return sent, failed
+        grouped = {}
+        for delivery in deliveries:
+            grouped.setdefault(delivery.subscription_id, []).append(delivery)
+        requests = []
+        for subscription_id, group in grouped.items():
+            group.sort(key=lambda delivery: delivery.id)
+            requests.extend(_Request(subscriptions[subscription_id], group[start:start + batch_size])
+                            for start in range(0, len(group), batch_size))
+        results = client.send_all(requests)
+        round_sent, round_failed = _record(engine, results, datetime.utcnow(), config)
+        sent += round_sent
+        failed += round_failed
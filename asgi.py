@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ASGI entry point: the async JSON API (app/api.py) under ``/api/``, and the
+Flask app, through asgiref's WSGI adapter, for everything else.
+
+Needs the optional async dependencies (``pip install "sqlalchemy[asyncio]"
+aiosqlite asgiref uvicorn``, asyncpg instead of aiosqlite for PostgreSQL):
+
+    uvicorn asgi:app --port 5001
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+"""
+
+from asgiref.wsgi import WsgiToAsgi
+from app.api import AsyncAPI, mount
+from run import app as flask_app
+
+app = mount(AsyncAPI(flask_app), WsgiToAsgi(flask_app))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Sync dashboard vs. async API benchmark.
+
+Seeds a scratch SQLite database with one user owning ``--objectives``
+objectives (5 key results and 10 check-ins each), then times:
+
+* ``sync``   - ``GET /dashboard`` through the Flask test client
+* ``async``  - ``GET /api/dashboard`` on ``app.api.AsyncAPI``, called
+               in-process with ``--concurrency`` requests in flight
+
+The sync view renders HTML and the API returns JSON, so the numbers compare
+the whole request, not just the queries. Needs the optional async
+dependencies (greenlet and aiosqlite):
+
+    python benchmarks/api.py --objectives 100 --requests 200 --concurrency 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_app(tmp, objectives):
+    from app import create_app
+    from app.config import Config
+    from app.models import db, KeyResult, KeyResultUpdate, Objective, User
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'api.db')
+        SQLALCHEMY_BINDS = {}
+        REQUEST_LOG_ENABLED = False
+        RATELIMIT_ENABLED = False
+        COMPRESS_ENABLED = False
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.flush()
+        now = datetime.utcnow()
+        for number in range(objectives):
+            objective = Objective(title=f'Objective {number}', user_id=user.id,
+                                  end_date=now + timedelta(days=number - objectives // 2))
+            db.session.add(objective)
+            db.session.flush()
+            for kr_number in range(5):
+                key_result = KeyResult(title=f'Key result {kr_number}', target_value=100,
+                                       current_value=kr_number * 20, objective_id=objective.id)
+                db.session.add(key_result)
+                db.session.flush()
+                db.session.add_all(KeyResultUpdate(value=value, key_result_id=key_result.id,
+                                                   timestamp=now - timedelta(hours=value))
+                                   for value in range(10))
+        db.session.commit()
+        user_id = user.id
+    return app, user_id
+
+
+def logged_in_client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+    return client
+
+
+def time_sync(client, requests):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get('/dashboard')
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return samples
+
+
+def time_async(api, cookie, requests, concurrency):
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/dashboard', 'query_string': b'',
+             'headers': [(b'cookie', f'session={cookie}'.encode())]}
+
+    async def receive():
+        return {'type': 'http.request'}
+
+    async def one(samples):
+        statuses = []
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+        start = time.perf_counter()
+        await api(scope, receive, send)
+        samples.append(time.perf_counter() - start)
+        assert statuses == [200], statuses
+
+    async def run():
+        samples = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited():
+            async with semaphore:
+                await one(samples)
+        await one([])  # open the connection pool outside the measurement
+        start = time.perf_counter()
+        await asyncio.gather(*(limited() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+        await api.dispose()
+        return samples, elapsed
+    return asyncio.run(run())
+
+
+def report(label, samples, elapsed):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    print(f'{label:<8}{statistics.median(samples) * 1000:>9.1f}ms{p95 * 1000:>9.1f}ms'
+          f'{len(samples) / elapsed:>10.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--objectives', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=10)
+    args = parser.parse_args()
+    try:
+        import aiosqlite, greenlet  # noqa: F401
+    except ImportError as exc:
+        sys.exit(f'{exc.name} is not installed; see the docstring of app/api.py')
+    from app.api import AsyncAPI
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app, user_id = make_app(tmp, args.objectives)
+        client = logged_in_client(app, user_id)
+        client.get('/dashboard')
+        start = time.perf_counter()
+        sync_samples = time_sync(client, args.requests)
+        sync_elapsed = time.perf_counter() - start
+        async_samples, async_elapsed = time_async(
+            AsyncAPI(app), client.get_cookie('session').value, args.requests, args.concurrency)
+    print(f"{'':<8}{'p50':>11}{'p95':>11}{'req/s':>10}")
+    report('sync', sync_samples, sync_elapsed)
+    report('async', async_samples, async_elapsed)
+
+
+if __name__ == '__main__':
+    main()
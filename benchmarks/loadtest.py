@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+"""
+End-to-end load test.
+
+Starts gunicorn on a fresh database (or targets ``--url``), registers one
+account per virtual user, gives each an objective with a key result, and
+then has every virtual user repeat a session until ``--duration`` runs out:
+
+    login -> dashboard -> view objective -> check-in -> logout
+
+Each step waits ``--think`` seconds on average (uniformly 0..2x) before the
+next one. CSRF tokens are read from the forms like a browser would submit
+them. Redirects are not followed: every request is timed on its own.
+
+The report gives, per endpoint, the number of requests, errors, throughput
+and p50/p95/p99 latency:
+
+    python benchmarks/loadtest.py --users 50 --workers 4 --duration 60 --think 0.5
+
+Against a server that is already running (its rate limits must allow one
+login per session, see RATELIMIT_* in the README):
+
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --users 20
+"""
+import argparse
+import http.cookiejar
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    """A browser-like session: cookies, CSRF tokens, no redirects."""
+
+    def __init__(self, base_url, stats):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, label, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        start = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, data=body, timeout=30) as response:
+                status, content, headers = response.status, response.read(), response.headers
+        except urllib.error.HTTPError as exc:
+            status, content, headers = exc.code, exc.read(), exc.headers
+        except OSError:
+            status, content, headers = None, b'', {}
+        elapsed = time.perf_counter() - start
+        self.stats.record(label, elapsed, status is not None and status < 400)
+        return status, content.decode('utf-8', 'replace'), headers.get('Location', '')
+
+    def form(self, label, path):
+        """GET a form page and return its CSRF token."""
+        _, content, _ = self.request(label, path)
+        match = CSRF_RE.search(content)
+        return match.group(1) if match else ''
+
+    def submit(self, label, path, data, form_path=None, form_label=None):
+        token = self.form(form_label or 'GET ' + (form_path or path), form_path or path)
+        return self.request(label, path, dict(data, csrf_token=token))
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, label, seconds, ok):
+        with self._lock:
+            self.samples[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def think(mean):
+    if mean:
+        time.sleep(random.uniform(0, 2 * mean))
+
+
+def setup_user(base_url, name):
+    """Register ``name`` and create their objective and key result.
+    Returns ``(objective_id, key_result_id)``."""
+    client = Client(base_url, Stats())
+    credentials = {'username': name, 'password': 'loadtest'}
+    client.submit('register', '/register', {
+        'email': f'{name}@example.com', 'password2': 'loadtest', **credentials})
+    status, _, location = client.submit('login', '/login', credentials)
+    if status != 302 or location.endswith('/login'):
+        raise RuntimeError(f'could not log in as {name} (HTTP {status})')
+    _, _, location = client.submit('objective', '/objectives/new', {
+        'title': f'Load test objective for {name}', 'description': 'Seeded by loadtest.py',
+        'start_date': '2026-01-01', 'end_date': '2026-12-31'})
+    objective_id = int(location.rstrip('/').rsplit('/', 1)[-1])
+    client.submit('key result', f'/objectives/{objective_id}/keyresults/new', {
+        'title': 'Check-ins', 'description': '', 'target_value': 1000,
+        'current_value': 1, 'unit': 'count'})
+    _, page, _ = client.request('objective', f'/objectives/{objective_id}')
+    key_result_id = int(re.findall(r'/keyresults/(\d+)/update', page)[0])
+    client.request('logout', '/logout')
+    return objective_id, key_result_id
+
+
+def session(client, name, objective_id, key_result_id, think_time):
+    client.submit('POST /login', '/login', {'username': name, 'password': 'loadtest'})
+    think(think_time)
+    client.request('GET /dashboard', '/dashboard')
+    think(think_time)
+    client.request('GET /objectives/<id>', f'/objectives/{objective_id}')
+    think(think_time)
+    client.submit('POST /keyresults/<id>/update', f'/keyresults/{key_result_id}/update',
+                  {'value': random.randint(1, 1000), 'comment': 'load test'},
+                  form_label='GET /keyresults/<id>/update')
+    think(think_time)
+    client.request('GET /logout', '/logout')
+    think(think_time)
+
+
+def virtual_user(base_url, stats, name, ids, think_time, deadline, sessions):
+    client = Client(base_url, stats)
+    while time.monotonic() < deadline:
+        session(client, name, *ids, think_time)
+        sessions.append(1)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(tmp, workers):
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(tmp, 'loadtest.db'),
+               RATELIMIT_ENABLED='false')
+    env.pop('SHARD_DATABASE_URLS', None)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'run', 'db', 'upgrade'],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+         '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--access-logfile', os.devnull, 'run:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup (is it installed?)')
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=1).read()
+            return server, base_url
+        except OSError:
+            time.sleep(0.05)
+
+
+def run(base_url, users, duration, think_time):
+    prefix = f'lt{os.getpid()}x{random.randrange(10 ** 6)}u'
+    names = [f'{prefix}{number}' for number in range(users)]
+    ids = {name: setup_user(base_url, name) for name in names}
+    stats = Stats()
+    sessions = []
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=virtual_user, daemon=True,
+                                args=(base_url, stats, name, ids[name], think_time, deadline, sessions))
+               for name in names]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, len(sessions), time.perf_counter() - start
+
+
+def report(stats, sessions, elapsed):
+    print(f"{'endpoint':<34}{'requests':>9}{'errors':>8}{'req/s':>9}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}")
+    total = errors = 0
+    for label, samples in stats.samples.items():
+        total += len(samples)
+        errors += stats.errors[label]
+        print(f'{label:<34}{len(samples):>9}{stats.errors[label]:>8}{len(samples) / elapsed:>9.1f}'
+              + ''.join(f'{percentile(samples, p) * 1000:>7.1f}ms' for p in (0.5, 0.95, 0.99)))
+    everything = [sample for samples in stats.samples.values() for sample in samples]
+    if everything:
+        print(f'{"all":<34}{total:>9}{errors:>8}{total / elapsed:>9.1f}'
+              + ''.join(f'{percentile(everything, p) * 1000:>7.1f}ms' for p in (0.5, 0.95, 0.99)))
+    print(f'{sessions} sessions in {elapsed:.1f}s ({sessions / elapsed:.1f}/s)')
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='target this server instead of starting gunicorn')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers to start')
+    parser.add_argument('--users', type=int, default=10, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--think', type=float, default=0.5,
+                        help='mean seconds between steps of a session')
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        base_url = args.url
+        if base_url is None:
+            server, base_url = start_server(tmp, args.workers)
+        try:
+            stats, sessions, elapsed = run(base_url, args.users, args.duration, args.think)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+    errors = report(stats, sessions, elapsed)
+    requests = sum(len(samples) for samples in stats.samples.values())
+    return 1 if requests and errors / requests > args.max_error_rate else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Startup benchmark.
+
+Measures, in fresh interpreter processes:
+
+* ``import``       - importing the ``app`` package
+* ``create_app``   - building the application with ``create_app()``
+* ``first_request``- serving the first request through the test client
+                     (template compilation included)
+
+and, with ``--gunicorn``, the wall-clock time from spawning a gunicorn
+server until it answers its first HTTP request.
+
+Pass ``--max-*`` thresholds (seconds, median) to turn it into a regression
+check that exits non-zero when startup gets slower:
+
+    python benchmarks/startup.py --runs 10 --max-import 0.6 --max-first-request 1.0
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+response = application.test_client().get('/')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_request': served - created,
+}))
+'''
+
+
+def _env(database_url):
+    env = dict(os.environ)
+    env['DATABASE_URL'] = database_url
+    env['PYTHONDONTWRITEBYTECODE'] = '0'
+    return env
+
+
+def measure_process(runs, database_url):
+    samples = {'import': [], 'create_app': [], 'first_request': []}
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=_env(database_url),
+                                check=True, capture_output=True, text=True).stdout
+        for key, value in json.loads(output.strip().splitlines()[-1]).items():
+            samples[key].append(value)
+    return samples
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_gunicorn(runs, database_url, workers):
+    samples = []
+    for _ in range(runs):
+        port = _free_port()
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+             '--bind', f'127.0.0.1:{port}', '--workers', str(workers), 'run:app'],
+            cwd=ROOT, env=_env(database_url),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError('gunicorn exited during startup')
+                try:
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1).read()
+                    break
+                except OSError:
+                    time.sleep(0.01)
+            samples.append(time.perf_counter() - start)
+        finally:
+            server.terminate()
+            server.wait()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gunicorn', action='store_true',
+                        help='also measure gunicorn time-to-first-request')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-import', type=float)
+    parser.add_argument('--max-create-app', type=float)
+    parser.add_argument('--max-first-request', type=float)
+    parser.add_argument('--max-gunicorn', type=float)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        results = measure_process(args.runs, database_url)
+        if args.gunicorn:
+            results['gunicorn'] = measure_gunicorn(args.runs, database_url, args.workers)
+
+    limits = {
+        'import': args.max_import,
+        'create_app': args.max_create_app,
+        'first_request': args.max_first_request,
+        'gunicorn': args.max_gunicorn,
+    }
+    failed = False
+    print(f"{'phase':<15}{'median':>10}{'min':>10}{'max':>10}")
+    for phase, samples in results.items():
+        median = statistics.median(samples)
+        line = f'{phase:<15}{median * 1000:>8.1f}ms{min(samples) * 1000:>8.1f}ms{max(samples) * 1000:>8.1f}ms'
+        limit = limits.get(phase)
+        if limit is not None and median > limit:
+            line += f'  REGRESSION (limit {limit * 1000:.0f}ms)'
+            failed = True
+        print(line)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
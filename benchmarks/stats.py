@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Admin statistics benchmark.
+
+Seeds a temporary SQLite database with ``--objectives`` objectives (three
+key results and three check-ins each, spread over one user per
+``--per-user`` objectives) and reports the time taken by:
+
+* ``refresh``    - ``stats.refresh()``, recomputing every user's totals
+                   (``flask stats refresh``)
+* ``statistics`` - the summary, one page of the user table and the top
+                   and bottom performers, read from ``user_statistics``
+* ``page``       - GET /admin/ as an admin, rendering included
+
+Pass ``--max-*`` thresholds (seconds, median) to turn it into a regression
+check that exits non-zero when the overview gets slower:
+
+    python benchmarks/stats.py --objectives 1000000 --max-page 1.0
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import text  # noqa: E402
+from app import create_app, stats  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models import db  # noqa: E402
+
+SEED = [
+    '''WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :users)
+       INSERT INTO user (username, email, password_hash, is_admin)
+       SELECT 'user' || i, 'user' || i || '@example.com', '', i = 1 FROM n''',
+    '''WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :objectives)
+       INSERT INTO objective (title, description, start_date, end_date, is_complete, user_id, comment_count)
+       SELECT 'Objective ' || i, '', datetime('now', '-60 days'), datetime('now', '+' || (i % 90) || ' days'),
+              i % 7 = 0, i % :users + 1, 0 FROM n''',
+    '''INSERT INTO key_result (title, target_value, current_value, unit, objective_id, comment_count)
+       SELECT 'Key result ' || k.value, 100, (objective.id * 37 + k.value * 11) % 120, '%', objective.id, 0
+       FROM objective, json_each('[1, 2, 3]') AS k''',
+    '''INSERT INTO key_result_update (value, timestamp, key_result_id)
+       SELECT current_value, datetime('now', '-' || (id % 30) || ' days'), id FROM key_result''',
+]
+
+
+def seed(objectives, per_user):
+    users = max(objectives // per_user, 1)
+    for statement in SEED:
+        db.session.execute(text(statement), {'users': users, 'objectives': objectives})
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+
+
+def measure_refresh():
+    start = time.perf_counter()
+    with db.engine.begin() as connection:
+        stats.refresh(connection)
+    return time.perf_counter() - start
+
+
+def measure_statistics():
+    start = time.perf_counter()
+    stats.overview()
+    stats.user_performance()
+    stats.performers()
+    stats.performers(lowest=True)
+    return time.perf_counter() - start
+
+
+def measure_page(client):
+    start = time.perf_counter()
+    response = client.get('/admin/')
+    assert response.status_code == 200, response.status_code
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--objectives', type=int, default=100000)
+    parser.add_argument('--per-user', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-refresh', type=float)
+    parser.add_argument('--max-statistics', type=float)
+    parser.add_argument('--max-page', type=float)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+            SQLALCHEMY_BINDS = {}
+            REQUEST_LOG_ENABLED = False
+            COMPRESS_ENABLED = False
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            seed(args.objectives, args.per_user)
+            print(f'Seeded {args.objectives} objectives in {time.perf_counter() - start:.1f}s')
+            results = {'refresh': [measure_refresh() for _ in range(args.runs)],
+                       'statistics': [measure_statistics() for _ in range(args.runs)]}
+            db.session.remove()
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = '1'
+            session['_fresh'] = True
+        results['page'] = [measure_page(client) for _ in range(args.runs)]
+
+    limits = {'refresh': args.max_refresh, 'statistics': args.max_statistics, 'page': args.max_page}
+    failed = False
+    print(f"{'phase':<12}{'median':>10}{'min':>10}{'max':>10}")
+    for phase, samples in results.items():
+        median = statistics.median(samples)
+        line = f'{phase:<12}{median * 1000:>8.1f}ms{min(samples) * 1000:>8.1f}ms{max(samples) * 1000:>8.1f}ms'
+        limit = limits.get(phase)
+        if limit is not None and median > limit:
+            line += f'  REGRESSION (limit {limit * 1000:.0f}ms)'
+            failed = True
+        print(line)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Template compilation benchmark.
+
+Loads every template in a fresh process, as a new gunicorn worker would on
+its first requests, and reports the time taken:
+
+* ``no cache``   - TEMPLATE_CACHE_DIR unset (parse and compile everything)
+* ``cold cache`` - empty cache directory (compile, then write bytecode)
+* ``warm cache`` - cache filled by ``flask templates warm``
+
+    python benchmarks/templates.py --runs 10
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json
+from app import create_app
+from app.templating import warm_templates
+timings = warm_templates(create_app())
+print(json.dumps(sum(seconds for _, seconds in timings)))
+'''
+
+
+def load_all(cache_dir, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    env.pop('TEMPLATE_CACHE_DIR', None)
+    if cache_dir:
+        env['TEMPLATE_CACHE_DIR'] = cache_dir
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = {'no cache': [], 'cold cache': [], 'warm cache': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        cache_dir = os.path.join(tmp, 'jinja')
+        for _ in range(args.runs):
+            results['no cache'].append(load_all(None, database_url))
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            results['cold cache'].append(load_all(cache_dir, database_url))
+            results['warm cache'].append(load_all(cache_dir, database_url))
+
+    print(f"{'templates':<12}{'median':>10}{'min':>10}{'max':>10}")
+    for label, samples in results.items():
+        print(f'{label:<12}{statistics.median(samples) * 1000:>8.1f}ms'
+              f'{min(samples) * 1000:>8.1f}ms{max(samples) * 1000:>8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+# Gunicorn configuration for the OKR Tracker.
+#
+# The application is imported once in the master (preload_app) and the
+# workers are forked from it, so each worker starts serving immediately
+# instead of importing Flask, SQLAlchemy and the models on its own. Run
+# `flask db upgrade` before starting gunicorn; workers never touch the
+# schema.
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+preload_app = True
+timeout = 120
+keepalive = 5
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # Connection pools must not be shared between processes. Nothing should
+    # have connected in the master, but drop any pooled connections anyway
+    # so each worker opens its own.
+    from run import app
+    from app.models import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
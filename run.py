@@ -3,17 +3,25 @@
 
 """
 OKR Tracker - A Flask application to track Objectives and Key Results.
+
+The module is imported by gunicorn (``run:app``) and must stay free of side
+effects: the schema is managed with ``flask db upgrade`` before workers
+start, never at import time.
 """
 
 from app import create_app
-from app.models import db
 
 app = create_app()
 
-# Create all database tables
-with app.app_context():
-    db.create_all()
-    print("Database tables created!")
-
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    from flask_migrate import upgrade
+    from app.commands import init_migrate
+    from app import sharding
+    
+    # Bring the development databases up to date
+    with app.app_context():
+        init_migrate(app)
+        for name in sharding.shard_names():
+            upgrade(x_arg=[f'shard={name}'])
+    
+    app.run(debug=True, port=5001)
@@ -0,0 +1,100 @@
+import os
+from datetime import datetime, timedelta
+import pytest
+from app import create_app
+from app.config import Config
+from app.models import (db, User, Objective, KeyResult, KeyResultUpdate, Comment, Tag)
+
+# Size of the seeded dataset. Large enough that a query per objective or
+# per key result shows up as dozens of extra statements.
+OBJECTIVES = 40
+KEY_RESULTS = 5
+UPDATES = 10
+COMMENTS = 5
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('db')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'test.db')
+        SQLALCHEMY_BINDS = {}
+        WTF_CSRF_ENABLED = False
+        RATELIMIT_ENABLED = False
+        CHECKIN_BUFFER = 'off'
+        PURGE_IN_BACKGROUND = False
+        TEMPLATE_CACHE_DIR = None
+        COMPRESS_ENABLED = False
+        # The webhook receivers in the tests listen on 127.0.0.1
+        WEBHOOK_ALLOW_PRIVATE = True
+        REQUEST_LOG_FILE = os.path.join(directory, 'requests.log')
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _seed_user(name, objectives):
+    user = User(username=name, email=f'{name}@example.com')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    tags = [Tag(name=f'{name}-tag-{number}') for number in range(5)]
+    now = datetime.utcnow()
+    for number in range(objectives):
+        objective = Objective(title=f'Objective {number}', description='Seeded',
+                              start_date=now - timedelta(days=30),
+                              end_date=now + timedelta(days=number + 1),
+                              user_id=user.id, tags=tags[number % 5:number % 5 + 2])
+        db.session.add(objective)
+        db.session.flush()
+        for kr_number in range(KEY_RESULTS):
+            key_result = KeyResult(title=f'Key result {kr_number}', target_value=100,
+                                   current_value=kr_number * 10, unit='%',
+                                   objective_id=objective.id, tags=tags[kr_number:kr_number + 1])
+            db.session.add(key_result)
+            db.session.flush()
+            db.session.add_all(KeyResultUpdate(value=value, key_result_id=key_result.id,
+                                               timestamp=now - timedelta(days=UPDATES - value))
+                               for value in range(UPDATES))
+        for comment_number in range(COMMENTS):
+            db.session.add(Comment(body=f'Comment {comment_number}', user_id=user.id,
+                                   objective_id=objective.id))
+        objective.comment_count = COMMENTS
+    return user
+
+
+@pytest.fixture(scope='session')
+def seeded(app):
+    """Ids of a seeded owner, one of their objectives and key results, and
+    spare rows for the tests that delete things."""
+    with app.app_context():
+        owner = _seed_user('owner', OBJECTIVES)
+        _seed_user('other', OBJECTIVES // 4)
+        db.session.commit()
+        objectives = Objective.query.filter_by(user_id=owner.id).order_by(Objective.id).all()
+        return {
+            'user': owner.id,
+            'objective': objectives[0].id,
+            'key_result': objectives[0].key_results.first().id,
+            'spare_objective': objectives[-1].id,
+            'spare_key_result': objectives[1].key_results.order_by(KeyResult.id.desc()).first().id,
+        }
+
+
+@pytest.fixture
+def client(app, seeded):
+    """A test client logged in as the seeded owner."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(seeded['user'])
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def anonymous(app, seeded):
+    return app.test_client()
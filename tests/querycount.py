@@ -0,0 +1,28 @@
+"""Counting the SQL statements a block of code sends to the database."""
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryLog(list):
+    """The statements executed inside ``count_queries``, in order."""
+
+    def __str__(self):
+        return '\n'.join(f'{number:3}. {" ".join(statement.split())}'
+                         for number, statement in enumerate(self, 1))
+
+
+@contextmanager
+def count_queries():
+    """Record every statement executed on any engine inside the block,
+    including ones issued by Flask-Login and template rendering."""
+    log = QueryLog()
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        log.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        yield log
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
@@ -0,0 +1,55 @@
+import asyncio
+import json
+import pytest
+
+pytest.importorskip('greenlet')
+pytest.importorskip('aiosqlite')
+
+from app.api import AsyncAPI
+from app.models import Objective
+
+
+def call(api, cookie, *paths):
+    """GET ``paths`` from ``api`` concurrently; returns (status, json) pairs."""
+    async def get(path):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request'}
+
+        async def send(message):
+            messages.append(message)
+
+        path, _, query = path.partition('?')
+        headers = [(b'cookie', f'session={cookie}'.encode())] if cookie else []
+        await api({'type': 'http', 'method': 'GET', 'path': path, 'headers': headers,
+                   'query_string': query.encode()}, receive, send)
+        return messages[0]['status'], json.loads(messages[1]['body'])
+
+    async def run():
+        try:
+            return await asyncio.gather(*(get(path) for path in paths))
+        finally:
+            await api.dispose()
+    return asyncio.run(run())
+
+
+def test_dashboard_matches_the_separate_endpoints(app, client, seeded):
+    with app.app_context():
+        objectives = Objective.active().filter_by(user_id=seeded['user']).count()
+    (status, dashboard), *parts = call(AsyncAPI(app), client.get_cookie('session').value, '/api/dashboard?limit=3',
+                                       '/api/progress', '/api/upcoming', '/api/updates?limit=3')
+    assert status == 200
+    assert [part_status for part_status, _ in parts] == [200, 200, 200]
+    combined = {}
+    for _, part in parts:
+        combined.update(part)
+    assert dashboard == combined
+    assert len(dashboard['objectives']) == objectives
+    assert len(dashboard['upcoming']) == 5
+    assert len(dashboard['updates']) == 3
+
+
+def test_requires_login(app):
+    (status, body), = call(AsyncAPI(app), None, '/api/dashboard')
+    assert status == 401
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, select
+from app import archive, reports, tags
+from app.models import (db, Comment, KeyResult, KeyResultUpdate, Objective, ObjectiveSnapshot,
+                        archived_key_result_update, archived_objective, archived_objective_snapshot)
+
+
+@pytest.fixture
+def finished(app, seeded):
+    """A completed objective that ended two years ago, with a key result,
+    a check-in, a tag, a comment and a report snapshot."""
+    ended = datetime.utcnow() - timedelta(days=730)
+    with app.app_context():
+        objective = Objective(title='Finished long ago', description='', start_date=ended - timedelta(days=90),
+                              end_date=ended, is_complete=True, user_id=seeded['user'],
+                              tags=tags.resolve(['archived-tag']))
+        key_result = KeyResult(title='Shipped', target_value=10, current_value=10)
+        objective.key_results.append(key_result)
+        db.session.add(objective)
+        db.session.flush()
+        db.session.add_all([
+            KeyResultUpdate(value=10, key_result_id=key_result.id, timestamp=ended),
+            Comment(body='Well done', user_id=seeded['user'], objective_id=objective.id),
+            ObjectiveSnapshot(objective_id=objective.id, user_id=seeded['user'], day=ended.date(),
+                              progress=100, is_complete=True),
+        ])
+        db.session.commit()
+        ids = objective.id, key_result.id
+    yield ids
+    with app.app_context():
+        objective = db.session.get(Objective, ids[0])
+        if objective is not None:
+            db.session.delete(objective)
+        db.session.commit()
+
+
+def count(table, **criteria):
+    return db.session.execute(select(func.count()).select_from(table).filter_by(**criteria)).scalar()
+
+
+def test_archive_and_restore_round_trip(app, client, finished):
+    objective_id, key_result_id = finished
+    with app.app_context():
+        assert archive.archive_objectives(before=datetime.utcnow() - timedelta(days=365)) == 1
+        assert db.session.get(Objective, objective_id) is None
+        assert count(archived_objective, id=objective_id) == 1
+        assert count(archived_key_result_update, key_result_id=key_result_id) == 1
+        assert count(archived_objective_snapshot, objective_id=objective_id) == 1
+        assert ObjectiveSnapshot.query.filter_by(objective_id=objective_id).count() == 0
+
+    assert 'Finished long ago' in client.get('/archive').get_data(as_text=True)
+    assert 'Well done' not in client.get(f'/objectives/{objective_id}').get_data(as_text=True)
+    assert client.get(f'/archive/{objective_id}').status_code == 200
+
+    with app.app_context():
+        archive.restore_objective(objective_id)
+        objective = db.session.get(Objective, objective_id)
+        assert [tag.name for tag in objective.tags] == ['archived-tag']
+        assert [kr.id for kr in objective.key_results] == [key_result_id]
+        assert KeyResultUpdate.query.filter_by(key_result_id=key_result_id).count() == 1
+        assert objective.comments.count() == 1
+        assert objective.snapshots.count() == 1
+        assert count(archived_objective, id=objective_id) == 0
+    assert 'Finished long ago' not in client.get('/archive').get_data(as_text=True)
+
+
+def test_archived_snapshots_leave_the_reports(app, seeded, finished):
+    objective_id, _ = finished
+    with app.app_context():
+        day = db.session.get(Objective, objective_id).end_date.date()
+
+        def objectives_on_day():
+            return sum(row.objectives for row in reports.progress_trend(seeded['user'], day, day))
+
+        assert objectives_on_day() == 1
+        archive.archive_objectives(before=datetime.utcnow() - timedelta(days=365))
+        assert objectives_on_day() == 0
+        archive.restore_objective(objective_id)
+        assert objectives_on_day() == 1
+
+
+def test_restore_recomputes_the_status(app, finished):
+    objective_id, _ = finished
+    with app.app_context():
+        archive.archive_objectives(before=datetime.utcnow() - timedelta(days=365))
+        # Reopened while archived, with the end date moved out
+        db.session.execute(archived_objective.update().where(archived_objective.c.id == objective_id)
+                           .values(is_complete=False, end_date=datetime.utcnow() + timedelta(days=30)))
+        db.session.commit()
+        archive.restore_objective(objective_id)
+        assert db.session.get(Objective, objective_id).status == 'on_track'
+
+
+def test_restoring_an_unknown_objective_fails(app, seeded):
+    with app.app_context(), pytest.raises(archive.ArchiveError):
+        archive.restore_objective(10 ** 9)
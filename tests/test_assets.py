@@ -0,0 +1,81 @@
+import gzip
+import json
+import pytest
+from flask import url_for
+from app import assets, create_app
+from app.config import Config
+
+STYLE = b'body { color: #333; }\n' * 50
+LOGO = b'\x89PNG\r\n\x1a\n' + bytes(range(256))
+
+
+@pytest.fixture
+def static(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'style.css').write_bytes(STYLE)
+    (tmp_path / 'logo.png').write_bytes(LOGO)
+    return tmp_path
+
+
+@pytest.fixture
+def built(static):
+    class AssetsConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        SQLALCHEMY_BINDS = {}
+        REQUEST_LOG_ENABLED = False
+
+    manifest = assets.build_assets(str(static))
+    app = create_app(AssetsConfig)
+    app.static_folder = str(static)
+    assets.init_app(app)
+    return app, manifest
+
+
+def test_build_writes_fingerprinted_and_gzipped_copies(static):
+    manifest = assets.build_assets(str(static))
+    assert set(manifest) == {'css/style.css', 'logo.png'}
+    assert manifest['css/style.css'].startswith('dist/css/style.') and manifest['css/style.css'].endswith('.css')
+    assert json.loads((static / 'dist' / 'manifest.json').read_text()) == manifest
+
+    style = static / manifest['css/style.css']
+    assert style.read_bytes() == STYLE
+    assert gzip.decompress((static / (manifest['css/style.css'] + '.gz')).read_bytes()) == STYLE
+    assert not (static / (manifest['logo.png'] + '.gz')).exists()
+
+    # Rebuilding does not fingerprint the previous build
+    assert assets.build_assets(str(static)) == manifest
+
+
+def test_url_for_links_to_the_fingerprinted_file(built):
+    app, manifest = built
+    with app.test_request_context():
+        assert url_for('static', filename='css/style.css') == '/static/' + manifest['css/style.css']
+        assert url_for('static', filename='missing.css') == '/static/missing.css'
+
+
+def test_fingerprinted_files_are_served_immutable_in_either_encoding(built):
+    app, manifest = built
+    client = app.test_client()
+    url = '/static/' + manifest['css/style.css']
+
+    compressed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == STYLE
+
+    identity = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in identity.headers
+    assert identity.data == STYLE
+
+    for response in (compressed, identity):
+        assert response.content_type.startswith('text/css')
+        assert 'Accept-Encoding' in response.vary
+        assert response.cache_control.immutable and response.cache_control.public
+        assert response.cache_control.max_age == assets.ONE_YEAR
+
+    logo = client.get('/static/' + manifest['logo.png'], headers={'Accept-Encoding': 'gzip'})
+    assert logo.data == LOGO and 'Content-Encoding' not in logo.headers
+    assert 'Accept-Encoding' not in logo.vary
+
+    unhashed = client.get('/static/css/style.css')
+    assert unhashed.data == STYLE and not unhashed.cache_control.immutable
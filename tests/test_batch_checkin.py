@@ -0,0 +1,41 @@
+from querycount import count_queries
+from app.models import KeyResult, KeyResultUpdate, Objective
+
+
+def test_batch_checkin_writes_changed_rows_in_one_insert(app, client, seeded):
+    url = f"/objectives/{seeded['objective']}/keyresults/update"
+    with app.app_context():
+        key_results = KeyResult.query.filter_by(objective_id=seeded['objective']).order_by(KeyResult.id).all()
+        before = {kr.id: (kr.current_value, kr.updates.count()) for kr in key_results}
+    data = {}
+    for number, (kr_id, (value, _)) in enumerate(before.items()):
+        data[f'checkins-{number}-key_result_id'] = kr_id
+        # The first row is left as it was
+        data[f'checkins-{number}-value'] = value if number == 0 else value + 1
+        data[f'checkins-{number}-comment'] = 'weekly' if number == 1 else ''
+
+    with count_queries() as queries:
+        response = client.post(url, data=data)
+    assert response.status_code == 302
+    assert sum(query.startswith('INSERT INTO key_result_update') for query in queries) == 1
+
+    with app.app_context():
+        for number, (kr_id, (value, updates)) in enumerate(before.items()):
+            key_result = KeyResult.query.filter_by(id=kr_id).one()
+            changed = number > 0
+            assert key_result.current_value == (value + 1 if changed else value)
+            assert key_result.updates.count() == updates + changed
+        latest = (KeyResultUpdate.query.filter_by(key_result_id=list(before)[1])
+                  .order_by(KeyResultUpdate.id.desc()).first())
+        assert latest.comment == 'weekly'
+
+
+def test_batch_checkin_rejects_key_results_of_other_objectives(app, client, seeded):
+    with app.app_context():
+        another = (Objective.active().filter_by(user_id=seeded['user'])
+                   .filter(Objective.id != seeded['objective']).first())
+        url = f'/objectives/{another.id}/keyresults/update'
+    response = client.post(url,
+                           data={'checkins-0-key_result_id': seeded['key_result'],
+                                 'checkins-0-value': 1})
+    assert response.status_code == 400
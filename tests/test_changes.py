@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+from querycount import count_queries
+from app import changes
+from app.models import db, KeyResult, Objective
+
+
+def latest_seq(client):
+    seq, has_more = 0, True
+    while has_more:
+        page = client.get(f'/changes?since={seq}&limit=1000').json
+        seq, has_more = page['next'], page['has_more']
+    return seq
+
+
+def test_feed_returns_changed_entities_and_tombstones(client, seeded):
+    since = latest_seq(client)
+    response = client.post('/objectives/new', data={
+        'title': 'Synced', 'description': '', 'start_date': '2026-01-01', 'end_date': '2026-12-31'})
+    objective_id = int(response.headers['Location'].rsplit('/', 1)[-1])
+    client.post(f'/objectives/{objective_id}/edit', data={
+        'title': 'Synced again', 'description': '', 'start_date': '2026-01-01', 'end_date': '2026-12-31'})
+    client.post(f'/objectives/{objective_id}/keyresults/new', data={
+        'title': 'KR', 'description': '', 'target_value': 10, 'current_value': 0, 'unit': 'count'})
+
+    page = client.get(f'/changes?since={since}').json
+    assert [(change['type'], change['op']) for change in page['changes']] == [
+        ('objective', 'upsert'), ('key_result', 'upsert')]
+    assert page['changes'][0]['data']['title'] == 'Synced again'
+    key_result_id = page['changes'][1]['id']
+
+    client.post(f'/keyresults/{key_result_id}/update', data={'value': 5})
+    client.post(f'/objectives/{objective_id}/delete')
+    page = client.get(f"/changes?since={page['next']}").json
+    assert [(change['type'], change['op']) for change in page['changes']] == [
+        ('key_result', 'upsert'), ('key_result_update', 'upsert'), ('objective', 'delete')]
+    assert page['changes'][0]['data']['current_value'] == 5
+    assert 'data' not in page['changes'][2]
+
+
+def test_feed_is_keyset_paginated(client, seeded):
+    first = client.get('/changes?since=0&limit=3').json
+    second = client.get(f"/changes?since={first['next']}&limit=3").json
+    assert first['has_more'] and len(first['changes']) == 3
+    assert first['changes'][-1]['seq'] == first['next'] < second['changes'][0]['seq']
+
+
+def test_sync_without_changes_is_one_index_lookup(app, client, seeded):
+    since = latest_seq(client)
+    with count_queries() as queries:
+        page = client.get(f'/changes?since={since}').json
+    assert page == {'changes': [], 'next': since, 'has_more': False}
+    # Loading the logged-in user, then the change log
+    assert len(queries) == 2
+    with app.app_context():
+        plan = db.session.connection().exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + queries[1], (seeded['user'], since, 1, 0)).all()
+    assert 'ix_change_log_user_seq' in str(plan)
+
+
+class PostgresLocks:
+    """A connection that passes statements on, except the advisory locks,
+    which it records, as if it were PostgreSQL."""
+
+    dialect = SimpleNamespace(name='postgresql')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.locks = []
+
+    def execute(self, statement, parameters=None):
+        if 'pg_advisory_xact_lock' in str(statement):
+            self.locks.append((parameters['key'], parameters['user_id']))
+            return None
+        return self.connection.execute(statement, parameters)
+
+
+def test_changes_lock_their_owners_only(app, seeded):
+    with app.app_context():
+        key_results = KeyResult.query.join(Objective).filter(Objective.user_id == seeded['user']).limit(3).all()
+        connection = PostgresLocks(db.session.connection())
+        changes._lock(connection, [7, 3, 7])
+        assert connection.locks == [(changes._LOCK_KEY, 3), (changes._LOCK_KEY, 7)]
+
+        connection.locks.clear()
+        changes._lock(connection, changes._owner_ids(
+            'key_result_update', [key_result.id for key_result in key_results]))
+        assert connection.locks == [(changes._LOCK_KEY, seeded['user'])]
+        db.session.rollback()
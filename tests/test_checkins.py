@@ -0,0 +1,195 @@
+import os
+import time
+from datetime import datetime, timedelta
+import pytest
+from app import checkins
+from app.checkins import CheckinBuffer
+from app.models import db, KeyResult, KeyResultUpdate, Objective
+
+
+@pytest.fixture
+def key_results(app, seeded):
+    """Ids of two key results of an objective of their own."""
+    now = datetime.utcnow()
+    with app.app_context():
+        objective = Objective(title='Buffered', description='', start_date=now - timedelta(days=10),
+                              end_date=now + timedelta(days=10), user_id=seeded['user'])
+        for title in ('First', 'Second'):
+            objective.key_results.append(KeyResult(title=title, target_value=100, current_value=0))
+        db.session.add(objective)
+        db.session.commit()
+        objective_id = objective.id
+        ids = [key_result.id for key_result in objective.key_results.order_by(KeyResult.id)]
+    yield objective_id, ids
+    with app.app_context():
+        db.session.delete(db.session.get(Objective, objective_id))
+        db.session.commit()
+
+
+@pytest.fixture
+def install(app, monkeypatch):
+    """Install a check-in buffer built with the given options in the app;
+    it is closed after the test."""
+    buffers = []
+
+    def install(**options):
+        options.setdefault('flush_interval', 3600)
+        checkin_buffer = CheckinBuffer(app, **options)
+        monkeypatch.setitem(app.extensions, 'checkins', checkin_buffer)
+        buffers.append(checkin_buffer)
+        return checkin_buffer
+
+    yield install
+    for checkin_buffer in buffers:
+        checkin_buffer.close()
+
+
+def written(app, key_result_id):
+    """``(current_value, [check-in values])`` of a key result."""
+    with app.app_context():
+        key_result = db.session.get(KeyResult, key_result_id)
+        values = [update.value for update in key_result.updates.order_by(KeyResultUpdate.timestamp, KeyResultUpdate.id)]
+        return key_result.current_value, values
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_memory_buffer_writes_on_flush(app, client, install, key_results):
+    objective_id, (first, second) = key_results
+    checkin_buffer = install(mode='memory')
+    response = client.post(f'/keyresults/{first}/update',
+                           data={'value': 40, 'comment': 'single'})
+    assert response.status_code == 302
+    response = client.post(f'/objectives/{objective_id}/keyresults/update', data={
+        'checkins-0-key_result_id': first, 'checkins-0-value': 45,
+        'checkins-1-key_result_id': second, 'checkins-1-value': 70,
+    })
+    assert response.status_code == 302
+    assert len(checkin_buffer) == 3
+    assert written(app, first) == (0, [])
+
+    with app.app_context():
+        assert checkins.flush() == 3
+        assert checkins.flush() == 0
+    assert written(app, first) == (45, [40, 45])
+    assert written(app, second) == (70, [70])
+
+
+def test_journal_buffer_keeps_pending_check_ins_on_disk(app, install, key_results, tmp_path):
+    _, (first, _) = key_results
+    checkin_buffer = install(mode='journal', journal_dir=str(tmp_path))
+    checkin_buffer.add(first, 25, 'journaled')
+    (segment,) = os.listdir(tmp_path)
+    with open(tmp_path / segment) as journal:
+        assert '"journaled"' in journal.read()
+
+    with app.app_context():
+        assert checkins.flush() == 1
+    # The flushed segment is gone; only the new, empty one is left
+    (current,) = os.listdir(tmp_path)
+    assert current != segment
+    assert os.path.getsize(tmp_path / current) == 0
+    assert written(app, first) == (25, [25])
+
+
+def test_flush_size_wakes_the_flusher(app, install, key_results):
+    _, (first, second) = key_results
+    checkin_buffer = install(mode='memory', flush_size=3)
+    checkin_buffer.add_many([(first, 1, None), (second, 2, None)])
+    time.sleep(0.1)
+    assert len(checkin_buffer) == 2
+    checkin_buffer.add(first, 3)
+    wait_for(lambda: len(checkin_buffer) == 0)
+    wait_for(lambda: written(app, first)[1] == [1, 3])
+    assert written(app, second) == (2, [2])
+
+
+def test_max_pending_flushes_before_accepting_more(app, install, key_results, monkeypatch):
+    _, (first, _) = key_results
+    checkin_buffer = install(mode='memory', max_pending=2)
+    start = datetime.utcnow()
+    for number in range(2):
+        checkin_buffer.add(first, number, timestamp=start + timedelta(seconds=number))
+    assert len(checkin_buffer) == 2
+
+    # While the database fails, check-ins beyond the limit are refused
+    def fail(connection, rows):
+        raise RuntimeError('database down')
+    monkeypatch.setattr(checkins, 'write_checkins', fail)
+    with pytest.raises(RuntimeError):
+        checkin_buffer.add(first, 2, timestamp=start + timedelta(seconds=2))
+    assert len(checkin_buffer) == 2
+    monkeypatch.undo()
+    monkeypatch.setitem(app.extensions, 'checkins', checkin_buffer)
+
+    checkin_buffer.add(first, 2, timestamp=start + timedelta(seconds=2))
+    assert len(checkin_buffer) == 1
+    assert written(app, first) == (1, [0, 1])
+    with app.app_context():
+        assert checkins.flush() == 1
+    assert written(app, first) == (2, [0, 1, 2])
+
+
+def test_orphaned_segments_are_replayed_once(app, install, key_results, tmp_path):
+    _, (first, second) = key_results
+    crashed = install(mode='journal', journal_dir=str(tmp_path))
+    start = datetime.utcnow()
+    crashed.add(first, 10, timestamp=start)
+    crashed.add(second, 20, timestamp=start)
+    # The first check-in was committed before the crash, the second was not
+    with app.app_context(), db.engine.begin() as connection:
+        checkins.write_checkins(connection, [{'key_result_id': first, 'value': 10, 'comment': None,
+                                              'timestamp': start}])
+    # Simulate the process dying: its segment is unlocked but never flushed
+    crashed._closed = True
+    crashed._journal.segment[1].close()
+    (orphan,) = os.listdir(tmp_path)
+
+    recovering = install(mode='journal', journal_dir=str(tmp_path))
+    recovering.add(second, 30, timestamp=start + timedelta(seconds=1))
+    wait_for(lambda: orphan not in os.listdir(tmp_path))
+    with app.app_context():
+        checkins.flush()
+    assert written(app, first) == (10, [10])
+    assert written(app, second) == (30, [20, 30])
+
+
+def test_latest_check_in_wins_regardless_of_flush_order(app, install, key_results):
+    _, (first, second) = key_results
+    checkin_buffer = install(mode='memory')
+    start = datetime.utcnow()
+    with app.app_context():
+        checkin_buffer.add(first, 50, timestamp=start + timedelta(seconds=2))
+        checkins.flush()
+        # An older check-in flushed later (a replayed journal, another
+        # worker) is recorded but does not move current_value back
+        checkin_buffer.add(first, 20, timestamp=start + timedelta(seconds=1))
+        checkins.flush()
+        # Within one flush, the latest timestamp wins over insertion order
+        checkin_buffer.add(second, 90, timestamp=start + timedelta(seconds=5))
+        checkin_buffer.add(second, 60, timestamp=start + timedelta(seconds=4))
+        checkins.flush()
+    assert written(app, first) == (50, [20, 50])
+    assert written(app, second) == (90, [60, 90])
+
+
+def test_unbuffered_check_in_goes_through_write_checkins(app, client, key_results, monkeypatch):
+    _, (first, _) = key_results
+    calls = []
+    write_checkins = checkins.write_checkins
+
+    def spy(connection, rows):
+        calls.append(rows)
+        return write_checkins(connection, rows)
+
+    monkeypatch.setattr(checkins, 'write_checkins', spy)
+    response = client.post(f'/keyresults/{first}/update', data={'value': 7, 'comment': 'unbuffered'})
+    assert response.status_code == 302
+    assert [[(row['key_result_id'], row['value'], row['comment']) for row in rows] for rows in calls] == \
+        [[(first, 7, 'unbuffered')]]
+    assert written(app, first) == (7, [7])
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+import pytest
+from app import comments
+from app.models import db, Comment, KeyResult, Objective
+
+
+@pytest.fixture
+def objective_id(app, seeded):
+    now = datetime.utcnow()
+    with app.app_context():
+        objective = Objective(title='Discussed', description='', user_id=seeded['user'], start_date=now,
+                              end_date=now + timedelta(days=90))
+        objective.key_results.append(KeyResult(title='Discussed result', target_value=10, current_value=0))
+        db.session.add(objective)
+        db.session.commit()
+        return objective.id
+
+
+def counts(app, objective_id):
+    with app.app_context():
+        objective = db.session.get(Objective, objective_id)
+        return objective.comment_count, objective.key_results.one().comment_count
+
+
+def test_posting_and_deleting_keep_the_counts(app, client, objective_id):
+    with app.app_context():
+        key_result_id = db.session.get(Objective, objective_id).key_results.one().id
+    client.post(f'/objectives/{objective_id}/comments', data={'body': 'First'})
+    client.post(f'/keyresults/{key_result_id}/comments', data={'body': 'On the key result'})
+    with app.app_context():
+        first = Comment.query.filter_by(objective_id=objective_id).one().id
+    client.post(f'/objectives/{objective_id}/comments', data={'body': 'Reply', 'parent_id': first})
+    with app.app_context():
+        reply = Comment.query.filter_by(parent_id=first).one().id
+    client.post(f'/objectives/{objective_id}/comments', data={'body': 'Nested', 'parent_id': reply})
+    assert counts(app, objective_id) == (3, 1)
+    with app.app_context():
+        assert db.session.get(Objective, objective_id).last_activity_at is not None
+
+    # Deleting a comment takes its replies along
+    client.post(f'/comments/{reply}/delete')
+    assert counts(app, objective_id) == (1, 1)
+    client.post(f'/comments/{first}/delete')
+    assert counts(app, objective_id) == (0, 1)
+
+
+def test_replies_point_at_their_parent_and_thread_root(app, seeded, objective_id):
+    with app.app_context():
+        objective = db.session.get(Objective, objective_id)
+        user = objective.owner
+        root = comments.add_comment(objective, user, 'Root')
+        db.session.flush()
+        reply = comments.add_comment(objective, user, 'Reply', parent=root)
+        db.session.flush()
+        nested = comments.add_comment(objective, user, 'Nested', parent=reply)
+        db.session.commit()
+        assert (root.parent_id, root.root_id) == (None, None)
+        assert (reply.parent_id, reply.root_id) == (root.id, root.id)
+        assert (nested.parent_id, nested.root_id) == (reply.id, root.id)
+
+        [thread] = comments.thread_page(objective).threads
+        assert thread.comment.id == root.id
+        assert [(depth, comment.id) for depth, comment in thread.replies] == [(1, reply.id), (2, nested.id)]
+
+
+def test_cursor_pages_are_stable(app, seeded, objective_id):
+    with app.app_context():
+        objective = db.session.get(Objective, objective_id)
+        now = datetime.utcnow()
+        # Pairs share a timestamp, so the id has to break ties
+        db.session.add_all(Comment(body=f'Comment {number}', user_id=seeded['user'], objective_id=objective_id,
+                                   timestamp=now - timedelta(minutes=number // 2)) for number in range(7))
+        db.session.commit()
+        expected = [comment.id for comment in Comment.query.filter_by(objective_id=objective_id)
+                    .order_by(Comment.timestamp.desc(), Comment.id.desc())]
+
+        seen, cursor = [], None
+        while True:
+            page = comments.thread_page(objective, cursor=cursor, per_page=3)
+            seen.append([thread.comment.id for thread in page.threads])
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+            # A comment posted meanwhile does not shift the next page
+            comments.add_comment(objective, objective.owner, 'Newer')
+            db.session.commit()
+
+        assert seen == [expected[0:3], expected[3:6], expected[6:7]]
+        assert comments.thread_page(objective, cursor='not-a-cursor', per_page=3).threads[0].comment.body == 'Newer'
@@ -0,0 +1,117 @@
+import gzip
+import io
+import zlib
+import pytest
+from flask import Flask, Response, send_file, stream_with_context
+from app.compression import CompressionMiddleware
+
+BODY = 'x' * 2000
+SMALL = 'small'
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route('/text')
+    def text():
+        return BODY
+
+    @app.route('/small')
+    def small():
+        return SMALL
+
+    @app.route('/varying')
+    def varying():
+        return BODY, {'Vary': 'Cookie'}
+
+    @app.route('/encoded')
+    def encoded():
+        return gzip.compress(BODY.encode()), {'Content-Encoding': 'gzip', 'Content-Type': 'text/html'}
+
+    @app.route('/binary')
+    def binary():
+        return Response(BODY, mimetype='application/octet-stream')
+
+    @app.route('/file')
+    def file():
+        return send_file(io.BytesIO(BODY.encode()), mimetype='text/plain', conditional=True)
+
+    @app.route('/stream')
+    def stream():
+        def generate():
+            for number in range(5):
+                yield f'{number}' * 300
+        return Response(stream_with_context(generate()), mimetype='text/plain')
+
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=500)
+    return app.test_client()
+
+
+@pytest.mark.parametrize('accept, coding', [
+    ('gzip', 'gzip'),
+    ('gzip, deflate', 'gzip'),
+    ('deflate', 'deflate'),
+    ('gzip;q=0.5, deflate', 'deflate'),
+    ('gzip;q=0, deflate', 'deflate'),
+    ('gzip;q=0', None),
+    ('br', None),
+    ('', None),
+])
+def test_negotiates_the_content_coding(client, accept, coding):
+    response = client.get('/text', headers={'Accept-Encoding': accept})
+    assert response.headers.get('Content-Encoding') == coding
+    data = response.get_data()
+    if coding == 'gzip':
+        data = gzip.decompress(data)
+    elif coding == 'deflate':
+        data = zlib.decompress(data)
+    assert data == BODY.encode()
+
+
+def test_compressed_responses_vary_on_accept_encoding(client):
+    response = client.get('/text', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert len(response.get_data()) < len(BODY)
+    response = client.get('/varying', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Vary'] == 'Cookie, Accept-Encoding'
+
+
+@pytest.mark.parametrize('path', ['/small', '/encoded', '/binary'])
+def test_leaves_small_encoded_and_binary_responses_alone(client, path):
+    plain = client.get(path)
+    response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    assert response.get_data() == plain.get_data()
+    assert response.headers.get('Content-Encoding') == plain.headers.get('Content-Encoding')
+    assert 'Vary' not in response.headers
+
+
+def test_min_size_is_the_cut_off(client):
+    app = client.application
+    app.wsgi_app.min_size = len(BODY) + 1
+    assert 'Content-Encoding' not in client.get('/text', headers={'Accept-Encoding': 'gzip'}).headers
+    app.wsgi_app.min_size = len(BODY)
+    assert client.get('/text', headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
+
+
+def test_range_requests_are_not_compressed(client):
+    response = client.get('/file', headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=0-999'})
+    assert response.status_code == 206
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == BODY[:1000].encode()
+
+
+def test_streamed_bodies_are_compressed_chunk_by_chunk(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    received = []
+    for chunk in response.response:
+        received.append(decompressor.decompress(chunk))
+    response.close()
+    assert b''.join(received) == ''.join(f'{number}' * 300 for number in range(5)).encode()
+    # Each chunk is flushed, so it can be decoded on arrival; the last one
+    # is the gzip trailer.
+    assert received[:-1] == [f'{number}'.encode() * 300 for number in range(5)]
+    assert decompressor.eof
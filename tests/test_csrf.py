@@ -0,0 +1,40 @@
+import re
+import pytest
+from app.models import db, Objective
+
+
+@pytest.fixture
+def csrf(app):
+    app.config['WTF_CSRF_ENABLED'] = True
+    yield
+    app.config['WTF_CSRF_ENABLED'] = False
+
+
+def token(page):
+    return re.search(r'data-csrf-token="([^"]+)"', page).group(1)
+
+
+def test_posts_without_a_token_are_refused(app, client, seeded, csrf):
+    for url in [f"/objectives/{seeded['objective']}/complete", '/webhooks/1/retry', '/webhooks/1/delete',
+                '/cycles/1/rollover', '/comments/1/delete']:
+        assert client.post(url, json={'is_complete': True}).status_code == 400, url
+
+
+def test_completing_from_the_objective_page_sends_the_token(app, client, seeded, csrf):
+    url = f"/objectives/{seeded['objective']}"
+    page = client.get(url).get_data(as_text=True)
+    assert 'X-CSRFToken' in page
+    try:
+        response = client.post(url + '/complete', json={'is_complete': True},
+                               headers={'X-CSRFToken': token(page)})
+        assert response.get_json() == {'success': True, 'is_complete': True}
+    finally:
+        with app.app_context():
+            db.session.get(Objective, seeded['objective']).is_complete = False
+            db.session.commit()
+
+
+def test_action_forms_carry_the_token(app, client, seeded, csrf):
+    page = client.get(f"/objectives/{seeded['objective']}").get_data(as_text=True)
+    forms = re.findall(r'<form action="[^"]*/delete" method="post">\s*(<input[^>]*>)', page)
+    assert forms and all('name="csrf_token"' in form for form in forms)
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from app import sharding
+from app.models import db, Cycle, KeyResult, Objective, Tag, User
+
+
+@pytest.fixture
+def planner(app, seeded):
+    """A user of their own, so that cycles do not change what other tests
+    see, and a client logged in as them."""
+    with app.app_context():
+        user = User(username='planner', email='planner@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    yield SimpleNamespace(id=user_id, client=client)
+    with app.app_context():
+        sharding._delete_tenant(db.session.connection(), user_id)
+        db.session.commit()
+
+
+def add_cycle(client, name, start, end):
+    response = client.post('/cycles', data={'name': name, 'start_date': f'{start:%Y-%m-%d}',
+                                            'end_date': f'{end:%Y-%m-%d}'})
+    assert response.status_code == 302
+    return Cycle.query.filter_by(name=name).one().id
+
+
+def test_views_default_to_the_active_cycle(app, planner):
+    client = planner.client
+    today = datetime.utcnow().date()
+    client.post('/objectives/new', data={'title': 'Last year', 'description': '', 'start_date': '2020-01-01',
+                                         'end_date': '2020-03-31'})
+    client.post('/objectives/new', data={'title': 'This month', 'description': '', 'start_date': f'{today - timedelta(days=5)}',
+                                         'end_date': f'{today + timedelta(days=5)}'})
+    with app.app_context():
+        past = add_cycle(client, 'Past', datetime(2020, 1, 1), datetime(2020, 3, 31))
+        current = add_cycle(client, 'Current', today - timedelta(days=30), today + timedelta(days=30))
+
+    page = client.get('/objectives').get_data(as_text=True)
+    assert 'This month' in page and 'Last year' not in page
+    page = client.get('/objectives?cycle=all').get_data(as_text=True)
+    assert 'This month' in page and 'Last year' in page
+    page = client.get(f'/objectives?cycle={past}').get_data(as_text=True)
+    assert 'This month' not in page and 'Last year' in page
+    assert 'This month' in client.get('/dashboard').get_data(as_text=True)
+    assert f'<option selected value="{current}">' in client.get('/objectives/new').get_data(as_text=True)
+
+
+def test_roll_over_copies_unfinished_key_results(app, planner):
+    with app.app_context():
+        q1 = Cycle(user_id=planner.id, name='Q1', start_date=datetime(2026, 1, 1), end_date=datetime(2026, 3, 31))
+        q2 = Cycle(user_id=planner.id, name='Q2', start_date=datetime(2026, 4, 1), end_date=datetime(2026, 6, 30))
+        db.session.add_all([q1, q2])
+        db.session.flush()
+
+        def objective(title, *values, **extra):
+            objective = Objective(title=title, description='', start_date=q1.start_date, end_date=q1.end_date,
+                                  user_id=planner.id, cycle_id=q1.id, **extra)
+            for number, value in enumerate(values):
+                objective.key_results.append(KeyResult(title=f'{title} {number}', target_value=10,
+                                                       current_value=value, unit='count'))
+            db.session.add(objective)
+            return objective
+
+        unfinished = objective('Unfinished', 10, 4, tags=[Tag(name='rolled-tag')])
+        objective('Finished', 10, 12)
+        objective('Closed early', 3, is_complete=True)
+        db.session.commit()
+        q1_id, q2_id, unfinished_id = q1.id, q2.id, unfinished.id
+
+    for _ in range(2):
+        response = planner.client.post(f'/cycles/{q1_id}/rollover', data={'target': q2_id})
+        assert response.status_code == 302
+
+    with app.app_context():
+        (copy,) = Objective.query.filter_by(cycle_id=q2_id).all()
+        assert copy.title == 'Unfinished' and copy.rolled_over_from_id == unfinished_id
+        assert (copy.start_date, copy.end_date) == (datetime(2026, 4, 1), datetime(2026, 6, 30))
+        assert [tag.name for tag in copy.tags] == ['rolled-tag']
+        assert [(kr.title, kr.current_value) for kr in copy.key_results] == [('Unfinished 1', 4)]
+        assert Objective.query.filter_by(cycle_id=q1_id).count() == 3
+
+    assert planner.client.post(f'/cycles/{q1_id}/rollover', data={'target': q1_id}).status_code == 400
+
+
+def test_assigning_objectives_to_a_new_cycle_is_synced(app, planner):
+    client = planner.client
+    response = client.post('/objectives/new', data={'title': 'Unplanned', 'description': '',
+                                                    'start_date': '2026-04-01', 'end_date': '2026-05-15'})
+    objective_id = int(response.headers['Location'].rsplit('/', 1)[-1])
+    since = client.get('/changes?since=0&limit=1000').json['next']
+    with app.app_context():
+        cycle_id = add_cycle(client, 'Q2 2026', datetime(2026, 4, 1), datetime(2026, 6, 30))
+
+    page = client.get(f'/changes?since={since}').json
+    assert [(change['type'], change['id'], change['data']['cycle_id']) for change in page['changes']] == \
+        [('objective', objective_id, cycle_id)]
@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+import pytest
+from querycount import count_queries
+from app import forecasts
+from app.models import db, KeyResult, KeyResultForecast, KeyResultUpdate
+
+DAY = 86400
+
+
+def rows(key_result_id, points):
+    return [(key_result_id, day * DAY, value, index + 1) for index, (day, value) in enumerate(points)]
+
+
+def fit_python(rows, targets):
+    return {key: forecast for key, (forecast, _) in forecasts._fit_python(rows, targets).items()}
+
+
+def test_fit_statuses():
+    data = (rows(1, [(0, 0), (10, 10)]) + rows(2, [(0, 0), (10, 100)]) + rows(3, [(0, 5), (10, 5)])
+            + rows(4, [(0, 50), (10, 40)]) + rows(5, [(0, 50)]) + rows(6, [(0, 1), (10, 2)]))
+    result = fit_python(data, {1: 100, 2: 100, 3: 10, 4: 0, 5: 100, 6: None})
+    assert result[1] == ('projected', datetime(1970, 1, 1) + timedelta(days=100))
+    assert result[2].status == 'reached'
+    assert result[3].status == 'stalled'
+    assert result[4] == ('projected', datetime(1970, 1, 1) + timedelta(days=50))
+    assert result[5].status == 'unknown'
+    assert result[6].status == 'unknown'
+
+
+@pytest.mark.parametrize('data, targets', [
+    (rows(1, [(0, 0), (3, 4), (10, 9)]) + rows(2, [(0, 0), (1, 0)]) + rows(3, [(0, 20), (2, 10)])
+     + rows(4, [(0, 0), (1, 100)]) + rows(5, [(0, 0)]) + rows(6, [(0, 0), (1, 1)]),
+     {1: 50, 2: 10, 3: 0, 4: 50, 5: 10, 6: 1e9}),
+    # Single check-in groups first, between and last, and update ids that
+    # are not in time order, so the last update id is not the last row's.
+    ([(1, 0, 5, 7), (2, 0, 0, 9), (2, DAY, 1, 3), (2, 2 * DAY, 3, 4), (3, 0, 1, 2),
+      (4, 0, 0, 1), (4, 5 * DAY, 5, 8), (5, DAY, 2, 6)],
+     {1: 10, 2: 10, 3: 10, 4: 10, 5: 1}),
+])
+def test_numpy_and_python_agree(data, targets):
+    pytest.importorskip('numpy')
+    expected = forecasts._fit_python(data, targets)
+    result = forecasts._fit_numpy(data, targets)
+    assert result.keys() == expected.keys()
+    for key, (want, want_last_update_id) in expected.items():
+        forecast, last_update_id = result[key]
+        assert (key, forecast.status, last_update_id) == (key, want.status, want_last_update_id)
+        if want.eta is not None:
+            assert abs((forecast.eta - want.eta).total_seconds()) < 1
+
+
+def test_checkins_refresh_the_cache_and_pages_only_read_it(app, client, seeded):
+    response = client.post('/objectives/new', data={
+        'title': 'Forecast me', 'description': '', 'start_date': '2026-01-01', 'end_date': '2026-12-31'})
+    objective_id = int(response.headers['Location'].rsplit('/', 1)[-1])
+    client.post(f'/objectives/{objective_id}/keyresults/new', data={
+        'title': 'Forecast KR', 'description': '', 'target_value': 100, 'current_value': 0, 'unit': 'n'})
+    with app.app_context():
+        key_result_id = KeyResult.query.filter_by(objective_id=objective_id).one().id
+
+    def cached():
+        with app.app_context():
+            return db.session.get(KeyResultForecast, key_result_id)
+
+    # No check-ins yet: nothing cached, and the page shows it as unknown
+    # without computing or writing anything.
+    with count_queries() as queries:
+        assert client.get(f'/objectives/{objective_id}').status_code == 200
+    assert not [query for query in queries if query.startswith(('INSERT', 'DELETE', 'UPDATE'))]
+    assert cached() is None
+    with app.app_context():
+        assert forecasts.for_key_results([key_result_id])[key_result_id].status == 'unknown'
+
+    # The single check-in path
+    client.post(f'/keyresults/{key_result_id}/update', data={'value': 10})
+    first = cached()
+    assert (first.status, first.target_value) == ('unknown', 100)
+    with app.app_context():
+        db.session.execute(KeyResultUpdate.__table__.update()
+                           .where(KeyResultUpdate.key_result_id == key_result_id)
+                           .values(timestamp=datetime.utcnow() - timedelta(days=10)))
+        db.session.commit()
+
+    # The batch path, through checkins.write_checkins
+    client.post(f'/objectives/{objective_id}/keyresults/update', data={
+        'checkins-0-key_result_id': key_result_id, 'checkins-0-value': 20})
+    second = cached()
+    assert second.status == 'projected' and second.last_update_id > first.last_update_id
+
+    client.get(f'/objectives/{objective_id}')
+    client.get('/dashboard')
+    assert cached().computed_at == second.computed_at
+
+    # A new target refits too
+    client.post(f'/keyresults/{key_result_id}/edit', data={
+        'title': 'Forecast KR', 'description': '', 'target_value': 15, 'current_value': 20, 'unit': 'n'})
+    assert (cached().status, cached().target_value) == ('reached', 15)
+
+
+def test_creating_the_app_does_not_import_numpy():
+    script = 'import sys; from app import create_app; create_app(); print("numpy" in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    assert output.strip() == 'False'
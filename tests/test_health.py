@@ -0,0 +1,42 @@
+from sqlalchemy import text
+from querycount import count_queries
+from app import health
+from app.models import db
+
+
+def stamp(app, revision):
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(text('CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32))'))
+        connection.execute(text('DELETE FROM alembic_version'))
+        if revision:
+            connection.execute(text('INSERT INTO alembic_version VALUES (:revision)'),
+                               {'revision': revision})
+        app.extensions.pop('readiness', None)
+
+
+def test_healthz_does_no_io(anonymous):
+    with count_queries() as queries:
+        response = anonymous.get('/healthz')
+    assert response.status_code == 200
+    assert response.json == {'status': 'ok'}
+    assert not queries
+
+
+def test_readyz_is_cached(app, anonymous):
+    with app.app_context():
+        head, = health.migration_heads()
+    stamp(app, head)
+    with count_queries() as queries:
+        first = anonymous.get('/readyz')
+        second = anonymous.get('/readyz')
+    assert first.status_code == second.status_code == 200
+    assert first.json == {'status': 'ok', 'checks': {'default': 'ok'}}
+    assert len(queries) == 2
+
+
+def test_readyz_reports_pending_migrations(app, anonymous):
+    stamp(app, None)
+    response = anonymous.get('/readyz')
+    assert response.status_code == 503
+    assert 'migrations not at head' in response.json['checks']['default'][0]
+    stamp(app, None)
@@ -0,0 +1,74 @@
+import os
+import pytest
+import sqlalchemy as sa
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import upgrade
+from app import create_app
+from app.commands import _include_object, init_migrate
+from app.config import Config
+from app.models import db
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+# The schema db.create_all() made before migrations were added
+BASELINE = [
+    'CREATE TABLE user (id INTEGER NOT NULL, username VARCHAR(64), email VARCHAR(120), '
+    'password_hash VARCHAR(128), is_admin BOOLEAN, PRIMARY KEY (id))',
+    'CREATE UNIQUE INDEX ix_user_username ON user (username)',
+    'CREATE UNIQUE INDEX ix_user_email ON user (email)',
+    'CREATE TABLE objective (id INTEGER NOT NULL, title VARCHAR(120), description TEXT, '
+    'start_date DATETIME, end_date DATETIME, is_complete BOOLEAN, user_id INTEGER, '
+    'PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id))',
+    'CREATE TABLE key_result (id INTEGER NOT NULL, title VARCHAR(120), description TEXT, '
+    'target_value FLOAT, current_value FLOAT, unit VARCHAR(32), objective_id INTEGER, '
+    'PRIMARY KEY (id), FOREIGN KEY(objective_id) REFERENCES objective (id))',
+    'CREATE TABLE key_result_update (id INTEGER NOT NULL, value FLOAT, comment TEXT, '
+    'timestamp DATETIME, key_result_id INTEGER, '
+    'PRIMARY KEY (id), FOREIGN KEY(key_result_id) REFERENCES key_result (id))',
+]
+
+
+@pytest.fixture
+def database(tmp_path):
+    class MigratedConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'migrated.db')
+        SQLALCHEMY_BINDS = {}
+        REQUEST_LOG_ENABLED = False
+
+    app = create_app(MigratedConfig)
+    with app.app_context():
+        init_migrate(app)
+        yield db.engine
+
+
+def differences(engine):
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={
+            'include_object': _include_object, 'render_as_batch': True})
+        return compare_metadata(context, db.metadata)
+
+
+def test_upgrade_creates_the_models_schema(database):
+    upgrade(directory=MIGRATIONS)
+    assert differences(database) == []
+
+
+def test_upgrade_adopts_a_database_made_by_create_all(database):
+    with database.begin() as connection:
+        for statement in BASELINE:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql("INSERT INTO user (id, username, email) VALUES (1, 'old', 'old@example.com')")
+        connection.exec_driver_sql("INSERT INTO objective (id, title, user_id) VALUES (1, 'Kept', 1)")
+        connection.exec_driver_sql("INSERT INTO key_result (id, title, objective_id) VALUES (1, 'Kept too', 1)")
+        connection.exec_driver_sql("INSERT INTO key_result_update (id, value, key_result_id) VALUES (1, 5, 1)")
+
+    upgrade(directory=MIGRATIONS)
+    assert differences(database) == []
+    with database.connect() as connection:
+        assert connection.exec_driver_sql('SELECT title, comment_count FROM objective').all() == [('Kept', 0)]
+        assert connection.exec_driver_sql('SELECT value FROM key_result_update').scalar() == 5
+    # The unnamed baseline foreign keys got names later revisions rely on
+    assert [key['name'] for key in sa.inspect(database).get_foreign_keys('key_result_update')] == \
+        ['fk_key_result_update_key_result_id_key_result']
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, select, text
+from app import purge, reports, search, tags
+from app.models import (db, Comment, KeyResult, KeyResultUpdate, Objective, ObjectiveSnapshot,
+                        key_result_tags, objective_tags)
+
+
+@pytest.fixture
+def doomed(app, seeded):
+    """An objective due first on the dashboard, with a tag of its own, two
+    key results, check-ins, comments and a snapshot for today."""
+    now = datetime.utcnow()
+    with app.app_context():
+        objective = Objective(title='Doomed venture', description='', start_date=now - timedelta(days=5),
+                              end_date=now + timedelta(hours=1), user_id=seeded['user'],
+                              tags=tags.resolve(['doomed-tag']))
+        for number in range(2):
+            objective.key_results.append(KeyResult(title=f'Doomed result {number}', target_value=10,
+                                                   current_value=number, tags=tags.resolve(['doomed-tag'])))
+        db.session.add(objective)
+        db.session.flush()
+        for key_result in objective.key_results:
+            db.session.add_all(KeyResultUpdate(value=value, key_result_id=key_result.id,
+                                               timestamp=now - timedelta(hours=value))
+                               for value in range(5))
+            db.session.add(Comment(body='On the key result', user_id=seeded['user'],
+                                   key_result_id=key_result.id))
+        db.session.add_all(Comment(body=f'Comment {number}', user_id=seeded['user'], objective_id=objective.id)
+                           for number in range(3))
+        db.session.add(ObjectiveSnapshot(objective_id=objective.id, user_id=seeded['user'],
+                                         day=now.date(), progress=5))
+        search.index_objective(objective)
+        db.session.commit()
+        objective_id = objective.id
+    yield objective_id
+    with app.app_context():
+        objective = db.session.get(Objective, objective_id)
+        if objective is not None:
+            db.session.delete(objective)
+            db.session.commit()
+
+
+def visible(app, client, seeded):
+    """Where the doomed objective shows up."""
+    with app.app_context():
+        tag_cloud = dict(tags.tag_counts(seeded['user']))
+    return {
+        'list': 'Doomed venture' in client.get('/objectives').get_data(as_text=True),
+        'dashboard': 'Doomed venture' in client.get('/dashboard').get_data(as_text=True),
+        'search': 'Doomed venture' in client.get('/search?q=doomed').get_data(as_text=True),
+        'tag filter': 'Doomed venture' in client.get('/objectives?tag=doomed-tag').get_data(as_text=True),
+        'tag cloud': 'doomed-tag' in tag_cloud,
+        'page': client.get(f'/objectives/{seeded["objective"]}').status_code == 200,
+    }
+
+
+def reported(app, seeded):
+    """Objectives in today's report snapshot."""
+    with app.app_context():
+        today = datetime.utcnow().date()
+        return sum(row.objectives for row in reports.progress_trend(seeded['user'], today, today))
+
+
+def test_deleted_objective_disappears_everywhere(app, client, seeded, doomed):
+    assert all(visible(app, client, seeded).values())
+    before = reported(app, seeded)
+
+    assert client.post(f'/objectives/{doomed}/delete').status_code == 302
+    shown = visible(app, client, seeded)
+    assert [name for name, value in shown.items() if value] == ['page']
+    assert client.get(f'/objectives/{doomed}').status_code == 404
+    assert reported(app, seeded) == before - 1
+    with app.app_context():
+        # Hidden, not yet removed
+        assert db.session.get(Objective, doomed).deleted_at is not None
+
+
+def test_reindexing_leaves_deleted_objectives_out(app, client, doomed):
+    client.post(f'/objectives/{doomed}/delete')
+    with app.app_context():
+        search.rebuild_index()
+    page = client.get('/search?q=doomed').get_data(as_text=True)
+    assert 'Doomed venture' not in page and 'Doomed result' not in page
+
+
+def test_purge_removes_everything_in_chunks(app, client, doomed):
+    client.post(f'/objectives/{doomed}/delete')
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA foreign_keys')).scalar() == 1
+        key_results = [kr.id for kr in KeyResult.query.filter_by(objective_id=doomed)]
+        statements = []
+
+        def count_statements(*args):
+            statements.append(args)
+        db.event.listen(db.engine, 'before_cursor_execute', count_statements)
+        try:
+            assert purge.purge_objective(doomed, batch_size=3) > 0
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', count_statements)
+        # Ten check-ins and five comments took several chunks each
+        deletes = [args[2] for args in statements if args[2].startswith('DELETE')]
+        assert sum(statement.startswith('DELETE FROM key_result_update') for statement in deletes) == 4
+        assert sum(statement.startswith('DELETE FROM comment') for statement in deletes) == 2
+
+        def count(table, column, ids):
+            return db.session.execute(select(func.count()).select_from(table).where(column.in_(ids))).scalar()
+
+        assert db.session.get(Objective, doomed) is None
+        # Key results and tag links went through ON DELETE CASCADE
+        assert count(KeyResult.__table__, KeyResult.id, key_results) == 0
+        assert count(key_result_tags, key_result_tags.c.key_result_id, key_results) == 0
+        assert count(objective_tags, objective_tags.c.objective_id, [doomed]) == 0
+        assert count(KeyResultUpdate.__table__, KeyResultUpdate.key_result_id, key_results) == 0
+        assert count(Comment.__table__, Comment.objective_id, [doomed]) == 0
+        assert count(Comment.__table__, Comment.key_result_id, key_results) == 0
+        assert count(ObjectiveSnapshot.__table__, ObjectiveSnapshot.objective_id, [doomed]) == 0
+        # Purging again finds nothing left
+        assert purge.purge_objective(doomed) == 0
+
+
+def test_purge_deleted_leaves_live_objectives(app, client, seeded, doomed):
+    client.post(f'/objectives/{doomed}/delete')
+    with app.app_context():
+        live = Objective.active().count()
+        assert purge.purge_deleted() >= 1
+        assert Objective.query.filter(Objective.deleted_at.is_not(None)).count() == 0
+        assert Objective.query.count() == live
@@ -0,0 +1,93 @@
+"""
+Query budgets: the most SQL statements each route may issue on the seeded
+dataset (see conftest.py). A route that starts loading rows one by one,
+e.g. a lazy relationship used inside a template loop, blows its budget by
+dozens of statements and fails here with the full list of them.
+
+Every route of the blueprints in ``BLUEPRINTS`` must have a budget for
+each of its methods. When a change legitimately needs more queries, raise
+the budget in the same commit and say why.
+"""
+import pytest
+from querycount import count_queries
+
+BLUEPRINTS = ('auth', 'main', 'objectives', 'keyresults')
+
+OBJECTIVE_FORM = {'title': 'Budgeted', 'description': 'Test', 'start_date': '2026-01-01',
+                  'end_date': '2026-12-31', 'tags': 'owner-tag-1, new-tag'}
+KEY_RESULT_FORM = {'title': 'Budgeted', 'description': 'Test', 'target_value': 10,
+                   'current_value': 1, 'unit': 'count', 'tags': 'owner-tag-2'}
+
+# (endpoint, method, path, form data, logged in, budget). Writes include one
+# change_log INSERT per kind of entity they change (app/changes.py), and
+# check-ins and completions one webhook outbox INSERT (app/webhooks.py).
+# Pages with forecasts (app/forecasts.py) read the cache in one query.
+# Check-ins and target changes refit their key results in one more and
+# store them with a DELETE and an INSERT.
+# Writes that change an objective's progress, key results or dates refresh
+# its status with one UPDATE (app/tracking.py); the dashboard lists the
+# objectives behind schedule with one more query. Pages and forms that
+# offer the user's OKR cycles (app/cycles.py) load them with one query.
+BUDGETS = [
+    ('main.index', 'GET', '/', None, False, 0),
+    ('main.dashboard', 'GET', '/dashboard', None, True, 7),
+    ('auth.login', 'GET', '/login', None, False, 0),
+    ('auth.login', 'POST', '/login', {'username': 'owner', 'password': 'password'}, False, 1),
+    ('auth.logout', 'GET', '/logout', None, True, 1),
+    ('auth.register', 'GET', '/register', None, False, 0),
+    ('auth.register', 'POST', '/register',
+     {'username': 'newcomer', 'email': 'newcomer@example.com',
+      'password': 'password', 'password2': 'password'}, False, 3),
+    ('objectives.list_objectives', 'GET', '/objectives', None, True, 6),
+    ('objectives.new_objective', 'GET', '/objectives/new', None, True, 2),
+    ('objectives.new_objective', 'POST', '/objectives/new', OBJECTIVE_FORM, True, 12),
+    ('objectives.view_objective', 'GET', '/objectives/{objective}', None, True, 9),
+    ('objectives.edit_objective', 'GET', '/objectives/{objective}/edit', None, True, 4),
+    ('objectives.edit_objective', 'POST', '/objectives/{objective}/edit', OBJECTIVE_FORM, True, 14),
+    ('objectives.complete_objective', 'POST', '/objectives/{objective}/complete',
+     {'is_complete': 'true'}, True, 7),
+    ('objectives.delete_objective', 'POST', '/objectives/{spare_objective}/delete', None, True, 8),
+    ('keyresults.new_key_result', 'GET', '/objectives/{objective}/keyresults/new', None, True, 3),
+    ('keyresults.new_key_result', 'POST', '/objectives/{objective}/keyresults/new',
+     KEY_RESULT_FORM, True, 12),
+    ('keyresults.edit_key_result', 'GET', '/keyresults/{key_result}/edit', None, True, 3),
+    ('keyresults.edit_key_result', 'POST', '/keyresults/{key_result}/edit', KEY_RESULT_FORM, True, 15),
+    ('keyresults.delete_key_result', 'POST', '/keyresults/{spare_key_result}/delete', None, True, 9),
+    ('keyresults.update_key_result', 'GET', '/keyresults/{key_result}/update', None, True, 3),
+    ('keyresults.update_key_result', 'POST', '/keyresults/{key_result}/update',
+     {'value': 42, 'comment': 'Budgeted'}, True, 13),
+    ('keyresults.update_key_results', 'GET', '/objectives/{objective}/keyresults/update', None, True, 4),
+    ('keyresults.update_key_results', 'POST', '/objectives/{objective}/keyresults/update',
+     {'checkins-0-key_result_id': '{key_result}', 'checkins-0-value': 43}, True, 14),
+]
+
+
+@pytest.mark.parametrize('endpoint, method, path, data, logged_in, budget', BUDGETS,
+                         ids=[f'{method} {endpoint}' for endpoint, method, *_ in BUDGETS])
+def test_query_budget(request, seeded, endpoint, method, path, data, logged_in, budget):
+    client = request.getfixturevalue('client' if logged_in else 'anonymous')
+    url = path.format(**seeded)
+    if data is not None:
+        data = {key: value.format(**seeded) if isinstance(value, str) else value
+                for key, value in data.items()}
+    with count_queries() as queries:
+        response = client.open(url, method=method, data=data)
+    assert response.status_code in (200, 302), f'{method} {url}: HTTP {response.status_code}'
+    if method == 'POST' and endpoint != 'auth.login':
+        # A form that failed validation re-renders with 200; make sure the
+        # write path was the one measured.
+        assert response.status_code == 302, f'{method} {url} did not redirect'
+    assert len(queries) <= budget, (
+        f'{method} {url} ran {len(queries)} queries, budget is {budget}:\n{queries}')
+
+
+def test_every_route_has_a_budget(app):
+    budgeted = {(endpoint, method) for endpoint, method, *_ in BUDGETS}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint.split('.')[0] not in BLUEPRINTS:
+            continue
+        for method in rule.methods - {'HEAD', 'OPTIONS'}:
+            if (rule.endpoint, method) not in budgeted:
+                missing.append(f'{method} {rule.rule} ({rule.endpoint})')
+    assert not missing, 'routes without a query budget:\n' + '\n'.join(sorted(missing))
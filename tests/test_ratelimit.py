@@ -0,0 +1,94 @@
+import multiprocessing
+import pytest
+from app import ratelimit
+from app.ratelimit import MemoryStore, Rate, RateLimiter, SQLiteStore
+
+
+def test_rate_parse():
+    rate = Rate.parse('5/60')
+    assert (rate.capacity, rate.period, rate.per_second) == (5, 60, 5 / 60)
+    for value in ('5', 'five/60', '0/60', '5/0'):
+        with pytest.raises(ValueError):
+            Rate.parse(value)
+
+
+def test_buckets_refill_evenly_up_to_capacity():
+    store = MemoryStore()
+    bucket = [('key', Rate(5, 60))]
+    assert [store.spend(bucket, 0, 60) for _ in range(5)] == [0] * 5
+    # One token comes back every twelve seconds
+    assert store.spend(bucket, 0, 60) == pytest.approx(12)
+    assert store.spend(bucket, 6, 60) == pytest.approx(6)
+    assert store.spend(bucket, 12, 60) == 0
+    assert store.spend(bucket, 12, 60) == pytest.approx(12)
+    # A long idle period refills the bucket to its capacity, no further
+    assert [store.spend(bucket, 1000, 60) for _ in range(6)] == [0] * 5 + [pytest.approx(12)]
+
+
+def test_spending_is_all_or_nothing():
+    store = MemoryStore()
+    narrow, wide = ('narrow', Rate(1, 60)), ('wide', Rate(3, 60))
+    assert store.spend([narrow, wide], 0, 60) == 0
+    # The empty narrow bucket refuses the request, and the wide one is
+    # left as it was
+    assert store.spend([narrow, wide], 0, 60) == pytest.approx(60)
+    assert store.spend([wide], 0, 60) == 0
+    assert store.spend([wide], 0, 60) == 0
+    assert store.spend([wide], 0, 60) == pytest.approx(20)
+
+
+def test_stores_on_one_file_share_their_buckets(tmp_path):
+    path = str(tmp_path / 'ratelimit.sqlite')
+    first, second = SQLiteStore(path), SQLiteStore(path)
+    bucket = [('shared', Rate(3, 60))]
+    waits = [store.spend(bucket, 0, 60) for store in (first, second, first, second)]
+    assert waits == [0, 0, 0, pytest.approx(20)]
+    assert second.spend(bucket, 20, 60) == 0
+    assert first.spend(bucket, 20, 60) == pytest.approx(20)
+
+
+def _spend_five(path):
+    store = SQLiteStore(path)
+    return sum(store.spend([('register:ip:10.0.0.1', Rate(10, 600))], 0, 600) == 0 for _ in range(5))
+
+
+def test_processes_cannot_overspend_a_shared_bucket(tmp_path):
+    path = str(tmp_path / 'ratelimit.sqlite')
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        assert sum(pool.map(_spend_five, [path] * 4)) == 10
+
+
+@pytest.fixture
+def limiter(app, monkeypatch):
+    limiter = RateLimiter(MemoryStore(), {
+        ('login', 'ip'): Rate(10, 60),
+        ('login', 'username'): Rate(2, 60),
+    })
+    monkeypatch.setitem(app.extensions, 'ratelimit', limiter)
+    return limiter
+
+
+def test_exhausted_login_gets_429_with_retry_after(anonymous, limiter):
+    for _ in range(2):
+        response = anonymous.post('/login', data={'username': 'Nobody', 'password': 'wrong'})
+        assert response.status_code == 302
+    response = anonymous.post('/login', data={'username': ' nobody ', 'password': 'wrong'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '30'
+    # Other usernames are only limited by the per-address bucket
+    assert anonymous.post('/login', data={'username': 'somebody', 'password': 'wrong'}).status_code == 302
+
+
+@pytest.mark.parametrize('proxies, expected', [
+    (0, '10.0.0.9'),
+    (1, '192.0.2.7'),
+    (2, '198.51.100.1'),
+    (5, '198.51.100.1'),
+])
+def test_client_ip_trusts_only_the_configured_proxies(app, monkeypatch, proxies, expected):
+    monkeypatch.setitem(app.config, 'RATELIMIT_PROXY_COUNT', proxies)
+    # The client sent a forged first entry; one proxy appended 192.0.2.7
+    # and the last one connected from 10.0.0.9
+    with app.test_request_context('/login', headers={'X-Forwarded-For': '198.51.100.1, 192.0.2.7'},
+                                  environ_base={'REMOTE_ADDR': '10.0.0.9'}):
+        assert ratelimit.client_ip() == expected
@@ -0,0 +1,62 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import func
+from app import reports
+from app.models import db, KeyResult, KeyResultUpdate, Objective, ObjectiveSnapshot, User
+
+
+def test_only_admins_can_refresh_snapshots(app, client, seeded):
+    assert client.post('/reports/refresh').status_code == 403
+    assert 'Refresh</button>' not in client.get('/reports').get_data(as_text=True)
+    with app.app_context():
+        db.session.get(User, seeded['user']).is_admin = True
+        db.session.commit()
+    try:
+        assert 'Refresh</button>' in client.get('/reports').get_data(as_text=True)
+        assert client.post('/reports/refresh').status_code == 302
+        with app.app_context():
+            assert ObjectiveSnapshot.query.filter_by(objective_id=seeded['objective']).count()
+    finally:
+        with app.app_context():
+            db.session.get(User, seeded['user']).is_admin = False
+            db.session.commit()
+
+
+def test_a_backdated_check_in_does_not_replace_the_latest_value(app, seeded):
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    noon = datetime.combine(yesterday, time(12))
+    with app.app_context():
+        objective = Objective(title='Backdated', description='', user_id=seeded['user'],
+                              start_date=noon - timedelta(days=7), end_date=noon + timedelta(days=30))
+        objective.key_results.append(KeyResult(title='Backdated result', target_value=10, current_value=2))
+        db.session.add(objective)
+        db.session.flush()
+        key_result = objective.key_results.one()
+        # Recorded after the noon check-in, but dated earlier that morning
+        db.session.add(KeyResultUpdate(value=8, timestamp=noon, key_result_id=key_result.id))
+        db.session.flush()
+        db.session.add(KeyResultUpdate(value=2, timestamp=noon - timedelta(hours=3), key_result_id=key_result.id))
+        db.session.commit()
+
+        reports.materialize_day(yesterday)
+        snapshot = ObjectiveSnapshot.query.filter_by(objective_id=objective.id, day=yesterday).one()
+        assert snapshot.progress == 80
+
+
+def test_snapshots_resume_from_the_last_day_and_can_be_rerun(app, seeded):
+    today = datetime.utcnow().date()
+    with app.app_context():
+        reports.materialize_snapshots()
+        rows = {(row.objective_id, row.day): (row.id, row.progress) for row in ObjectiveSnapshot.query}
+        earlier = {key: value for key, value in rows.items() if key[1] < today}
+        assert rows and earlier
+
+        # A second run only rewrites today's rows, with the same values
+        written = reports.materialize_snapshots()
+        again = {(row.objective_id, row.day): (row.id, row.progress) for row in ObjectiveSnapshot.query}
+        assert written == sum(1 for _, day in rows if day == today)
+        assert again.keys() == rows.keys()
+        assert {key: value for key, value in again.items() if key[1] < today} == earlier
+        assert all(again[key][1] == rows[key][1] for key in rows)
+        assert db.session.query(func.count()).select_from(ObjectiveSnapshot)\
+            .group_by(ObjectiveSnapshot.objective_id, ObjectiveSnapshot.day)\
+            .having(func.count() > 1).first() is None
@@ -0,0 +1,29 @@
+import json
+
+
+def read_log(app):
+    app.extensions['requestlog'].stop()
+    with open(app.config['REQUEST_LOG_FILE']) as log:
+        return [json.loads(line) for line in log]
+
+
+def test_request_is_logged(app, client, seeded):
+    response = client.get('/dashboard', headers={'X-Request-ID': 'edge-1234'})
+    assert response.headers['X-Request-ID'] == 'edge-1234'
+    entry = read_log(app)[-1]
+    assert entry['request_id'] == 'edge-1234'
+    assert entry['user_id'] == str(seeded['user'])
+    assert entry['endpoint'] == 'main.dashboard'
+    assert entry['status'] == 200
+    assert entry['db_queries'] > 0
+    assert 0 < entry['db_ms'] <= entry['duration_ms']
+
+
+def test_unusable_request_id_is_replaced(app, anonymous):
+    response = anonymous.get('/login', headers={'X-Request-ID': 'no spaces\tallowed'})
+    request_id = response.headers['X-Request-ID']
+    assert len(request_id) == 32
+    entry = read_log(app)[-1]
+    assert entry['request_id'] == request_id
+    assert entry['user_id'] is None
+    assert entry['db_queries'] == 0
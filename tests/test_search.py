@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app import purge, search
+from app.models import db, KeyResult, Objective
+
+
+def results(app, user_id, query, **kwargs):
+    with app.app_context():
+        return [(hit.kind, hit.title) for hit in search.search(user_id, query, **kwargs).hits]
+
+
+def indexed(app, objective_ids):
+    with app.app_context():
+        return sorted(tuple(row) for row in db.session.execute(
+            text('SELECT rowid, title, body, scope FROM search_index')).all()
+            if int(row.scope.split(' o')[1]) in objective_ids)
+
+
+def test_index_follows_objective_and_key_result_writes(app, client, seeded):
+    user = seeded['user']
+    client.post('/objectives/new', data={'title': 'Zephyr launch', 'description': 'Ship the quill',
+                                         'start_date': '2026-01-01', 'end_date': '2026-12-31', 'cycle_id': 0})
+    with app.app_context():
+        objective_id = Objective.query.filter_by(title='Zephyr launch').one().id
+    assert results(app, user, 'zephyr') == [('objective', 'Zephyr launch')]
+    assert results(app, user, 'quill') == [('objective', 'Zephyr launch')]
+    assert results(app, user + 1, 'zephyr') == []
+
+    client.post(f'/objectives/{objective_id}/keyresults/new',
+                data={'title': 'Zephyr signups', 'target_value': 10, 'current_value': 0, 'unit': 'count'})
+    with app.app_context():
+        key_result_id = KeyResult.query.filter_by(objective_id=objective_id).one().id
+    assert sorted(results(app, user, 'zephyr')) == [('key_result', 'Zephyr signups'), ('objective', 'Zephyr launch')]
+
+    client.post(f'/objectives/{objective_id}/edit', data={'title': 'Mistral launch', 'description': '',
+                                                          'start_date': '2026-01-01', 'end_date': '2026-12-31',
+                                                          'cycle_id': 0})
+    client.post(f'/keyresults/{key_result_id}/edit',
+                data={'title': 'Mistral signups', 'target_value': 10, 'current_value': 0, 'unit': 'count'})
+    assert results(app, user, 'zephyr') == []
+    assert results(app, user, 'quill') == []
+    assert sorted(results(app, user, 'mistral')) == [('key_result', 'Mistral signups'), ('objective', 'Mistral launch')]
+
+    # A rebuild from the tables arrives at the same index
+    incremental = indexed(app, {objective_id})
+    with app.app_context():
+        search.rebuild_index()
+    assert indexed(app, {objective_id}) == incremental
+
+    client.post(f'/keyresults/{key_result_id}/delete')
+    assert results(app, user, 'mistral') == [('objective', 'Mistral launch')]
+    client.post(f'/objectives/{objective_id}/delete')
+    assert results(app, user, 'mistral') == []
+    assert indexed(app, {objective_id}) == []
+
+
+def test_results_are_paged(app, seeded):
+    user = seeded['user']
+    with app.app_context():
+        now = datetime.utcnow()
+        objectives = [Objective(title=f'Paged sirocco {number}', user_id=user, start_date=now,
+                                end_date=now + timedelta(days=365)) for number in range(5)]
+        db.session.add_all(objectives)
+        db.session.flush()
+        for objective in objectives:
+            search.index_objective(objective)
+        db.session.commit()
+
+        pages = [search.search(user, 'sirocco', page=page, per_page=2) for page in (1, 2, 3)]
+        assert [len(page.hits) for page in pages] == [2, 2, 1]
+        assert [page.has_next for page in pages] == [True, True, False]
+        assert [page.has_prev for page in pages] == [False, True, True]
+        titles = [hit.title for page in pages for hit in page.hits]
+        assert sorted(titles) == sorted(objective.title for objective in objectives)
+
+        for objective in objectives:
+            purge.soft_delete(objective)
+        db.session.commit()
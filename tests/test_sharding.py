@@ -0,0 +1,174 @@
+import os
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from app import create_app, sharding
+from app.config import Config
+from app.models import db, Comment, KeyResult, KeyResultUpdate, Objective, ShardMap, User, shard_engine
+
+SHARDS = ('default', 'shard1', 'shard2')
+
+
+@pytest.fixture(scope='module')
+def sharded(tmp_path_factory):
+    """An app with three SQLite shards."""
+    directory = tmp_path_factory.mktemp('shards')
+
+    class ShardedConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'default.db')
+        SQLALCHEMY_BINDS = {name: 'sqlite:///' + os.path.join(directory, f'{name}.db')
+                            for name in SHARDS[1:]}
+        SHARD_MOVE_GRACE = 0
+        WTF_CSRF_ENABLED = False
+        RATELIMIT_ENABLED = False
+        CHECKIN_BUFFER = 'off'
+        PURGE_IN_BACKGROUND = False
+        TEMPLATE_CACHE_DIR = None
+        COMPRESS_ENABLED = False
+        REQUEST_LOG_ENABLED = False
+
+    app = create_app(ShardedConfig)
+    with app.app_context():
+        sharding.create_all()
+    yield app
+    # The extension is shared by all apps: forget the shard binds, or the
+    # other tests' db.create_all() would look for them.
+    for name in SHARDS[1:]:
+        db.metadatas.pop(name, None)
+
+
+def register(app, username):
+    response = app.test_client().post('/register', data={
+        'username': username, 'email': f'{username}@example.com',
+        'password': 'password', 'password2': 'password'})
+    assert response.status_code == 302, response.get_data(as_text=True)
+    with app.app_context():
+        entry = ShardMap.query.filter_by(username=username).one()
+        return entry.id, entry.shard
+
+
+def client_for(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def rows(app, shard, model, **criteria):
+    with app.app_context(), shard_engine(shard).connect() as connection:
+        return connection.execute(select(model.__table__).filter_by(**criteria)).all()
+
+
+def add_objective(client, title):
+    response = client.post('/objectives/new', data={
+        'title': title, 'description': 'Kept apart', 'start_date': '2026-01-01', 'end_date': '2026-12-31'})
+    assert response.status_code == 302
+    return int(response.headers['Location'].rstrip('/').rsplit('/', 1)[-1])
+
+
+@pytest.fixture(scope='module')
+def tenants(sharded):
+    """Three users, one per shard, each with an objective."""
+    users = {}
+    for name in ('ada', 'bob', 'cyd'):
+        user_id, shard = register(sharded, name)
+        client = client_for(sharded, user_id)
+        users[name] = {'id': user_id, 'shard': shard, 'client': client,
+                       'objective': add_objective(client, f'{name.title()} secret plan')}
+    return users
+
+
+def test_new_users_go_to_the_least_loaded_shard(sharded, tenants):
+    assert sorted(tenant['shard'] for tenant in tenants.values()) == list(SHARDS)
+    for tenant in tenants.values():
+        # The user row lives in its shard only, with the directory's id
+        for shard in SHARDS:
+            assert len(rows(sharded, shard, User, id=tenant['id'])) == (shard == tenant['shard'])
+
+
+def test_tenants_only_see_their_own_data(sharded, tenants):
+    ada, bob = tenants['ada'], tenants['bob']
+    assert 'Ada secret plan' in ada['client'].get('/objectives').get_data(as_text=True)
+    for path in ('/objectives', '/dashboard', '/search?q=secret'):
+        page = bob['client'].get(path).get_data(as_text=True)
+        assert 'Ada secret plan' not in page and 'Bob secret plan' in page
+    # Ids are per shard: ada's objective id means nothing in bob's shard
+    # unless bob happens to own one with the same id.
+    if ada['objective'] != bob['objective']:
+        assert bob['client'].get(f"/objectives/{ada['objective']}").status_code == 404
+
+
+def test_move_renumbers_rows_and_keeps_search_working(sharded, tenants):
+    ada, bob = tenants['ada'], tenants['bob']
+    client = ada['client']
+    client.post(f"/objectives/{ada['objective']}/keyresults/new", data={
+        'title': 'Secret metric', 'description': '', 'target_value': 10, 'current_value': 0, 'unit': 'n'})
+    with sharded.app_context():
+        with sharding.use(ada['shard']):
+            key_result_id = KeyResult.query.filter_by(objective_id=ada['objective']).one().id
+    client.post(f'/keyresults/{key_result_id}/update', data={'value': 4, 'comment': 'progress'})
+    client.post(f"/objectives/{ada['objective']}/comments", data={'body': 'Moving soon'})
+
+    target = bob['shard']
+    with sharded.app_context():
+        assert sharding.move_user(ada['id'], target) > 0
+        entry = db.session.get(ShardMap, ada['id'])
+        assert (entry.shard, entry.moving_to, entry.moved_from) == (target, None, None)
+
+    # Nothing is left behind in the old shard
+    for model, criteria in ((User, {'id': ada['id']}), (Objective, {'user_id': ada['id']})):
+        assert rows(sharded, ada['shard'], model, **criteria) == []
+    (objective,) = rows(sharded, target, Objective, user_id=ada['id'])
+    (key_result,) = rows(sharded, target, KeyResult, objective_id=objective.id)
+    (update,) = rows(sharded, target, KeyResultUpdate, key_result_id=key_result.id)
+    (comment,) = rows(sharded, target, Comment, objective_id=objective.id)
+    assert (objective.title, key_result.title, update.value, comment.body) == \
+        ('Ada secret plan', 'Secret metric', 4, 'Moving soon')
+    # bob's objective already had ada's old id in the target shard
+    assert objective.id != bob['objective']
+
+    page = client.get('/search?q=secret').get_data(as_text=True)
+    assert 'Ada secret plan' in page and 'Secret metric' in page and 'Bob secret plan' not in page
+    assert f"/objectives/{objective.id}" in page
+    assert 'Ada secret plan' not in bob['client'].get('/search?q=secret').get_data(as_text=True)
+    assert client.get(f'/objectives/{objective.id}').status_code == 200
+    ada['shard'], ada['objective'] = target, objective.id
+
+
+def test_writes_get_503_while_a_move_is_in_progress(sharded, tenants):
+    cyd = tenants['cyd']
+    with sharded.app_context():
+        db.session.get(ShardMap, cyd['id']).moving_to = 'shard1' if cyd['shard'] != 'shard1' else 'shard2'
+        db.session.commit()
+    try:
+        response = cyd['client'].post('/objectives/new', data={'title': 'Blocked'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '60'
+        assert cyd['client'].get('/objectives').status_code == 200
+        # Other tenants are not affected
+        assert tenants['bob']['client'].post(f"/objectives/{tenants['bob']['objective']}/complete").status_code == 302
+    finally:
+        with sharded.app_context():
+            db.session.get(ShardMap, cyd['id']).moving_to = None
+            db.session.commit()
+
+
+def test_failed_registration_leaves_no_directory_entry(sharded, tenants):
+    # A stray row with the same username in every shard makes the user
+    # insert fail after the directory entry has been flushed.
+    for shard in SHARDS:
+        with sharded.app_context(), shard_engine(shard).begin() as connection:
+            connection.execute(User.__table__.insert().values(id=10 ** 6, username='ghost',
+                                                              email='ghost@example.com'))
+    with sharded.app_context():
+        before = sharding.shard_sizes()
+    with pytest.raises(IntegrityError):
+        sharded.test_client().post('/register', data={
+            'username': 'ghost', 'email': 'ghost@example.com', 'password': 'password',
+            'password2': 'password'})
+    with sharded.app_context():
+        assert ShardMap.query.filter_by(username='ghost').count() == 0
+        assert sharding.shard_sizes() == before
+        assert db.session.execute(select(func.count()).select_from(ShardMap)).scalar() == len(tenants)
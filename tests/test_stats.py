@@ -0,0 +1,65 @@
+from app import stats
+from app.models import db, User, UserStatistics
+from querycount import count_queries
+
+
+def refresh(app):
+    with app.app_context(), db.engine.begin() as connection:
+        return stats.refresh(connection)
+
+
+def test_refresh_stores_each_users_totals(app, seeded):
+    assert refresh(app) == refresh(app)
+    with app.app_context():
+        assert UserStatistics.query.count() == User.query.count()
+        other_id = User.query.filter_by(username='other').one().id
+        other = db.session.get(UserStatistics, other_id)
+        # Ten objectives with key results at 0, 10, 20, 30 and 40%
+        assert (other.objectives, other.completed, other.key_results) == (10, 0, 50)
+        assert other.progress == 20
+
+        summary = stats.overview()
+        rows = UserStatistics.query.all()
+        assert summary['users'] == User.query.count()
+        assert summary['objectives'] == sum(row.objectives for row in rows)
+        assert summary['key_results'] == sum(row.key_results for row in rows)
+        assert summary['refreshed_at'] == max(row.refreshed_at for row in rows)
+
+
+def test_pages_are_sorted_and_cut_in_sql(app, seeded):
+    refresh(app)
+    with app.app_context():
+        usernames = sorted(user.username for user in User.query)
+        seen = []
+        page = 1
+        with count_queries() as queries:
+            while True:
+                rows, has_next = stats.user_performance(sort='username', direction='asc', page=page, per_page=1)
+                seen += [row.username for row in rows]
+                if not has_next:
+                    break
+                page += 1
+        assert seen == usernames
+        assert len(queries) == len(usernames)
+
+        top = stats.performers()
+        bottom = stats.performers(lowest=True)
+        assert all(row.objectives for row in top + bottom)
+        assert [row.progress for row in top] == sorted((row.progress for row in top), reverse=True)
+        assert [row.progress for row in bottom] == sorted(row.progress for row in bottom)
+
+
+def test_admin_overview_renders(app, client, seeded):
+    assert client.get('/admin/').status_code == 403
+    refresh(app)
+    with app.app_context():
+        db.session.get(User, seeded['user']).is_admin = True
+        db.session.commit()
+    try:
+        page = client.get('/admin/?sort=objectives&dir=asc').get_data(as_text=True)
+        assert 'Top Performers' in page and 'other@example.com' in page
+        assert 'Statistics as of' in page
+    finally:
+        with app.app_context():
+            db.session.get(User, seeded['user']).is_admin = False
+            db.session.commit()
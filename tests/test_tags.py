@@ -0,0 +1,32 @@
+from app import tags
+from app.models import db, Tag
+
+
+def test_resolve_creates_missing_tags_once(app, seeded):
+    with app.app_context():
+        first = tags.resolve(['Resolve-A', 'resolve-b', 'resolve-a'])
+        db.session.commit()
+        second = tags.resolve(['resolve-b', 'resolve-c'])
+        db.session.commit()
+        assert [tag.name for tag in first] == ['resolve-a', 'resolve-b']
+        assert [tag.name for tag in second] == ['resolve-b', 'resolve-c']
+        assert second[0].id == first[1].id
+        assert Tag.query.filter(Tag.name.like('resolve-%')).count() == 3
+
+
+def test_resolve_survives_a_concurrent_insert(app, seeded, monkeypatch):
+    insert_missing = tags._insert_missing
+
+    def racing_insert(names):
+        # Another request creates the tag between our lookup and our insert
+        with db.engine.begin() as connection:
+            connection.execute(Tag.__table__.insert().values(name='raced'))
+        insert_missing(names)
+
+    monkeypatch.setattr(tags, '_insert_missing', racing_insert)
+    with app.app_context():
+        resolved = tags.resolve(['raced', 'not-raced'])
+        db.session.commit()
+        assert [tag.name for tag in resolved] == ['raced', 'not-raced']
+        assert all(tag.id for tag in resolved)
+        assert Tag.query.filter_by(name='raced').count() == 1
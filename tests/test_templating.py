@@ -0,0 +1,50 @@
+from jinja2 import FileSystemBytecodeCache
+from app import create_app
+from app.config import Config
+
+
+def make_app(cache_dir):
+    class TemplatesConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        SQLALCHEMY_BINDS = {}
+        REQUEST_LOG_ENABLED = False
+        TEMPLATE_CACHE_DIR = cache_dir
+
+    return create_app(TemplatesConfig)
+
+
+def test_compiled_templates_are_cached_on_disk(tmp_path):
+    directory = tmp_path / 'templates'
+    app = make_app(str(directory))
+    assert isinstance(app.jinja_env.bytecode_cache, FileSystemBytecodeCache)
+    assert directory.is_dir() and not any(directory.iterdir())
+
+    with app.test_request_context():
+        app.jinja_env.get_template('errors/404.html')
+    assert len(list(directory.iterdir())) == 1
+
+    # A new worker loads the bytecode instead of compiling the source
+    loaded = []
+    fresh = make_app(str(directory))
+    cache = fresh.jinja_env.bytecode_cache
+    load_bytecode = cache.load_bytecode
+    cache.load_bytecode = lambda bucket: loaded.append(bucket.key) or load_bytecode(bucket)
+    fresh.jinja_env.get_template('errors/404.html')
+    assert loaded
+
+
+def test_warm_command_compiles_every_template(tmp_path):
+    directory = tmp_path / 'templates'
+    app = make_app(str(directory))
+    result = app.test_cli_runner().invoke(args=['templates', 'warm'])
+    assert result.exit_code == 0, result.output
+    count = len(app.jinja_env.list_templates(extensions=['html']))
+    assert f'Compiled {count} templates' in result.output
+    assert len(list(directory.iterdir())) == count
+
+
+def test_warm_command_needs_a_cache_directory():
+    result = make_app(None).test_cli_runner().invoke(args=['templates', 'warm'])
+    assert result.exit_code != 0
+    assert 'TEMPLATE_CACHE_DIR is not set' in result.output
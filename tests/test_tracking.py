@@ -0,0 +1,73 @@
+import re
+from datetime import datetime, timedelta
+import pytest
+from app import tracking
+from app.models import db, Objective, KeyResult
+
+
+@pytest.fixture
+def objective(app, seeded):
+    """A 100-day objective, halfway through, with one key result."""
+    now = datetime.utcnow()
+    with app.app_context():
+        objective = Objective(title='Tracked', description='', start_date=now - timedelta(days=50),
+                              end_date=now + timedelta(days=50), user_id=seeded['user'])
+        objective.key_results.append(KeyResult(title='Tracked', target_value=200, current_value=0))
+        db.session.add(objective)
+        db.session.commit()
+        objective_id = objective.id
+    yield objective_id
+    with app.app_context():
+        db.session.delete(db.session.get(Objective, objective_id))
+        db.session.commit()
+
+
+def status_after(app, objective_id, **changes):
+    with app.app_context():
+        objective = db.session.get(Objective, objective_id)
+        key_result = objective.key_results.first()
+        for name, value in changes.items():
+            setattr(key_result if hasattr(key_result, name) else objective, name, value)
+        db.session.flush()
+        tracking.refresh(db.session.connection(), [objective_id])
+        db.session.commit()
+        return db.session.get(Objective, objective_id).status
+
+
+def test_status_compares_progress_with_time_elapsed(app, objective):
+    assert status_after(app, objective, current_value=110) == 'on_track'
+    assert status_after(app, objective, current_value=80) == 'at_risk'
+    assert status_after(app, objective, current_value=20) == 'off_track'
+    assert status_after(app, objective, is_complete=True) is None
+    assert status_after(app, objective, is_complete=False, end_date=datetime(2000, 1, 1)) is None
+
+
+def test_checkins_refresh_status_and_lists_filter_by_it(app, client, objective):
+    with app.app_context():
+        key_result_id = db.session.get(Objective, objective).key_results.first().id
+    link = f'href="/objectives/{objective}"'
+
+    client.post(f'/keyresults/{key_result_id}/update', data={'value': 10})
+    assert link in client.get('/objectives?status=off_track').get_data(as_text=True)
+    assert link not in client.get('/objectives?status=on_track').get_data(as_text=True)
+    assert link in client.get('/dashboard').get_data(as_text=True)
+
+    client.post(f'/keyresults/{key_result_id}/update', data={'value': 150})
+    assert link in client.get('/objectives?status=on_track').get_data(as_text=True)
+    assert link not in client.get('/objectives?status=off_track').get_data(as_text=True)
+    page = client.get('/objectives?sort=status').get_data(as_text=True)
+    labels = re.findall(r'>(Off track|At risk|On track)</span>', page)
+    order = list(reversed(tracking.STATUSES.values()))
+    assert 'On track' in labels
+    assert labels == sorted(labels, key=order.index)
+
+
+def test_refresh_status_command_fills_every_objective(app, seeded, objective):
+    with app.app_context():
+        Objective.query.update({'status': None})
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['objectives', 'refresh-status', '--batch-size', '7'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert db.session.get(Objective, objective).status == 'off_track'
+        assert Objective.query.filter(Objective.status.isnot(None)).count() > 1
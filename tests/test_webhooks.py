@@ -0,0 +1,205 @@
+import hashlib
+import hmac
+import json
+import socket
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import pytest
+from app import webhooks
+from app.models import db, shard_engine, WebhookDelivery, WebhookSubscription
+
+
+class Receiver(ThreadingHTTPServer):
+    """A local webhook endpoint that records what it is sent."""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ReceiverHandler)
+        self.url = f'http://127.0.0.1:{self.server_address[1]}/hook'
+        self.requests = []
+        self.status = 200
+        self.delay = 0
+        self.in_flight = self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+            server.requests.append((dict(self.headers), body))
+        self.send_response(server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    server = Receiver()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def subscribe(app, client, seeded, receiver):
+    def subscribe(*events):
+        response = client.post('/webhooks', data={'url': receiver.url, 'events': list(events)})
+        assert response.status_code == 302
+        with app.app_context():
+            return WebhookSubscription.query.filter_by(user_id=seeded['user'])\
+                .order_by(WebhookSubscription.id.desc()).first().secret
+    yield subscribe
+    with app.app_context():
+        WebhookSubscription.query.filter_by(user_id=seeded['user']).delete()
+        db.session.commit()
+
+
+def deliver(app):
+    with app.app_context():
+        client = webhooks.make_client()
+        try:
+            return webhooks.deliver(shard_engine(None), client)
+        finally:
+            client.close()
+
+
+def events(receiver):
+    return [event for _, body in receiver.requests for event in json.loads(body)['events']]
+
+
+def test_checkins_are_delivered_in_signed_batches(app, client, seeded, receiver, subscribe, monkeypatch):
+    secret = subscribe('key_result.updated')
+    monkeypatch.setitem(app.config, 'WEBHOOK_BATCH_SIZE', 2)
+    # One request at a time, so that the batches arrive in order
+    monkeypatch.setitem(app.config, 'WEBHOOK_ENDPOINT_CONCURRENCY', 1)
+    client.post(f"/keyresults/{seeded['key_result']}/update", data={'value': 7, 'comment': 'first'})
+    client.post(f"/objectives/{seeded['objective']}/keyresults/update",
+                data={'checkins-0-key_result_id': seeded['key_result'], 'checkins-0-value': 8})
+    client.post(f"/keyresults/{seeded['key_result']}/update", data={'value': 9})
+
+    assert deliver(app) == (3, 0)
+    assert [len(json.loads(body)['events']) for _, body in receiver.requests] == [2, 1]
+    for headers, body in receiver.requests:
+        timestamp, signature = [part.split('=', 1)[1] for part in headers['X-Webhook-Signature'].split(',')]
+        expected = hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+        assert hmac.compare_digest(signature, expected)
+    delivered = events(receiver)
+    assert [event['data']['value'] for event in delivered] == [7, 8, 9]
+    assert {event['type'] for event in delivered} == {'key_result.updated'}
+    assert delivered[0]['data']['key_result']['id'] == seeded['key_result']
+    assert len({event['id'] for event in delivered}) == 3
+    with app.app_context():
+        assert WebhookDelivery.query.count() == 0
+
+
+def test_only_subscribed_events_are_queued(app, client, seeded, receiver, subscribe):
+    subscribe('objective.completed')
+    url = f"/objectives/{seeded['objective']}/complete"
+    client.post(url, json={'is_complete': False})
+    client.post(f"/keyresults/{seeded['key_result']}/update", data={'value': 3})
+    client.post(url, json={'is_complete': True})
+    client.post(url, json={'is_complete': True})
+    client.post(url, json={'is_complete': False})
+
+    assert deliver(app) == (1, 0)
+    (event,) = events(receiver)
+    assert event['type'] == 'objective.completed'
+    assert event['data']['objective']['id'] == seeded['objective']
+
+
+def test_failed_deliveries_back_off_and_give_up(app, client, seeded, receiver, subscribe, monkeypatch):
+    subscribe('key_result.updated')
+    receiver.status = 503
+    client.post(f"/keyresults/{seeded['key_result']}/update", data={'value': 4})
+
+    assert deliver(app) == (0, 1)
+    with app.app_context():
+        delivery = WebhookDelivery.query.one()
+        assert delivery.attempts == 1 and delivery.last_error == 'HTTP 503'
+        assert delivery.next_attempt_at > datetime.utcnow()
+    # Not due yet
+    assert deliver(app) == (0, 0)
+
+    monkeypatch.setitem(app.config, 'WEBHOOK_MAX_ATTEMPTS', 2)
+    with app.app_context():
+        WebhookDelivery.query.update({'next_attempt_at': datetime.utcnow()})
+        db.session.commit()
+    assert deliver(app) == (0, 1)
+    with app.app_context():
+        assert WebhookDelivery.query.one().next_attempt_at is None
+
+    receiver.status = 200
+    with app.app_context():
+        subscription_id = WebhookSubscription.query.filter_by(user_id=seeded['user']).one().id
+    client.post(f'/webhooks/{subscription_id}/retry')
+    assert deliver(app) == (1, 0)
+    assert len(receiver.requests) == 3
+
+
+def test_requests_per_endpoint_are_limited(receiver):
+    receiver.delay = 0.05
+    subscription = SimpleNamespace(url=receiver.url, secret='secret')
+    delivery = SimpleNamespace(event_id='1', event='key_result.updated', created_at=datetime.utcnow(),
+                               payload='{}')
+    client = webhooks.Client(concurrency=8, per_endpoint=2, allow_private=True)
+    try:
+        results = client.send_all([webhooks._Request(subscription, [delivery]) for _ in range(6)])
+    finally:
+        client.close()
+    assert [result for _, result in results] == [None] * 6
+    assert receiver.max_in_flight == 2
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1:8000/hook', 'http://localhost/hook', 'http://10.1.2.3/hook',
+    'http://192.168.0.10/hook', 'http://169.254.169.254/latest/meta-data', 'http://[::1]/hook',
+    'http://[::ffff:127.0.0.1]/hook', 'http://0.0.0.0/hook', 'http://240.0.0.1/hook',
+    'http://host.invalid/hook',
+])
+def test_webhooks_to_non_public_hosts_are_refused(app, client, seeded, monkeypatch, url):
+    monkeypatch.setitem(app.config, 'WEBHOOK_ALLOW_PRIVATE', False)
+    response = client.post('/webhooks', data={'url': url, 'events': ['objective.completed']})
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert 'Use a URL on the public internet.' in page or 'Could not find the host' in page
+    with app.app_context():
+        assert WebhookSubscription.query.filter_by(user_id=seeded['user']).count() == 0
+
+
+def test_public_addresses_are_accepted():
+    assert webhooks.public_address('93.184.215.14', 443) == '93.184.215.14'
+    with pytest.raises(webhooks.UnsafeAddress):
+        webhooks.check_url('https://100.64.0.1/hook')
+
+
+def test_client_checks_the_address_it_connects_to(receiver, monkeypatch):
+    subscription = SimpleNamespace(url=receiver.url.replace('127.0.0.1', 'hooks.example.com'), secret='secret')
+    delivery = SimpleNamespace(event_id='1', event='key_result.updated', created_at=datetime.utcnow(),
+                               payload='{}')
+    # The host was public when the webhook was saved; now it points at us.
+    real_getaddrinfo = socket.getaddrinfo
+    monkeypatch.setattr(socket, 'getaddrinfo', lambda host, *args, **kwargs: real_getaddrinfo(
+        '127.0.0.1' if host == 'hooks.example.com' else host, *args, **kwargs))
+    client = webhooks.Client()
+    try:
+        [(_, (error, _))] = client.send_all([webhooks._Request(subscription, [delivery])])
+    finally:
+        client.close()
+    assert error.startswith('UnsafeAddress')
+    assert receiver.requests == []